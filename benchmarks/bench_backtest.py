@@ -0,0 +1,150 @@
+"""
+Benchmark: put leads backtest over a year of snapshots
+
+Builds N_TICKERS tickers of synthetic daily bars (geometric Brownian motion)
+and a put chain for every business day of one year, priced with
+Black-Scholes at each ticker's vol, then runs backtest.run_backtest over it
+one month at a time, as load_option_snapshots feeds it.
+
+A sample of the trades is re-derived row by row (52 week window and price
+from the bars before the snapshot date, best put by annualized return,
+settlement on the last close on or before expiry) and compared with the
+vectorized result.
+
+Run with: python benchmarks/bench_backtest.py
+"""
+
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from backtest import BACKTEST_FILTERS, WEEK_52_DAYS, month_ranges, run_backtest
+from frame_schema import HIST_DTYPES, OPTION_DTYPES, compact, peak_rss_mb
+from greeks import bs_price
+
+N_TICKERS = 500
+N_STRIKES = 12
+# Calendar days to each expiration of a snapshot
+EXPIRATION_DAYS = (10, 31, 59)
+START_DATE = pd.Timestamp('2024-01-02')
+END_DATE = pd.Timestamp('2024-12-31')
+N_CHECKED_TRADES = 300
+
+
+def synthetic_history(tickers, vols, seed=0):
+    """Daily bars from a year before START_DATE to 45 days after END_DATE."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(START_DATE - pd.Timedelta(days=WEEK_52_DAYS + 60), END_DATE + pd.Timedelta(days=45))
+    n_days = len(days)
+    shocks = rng.standard_normal((n_days, len(tickers))) * vols / np.sqrt(252)
+    close = rng.uniform(20, 400, len(tickers)) * np.exp(np.cumsum(shocks, axis=0))
+    spread = np.abs(rng.standard_normal((n_days, len(tickers)))) * vols / np.sqrt(252) * close
+    stock_hist = pd.DataFrame({
+        'ticker': np.tile(tickers, n_days),
+        'hist_date': np.repeat(days, len(tickers)),
+        'high': (close + spread).ravel(),
+        'low': (close - spread).ravel(),
+        'close': close.ravel(),
+    })
+    return compact(stock_hist, HIST_DTYPES)
+
+
+def synthetic_chains(stock_hist, vols, first, last):
+    """Put chains of every business day in [first, last], quoted off the previous close."""
+    days = pd.bdate_range(first, last).astype('datetime64[ns]')
+    hist = stock_hist.assign(ticker=stock_hist['ticker'].astype(str)).sort_values('hist_date')
+    spots = pd.merge_asof(
+        pd.DataFrame({'snapshot_date': np.repeat(days, N_TICKERS),
+                      'ticker': np.tile(list(vols.index), len(days))}).sort_values('snapshot_date'),
+        hist[['ticker', 'hist_date', 'close']], left_on='snapshot_date', right_on='hist_date', by='ticker',
+        allow_exact_matches=False)
+
+    n_per_day = len(EXPIRATION_DAYS) * N_STRIKES
+    rows = spots.loc[spots.index.repeat(n_per_day)].reset_index(drop=True)
+    exp_days = np.tile(np.repeat(EXPIRATION_DAYS, N_STRIKES), len(spots))
+    moneyness = np.tile(np.tile(np.linspace(0.6, 1.05, N_STRIKES), len(EXPIRATION_DAYS)), len(spots))
+    strike = np.round(rows['close'].to_numpy() * moneyness, 0)
+    price = bs_price(rows['close'].to_numpy(), strike, exp_days / 365, vols[rows['ticker']].to_numpy(), False)
+    half_spread = np.maximum(0.01, price * 0.03)
+    option_df = pd.DataFrame({
+        'snapshot_date': rows['snapshot_date'],
+        'ticker': rows['ticker'],
+        'strike': strike,
+        'bid': np.maximum(np.round(price - half_spread, 2), 0),
+        'ask': np.round(price + half_spread, 2),
+        'exp_date': rows['snapshot_date'] + pd.to_timedelta(exp_days, unit='D'),
+    })
+    return compact(option_df, OPTION_DTYPES)
+
+
+def reference_trade(trade, option_df, stock_hist):
+    """Re-derive one trade (top put and outcome) with plain filtering, no merges."""
+    bars = stock_hist[(stock_hist['ticker'] == trade['ticker'])]
+    before = bars[bars['hist_date'] < trade['snapshot_date']]
+    current_price = before['close'].iloc[-1]
+    window = before[before['hist_date'] > before['hist_date'].iloc[-1] - pd.Timedelta(days=WEEK_52_DAYS)]
+    week_52_low = window['low'].min()
+
+    puts = option_df[(option_df['ticker'] == trade['ticker']) & (option_df['snapshot_date'] == trade['snapshot_date'])]
+    puts = puts[puts['bid'] > 0]
+    days = (puts['exp_date'] - puts['snapshot_date']).dt.days
+    discount = 1 - puts['strike'] / current_price
+    puts = puts[days.between(BACKTEST_FILTERS['min_days'], BACKTEST_FILTERS['max_days'])
+                & discount.between(BACKTEST_FILTERS['min_discount'], BACKTEST_FILTERS['max_discount'])]
+    annualized = ((puts['bid'] + puts['ask']) / 2 / puts['strike'] * 365
+                  / (puts['exp_date'] - puts['snapshot_date']).dt.days)
+    best = puts.loc[annualized.idxmax()]
+
+    settle_close = bars.loc[bars['hist_date'] <= best['exp_date'], 'close'].iloc[-1]
+    pnl = best['bid'] - max(best['strike'] - settle_close, 0)
+    return {'current_price': current_price, 'week_52_low': week_52_low, 'strike': best['strike'],
+            'exp_date': best['exp_date'], 'pnl': pnl}
+
+
+def check_trades(trades, option_chunks, stock_hist):
+    option_df = pd.concat(option_chunks, ignore_index=True)
+    option_df['ticker'] = option_df['ticker'].astype(str)
+    hist = stock_hist.assign(ticker=stock_hist['ticker'].astype(str)).sort_values('hist_date')
+    sample = trades[~trades['open']].sample(N_CHECKED_TRADES, random_state=0)
+    for _, trade in sample.iterrows():
+        expected = reference_trade(trade, option_df, hist)
+        for column, value in expected.items():
+            actual = trade[column]
+            if isinstance(value, pd.Timestamp):
+                assert actual == value, f"{trade['ticker']} {trade['snapshot_date']}: {column} {actual} vs {value}"
+            else:
+                assert abs(actual - value) < 1e-6, f"{trade['ticker']} {trade['snapshot_date']}: {column} {actual} vs {value}"
+    print(f"{N_CHECKED_TRADES} sampled trades match the row by row reference")
+
+
+def main():
+    rng = np.random.default_rng(1)
+    tickers = [f"T{i:03d}" for i in range(N_TICKERS)]
+    vols = pd.Series(rng.uniform(0.2, 0.8, N_TICKERS), index=tickers)
+
+    t_start = perf_counter()
+    stock_hist = synthetic_history(tickers, vols.to_numpy())
+    option_chunks = [synthetic_chains(stock_hist, vols, first, last)
+                     for first, last in month_ranges(START_DATE.date(), END_DATE.date())]
+    n_rows = sum(len(chunk) for chunk in option_chunks)
+    print(f"Built {len(stock_hist)} bars and {n_rows} option rows in {perf_counter() - t_start:.1f}s\n")
+
+    t_start = perf_counter()
+    stats, trades = run_backtest(iter(option_chunks), stock_hist)
+    secs = perf_counter() - t_start
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(stats.to_string(index=False))
+    print(f"\nrun_backtest: {n_rows} option rows, {len(trades)} trades in {secs:.1f}s "
+          f"(peak RSS {peak_rss_mb() or 0:.0f} MB)\n")
+
+    check_trades(trades, option_chunks, stock_hist)
+
+
+if __name__ == "__main__":
+    main()
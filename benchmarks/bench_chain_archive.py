@@ -0,0 +1,103 @@
+"""
+Benchmark: reading the Parquet option chain archive
+
+Archives N_DAYS daily snapshots of synthetic option chains for N_TICKERS
+tickers (chain_archive.py, in a temporary directory), then times reads:
+- one ticker, one month        : partition pruning on snapshot_date and ticker
+- one ticker, one month, 3 cols: plus column projection
+- every ticker, one day        : one snapshot_date partition
+- one ticker, one expiration   : exp_date predicate on row group statistics
+- full scan                    : every file, for scale
+
+Each read is checked against the same filter applied to the full scan with
+pandas.  Files touched come from the dataset's fragments for the filter.
+
+Run with: python benchmarks/bench_chain_archive.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+import pandas as pd
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from chain_archive import archive_dataset, archive_filter, read_archive, write_archive
+from chain_fetch import FETCH_POLICY, fetch_chains
+from providers import SyntheticProvider
+
+N_TICKERS = 50
+N_DAYS = 40
+N_EXPIRATIONS = 4
+N_STRIKES = 40
+
+
+def build_archive(root):
+    """Archive N_DAYS business days of synthetic chains under root.  Returns the snapshot dates."""
+    days = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=N_DAYS)
+    # Keep every strike, like the archive of an unpruned fetch
+    policy = {**FETCH_POLICY, 'prune': False, 'max_expirations': 0}
+    for day in days:
+        provider = SyntheticProvider(n_tickers=N_TICKERS, n_expirations=N_EXPIRATIONS, n_strikes=N_STRIKES,
+                                     today=day.date())
+        as_of_date = datetime.combine(day.date(), datetime.min.time()).replace(hour=6, minute=30)
+        snapshot = {'snapshot_id': int(as_of_date.strftime('%Y%m%d%H%M%S')), 'snapshot_date': day.date(),
+                    'as_of_date': as_of_date}
+        chain_dfs = fetch_chains(provider.tickers, sides=('puts',), policy=policy, as_of_date=as_of_date,
+                                 ticker_factory=provider.ticker)
+        write_archive(chain_dfs, snapshot, root=root)
+    return days
+
+
+def timed_read(label, root, full_df, **kwargs):
+    """Read with read_archive, check it against pandas filtering of full_df and print time and files."""
+    predicates = {k: v for k, v in kwargs.items() if k != 'columns'}
+    n_files = len(list(archive_dataset(root=root).get_fragments(filter=archive_filter(**predicates))))
+
+    t_start = perf_counter()
+    df = read_archive('put_option_data', root=root, **kwargs)
+    secs = perf_counter() - t_start
+
+    expected = full_df
+    if predicates.get('tickers') is not None:
+        expected = expected[expected['ticker'].isin(predicates['tickers'])]
+    for column, bound, keep in (('snapshot_date', 'start_date', 'ge'), ('snapshot_date', 'end_date', 'le'),
+                                ('exp_date', 'exp_start', 'ge'), ('exp_date', 'exp_end', 'le')):
+        if predicates.get(bound) is not None:
+            expected = expected[getattr(expected[column], keep)(pd.Timestamp(predicates[bound]).date())]
+    assert len(df) == len(expected), f"{label}: {len(df)} rows read, {len(expected)} expected"
+    if kwargs.get('columns'):
+        assert list(df.columns) == list(kwargs['columns']), f"{label}: columns {list(df.columns)}"
+
+    print(f"{label:<32} {len(df):>9} rows {n_files:>6} files {secs * 1000:>9.1f} ms")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as root:
+        t_start = perf_counter()
+        days = build_archive(root)
+        print(f"\nArchived {N_DAYS} days x {N_TICKERS} tickers in {perf_counter() - t_start:.1f}s\n")
+
+        t_start = perf_counter()
+        full_df = read_archive('put_option_data', root=root)
+        print(f"{'full scan':<32} {len(full_df):>9} rows {N_DAYS * N_TICKERS:>6} files "
+              f"{(perf_counter() - t_start) * 1000:>9.1f} ms")
+
+        month_start, last_day = days[-21].date(), days[-1].date()
+        ticker = full_df['ticker'].iloc[0]
+        timed_read('one ticker, one month', root, full_df, tickers=[ticker], start_date=month_start,
+                   end_date=last_day)
+        timed_read('one ticker, one month, 3 cols', root, full_df, tickers=[ticker], start_date=month_start,
+                   end_date=last_day, columns=['exp_date', 'strike', 'bid'])
+        timed_read('every ticker, one day', root, full_df, start_date=last_day, end_date=last_day)
+        exp_date = full_df.loc[full_df['snapshot_date'] == last_day, 'exp_date'].min()
+        timed_read('one ticker, one expiration', root, full_df, tickers=[ticker], exp_start=exp_date,
+                   exp_end=exp_date)
+
+
+if __name__ == "__main__":
+    main()
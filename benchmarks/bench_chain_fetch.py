@@ -0,0 +1,55 @@
+"""
+Benchmark: concurrent option chain fetch
+
+Fetches the chains of N_TICKERS synthetic tickers whose every request
+sleeps LATENCY_MS (providers.SyntheticProvider, no network and no cache)
+with 1, 4 and 8 workers.  Wall clock time must drop with the worker count:
+- 4 workers at least MIN_SPEEDUP[4] times faster than 1
+- 8 workers at least MIN_SPEEDUP[8] times faster than 1
+
+Run with: python benchmarks/bench_chain_fetch.py
+Same rows at every worker count is checked in tests/test_chain_fetch.py.
+"""
+
+import os
+import sys
+from datetime import datetime
+from time import perf_counter
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from chain_fetch import fetch_chains
+from providers import SyntheticProvider
+
+N_TICKERS = 20
+LATENCY_MS = 100
+WORKER_COUNTS = [1, 4, 8]
+# Below the ideal 4x / 8x, to leave room for thread overhead and latency jitter
+MIN_SPEEDUP = {4: 2.5, 8: 4.0}
+
+
+def timed_fetch(max_workers, as_of_date):
+    provider = SyntheticProvider(n_tickers=N_TICKERS, latency_ms=LATENCY_MS)
+    t_start = perf_counter()
+    chain_dfs = fetch_chains(provider.tickers, max_workers=max_workers, as_of_date=as_of_date,
+                             ticker_factory=provider.ticker)
+    return perf_counter() - t_start, chain_dfs
+
+
+def main():
+    as_of_date = datetime.now()
+    results = {max_workers: timed_fetch(max_workers, as_of_date) for max_workers in WORKER_COUNTS}
+
+    base_secs, base_dfs = results[1]
+    print(f"{sum(len(df) for df in base_dfs.values())} rows per run")
+    for max_workers, (secs, _) in results.items():
+        speedup = base_secs / secs
+        print(f"{max_workers} workers: {secs:.2f}s ({speedup:.1f}x)")
+        if max_workers in MIN_SPEEDUP:
+            assert speedup >= MIN_SPEEDUP[max_workers], \
+                f"{max_workers} workers only {speedup:.1f}x faster (expected {MIN_SPEEDUP[max_workers]}x)"
+
+
+if __name__ == "__main__":
+    main()
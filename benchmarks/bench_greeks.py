@@ -0,0 +1,90 @@
+"""
+Benchmark: vectorized Black-Scholes greeks and implied volatility
+
+Times greeks.py on N_ROWS random options:
+- bs_greeks
+- implied_vol on the prices bs_greeks gave (the largest vol error where vega
+  makes the vol identifiable is printed alongside)
+- add_option_greeks on a put_candidate_options shaped frame, with a share
+  of the vendor IVs zeroed or made stale
+
+Reference values and the implied_vol round trip are checked in tests/test_greeks.py.
+
+Run with: python benchmarks/bench_greeks.py
+"""
+
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from greeks import add_option_greeks, bs_greeks, bs_price, implied_vol
+
+N_ROWS = 1_000_000
+
+
+def random_options(n, seed=0):
+    rng = np.random.default_rng(seed)
+    spot = rng.uniform(10, 500, n)
+    return {
+        'spot': spot,
+        'strike': spot * rng.uniform(0.5, 1.3, n),
+        'years': rng.integers(1, 400, n) / 365,
+        'vol': rng.uniform(0.05, 2.0, n),
+        'is_call': rng.random(n) < 0.5,
+    }
+
+
+def time_kernels(n):
+    options = random_options(n)
+    args = (options['spot'], options['strike'], options['years'], options['vol'], options['is_call'])
+
+    t_start = perf_counter()
+    greeks = bs_greeks(*args)
+    greeks_secs = perf_counter() - t_start
+
+    t_start = perf_counter()
+    solved = implied_vol(greeks['price'], options['spot'], options['strike'], options['years'], options['is_call'])
+    iv_secs = perf_counter() - t_start
+
+    # Deep in the money or nearly worthless options barely move with vol, so their vol can't be recovered
+    identifiable = greeks['vega'] > 1e-3
+    vol_error = np.nanmax(np.abs(solved - options['vol'])[identifiable])
+    print(f"bs_greeks         {n:>9} rows {greeks_secs:>6.2f}s")
+    print(f"implied_vol       {n:>9} rows {iv_secs:>6.2f}s (max vol error {vol_error:.1e} where vega > 0.001)")
+
+
+def time_add_option_greeks(n):
+    """add_option_greeks on puts quoted around their model price, with bad vendor IV on a fifth of them."""
+    rng = np.random.default_rng(1)
+    options = random_options(n, seed=1)
+    days = np.round(options['years'] * 365)
+    puts = bs_price(options['spot'], options['strike'], days / 365, options['vol'], False)
+    half_spread = np.maximum(0.01, puts * 0.03)
+    vendor_iv = options['vol'].copy()
+    bad = rng.random(n) < 0.2
+    vendor_iv[bad] = np.where(rng.random(bad.sum()) < 0.5, 0.0, vendor_iv[bad] * 1.5)
+    option_df = pd.DataFrame({
+        'strike': options['strike'], 'current_price': options['spot'], 'days_til_strike': days,
+        'bid': puts - half_spread, 'ask': puts + half_spread, 'mid': puts, 'impliedVolatility': vendor_iv,
+    })
+
+    t_start = perf_counter()
+    option_df = add_option_greeks(option_df)
+    secs = perf_counter() - t_start
+    print(f"add_option_greeks {n:>9} rows {secs:>6.2f}s ({option_df['iv_from_mid'].mean():.0%} IV from mid, "
+          f"{option_df['iv'].isna().mean():.1%} unsolvable)")
+
+
+def main():
+    time_kernels(N_ROWS)
+    time_add_option_greeks(N_ROWS)
+
+
+if __name__ == "__main__":
+    main()
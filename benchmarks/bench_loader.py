@@ -0,0 +1,103 @@
+"""
+Benchmark: DataFrame.to_sql vs COPY bulk loader
+
+Loads synthetic put_option_data rows into a local Postgres with
+1. the original head(0).to_sql(replace) + to_sql(append) path
+2. pg_loader.copy_replace
+
+Run with: python benchmarks/bench_loader.py
+Set DATABASE_HOST if Postgres is not on localhost.  The benchmark uses its own
+database (BENCH_DATABASE_NAME, default option_data_bench), created if missing,
+so its tables never touch option_data.
+"""
+
+import os
+import sys
+from time import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.types import Float
+from sqlalchemy.types import Date
+from sqlalchemy.types import DateTime
+from sqlalchemy.types import VARCHAR
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from pg_loader import copy_replace, database_url
+
+ROW_COUNTS = [10_000, 100_000, 1_000_000]
+
+column_typ_dict = {
+    'strike' : Float(),
+    'bid' : Float(),
+    'ask' : Float(),
+    'impliedVolatility' : Float(),
+    'exp_date' : Date(),
+    'as_of_date' : DateTime(),
+    'ticker' : VARCHAR(20)
+}
+
+
+def make_option_rows(n_rows, seed=0):
+    """Build n_rows of synthetic option data with the put_option_data columns."""
+    rng = np.random.default_rng(seed)
+    strike = rng.uniform(5, 500, n_rows).round(1)
+    bid = rng.uniform(0, 20, n_rows).round(2)
+    return pd.DataFrame({
+        'strike': strike,
+        'bid': bid,
+        'ask': (bid + rng.uniform(0, 1, n_rows)).round(2),
+        'impliedVolatility': rng.uniform(0.1, 1.5, n_rows),
+        'exp_date': pd.Timestamp('2026-01-16').date(),
+        'as_of_date': pd.Timestamp.now(),
+        'ticker': 'T' + pd.Series(rng.integers(0, 5000, n_rows)).astype(str),
+    })
+
+
+def load_with_to_sql(df, table_name, engine):
+    df.head(n=0).to_sql(name=table_name, con=engine, dtype=column_typ_dict, if_exists='replace', index=False)
+    df.to_sql(name=table_name, con=engine, if_exists='append', index=False)
+
+
+def bench_engine():
+    """Engine on the benchmark database, created first if it doesn't exist."""
+    os.environ.setdefault('DATABASE_HOST', 'localhost')
+    os.environ['DATABASE_NAME'] = os.getenv('BENCH_DATABASE_NAME', 'option_data_bench')
+    engine = create_engine(database_url())
+    admin = create_engine(engine.url.set(database='postgres'), isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        exists = conn.exec_driver_sql("SELECT 1 FROM pg_database WHERE datname = %(name)s",
+                                      {'name': engine.url.database}).scalar()
+        if not exists:
+            conn.exec_driver_sql(f'CREATE DATABASE "{engine.url.database}"')
+    admin.dispose()
+    return engine
+
+
+def main():
+    engine = bench_engine()
+
+    print(f"{'rows':>10} {'to_sql (s)':>12} {'copy (s)':>10} {'speedup':>8}")
+    for n_rows in ROW_COUNTS:
+        df = make_option_rows(n_rows)
+
+        t_start = time()
+        load_with_to_sql(df, 'bench_to_sql', engine)
+        to_sql_secs = time() - t_start
+
+        t_start = time()
+        copy_replace(df, 'bench_copy', engine, dtype=column_typ_dict)
+        copy_secs = time() - t_start
+
+        print(f"{n_rows:>10} {to_sql_secs:>12.2f} {copy_secs:>10.2f} {to_sql_secs / copy_secs:>7.1f}x")
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS bench_to_sql")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS bench_copy")
+
+
+if __name__ == "__main__":
+    main()
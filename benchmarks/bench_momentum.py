@@ -0,0 +1,92 @@
+"""
+Benchmark: row-by-row vs vectorized momentum indicators
+
+Builds synthetic daily history and candidate rows and times the vectorized
+indicators in momentum_signals.py at 5,000 tickers x 1 year of history
+against the row-by-row functions in put_leads.py.  That both give the same
+0/1 values is checked in tests/test_momentum_signals.py.
+
+The row-by-row version is only timed on a small sample (it scans the whole
+history once per candidate row) and extrapolated.
+
+Run with: python benchmarks/bench_momentum.py
+"""
+
+import os
+import sys
+from time import time
+
+import numpy as np
+import pandas as pd
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from momentum_signals import prepare_history, up_vs_pri_day_vs_8day, up_vs_pri_wk_vs_8day
+from put_leads import calculate_up_vs_pri_day_vs_8day, calculate_up_vs_pri_wk_vs_8day
+
+N_TICKERS = 5000
+N_DAYS = 252
+SAMPLE_TICKERS = 100
+
+
+def make_history(n_tickers, n_days, seed=0):
+    """Random-walk daily closes for n_tickers over the last n_days business days."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=n_days)
+    returns = rng.normal(0, 0.02, (n_tickers, n_days))
+    closes = 100 * np.exp(np.cumsum(returns, axis=1))
+    return pd.DataFrame({
+        'ticker': np.repeat([f"T{i}" for i in range(n_tickers)], n_days),
+        'hist_date': np.tile(dates, n_tickers),
+        'close': closes.ravel().round(2),
+    })
+
+
+def make_candidates(stock_hist_data, seed=0):
+    """One candidate row per ticker, priced near its last close."""
+    rng = np.random.default_rng(seed)
+    last = stock_hist_data.groupby('ticker', sort=False).tail(1).reset_index(drop=True)
+    return pd.DataFrame({
+        'ticker': last['ticker'],
+        'latest_close_date': last['hist_date'],
+        'current_price': (last['close'] * rng.uniform(0.97, 1.03, len(last))).round(2),
+    })
+
+
+def run_row_by_row(put_candidates_df, stock_hist_data):
+    day = put_candidates_df.apply(lambda row: calculate_up_vs_pri_day_vs_8day(row, stock_hist_data), axis=1)
+    wk = put_candidates_df.apply(lambda row: calculate_up_vs_pri_wk_vs_8day(row, stock_hist_data), axis=1)
+    return day, wk
+
+
+def run_vectorized(put_candidates_df, stock_hist_data):
+    hist = prepare_history(stock_hist_data)
+    return up_vs_pri_day_vs_8day(put_candidates_df, hist), up_vs_pri_wk_vs_8day(put_candidates_df, hist)
+
+
+def main():
+    stock_hist_data = make_history(N_TICKERS, N_DAYS)
+    put_candidates_df = make_candidates(stock_hist_data)
+    print(f"History rows: {len(stock_hist_data)}, candidates: {len(put_candidates_df)}")
+
+    # Row-by-row is too slow for the full universe
+    sample = put_candidates_df.head(SAMPLE_TICKERS)
+    sample_hist = stock_hist_data[stock_hist_data['ticker'].isin(sample['ticker'])]
+
+    t_start = time()
+    run_row_by_row(sample, sample_hist)
+    row_secs = time() - t_start
+
+    # Row-by-row cost grows with tickers x history rows, so scale by both
+    scale = (N_TICKERS / SAMPLE_TICKERS) ** 2
+    print(f"Row-by-row: {row_secs:.2f}s for {SAMPLE_TICKERS} tickers "
+          f"(~{row_secs * scale:.0f}s extrapolated to {N_TICKERS})")
+
+    t_start = time()
+    run_vectorized(put_candidates_df, stock_hist_data)
+    print(f"Vectorized: {time() - t_start:.2f}s for {N_TICKERS} tickers x {N_DAYS} days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Benchmark: end-to-end ingestion and analysis pipeline
+
+Runs every pipeline stage against a local Postgres with the synthetic market
+data provider (providers.py) at several universe sizes, and records per stage:
+- wall_s       : wall time
+- peak_rss_mb  : peak resident memory of the stage process
+- rows         : rows in the stage's output tables afterwards
+- rows_per_s   : rows / wall_s
+- db_bytes     : WAL bytes Postgres wrote during the stage
+
+Each stage runs as its own process, the same way the flow runs one script per
+task.  The dashboard queries run in this process against the put_leads output.
+
+--in-process runs the same stages through pipeline.py in one process instead
+(reported as a single 'pipeline' stage), to compare against the per-script runs.
+
+Results go to a JSON file and are compared with a stored baseline.  A stage
+that got slower or bigger than the baseline by more than --tolerance is
+reported as a regression and the script exits with status 1.
+
+Run with: python benchmarks/bench_pipeline.py --sizes 50 500 5000
+          python benchmarks/bench_pipeline.py --sizes 50 --update-baseline
+Set DATABASE_HOST if Postgres is not on localhost.  The benchmark uses its own
+database (BENCH_DATABASE_NAME, default option_data_bench), which is dropped and
+recreated for every size.
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow')
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, SCRIPTS_DIR)
+
+from dashboard_queries import option_counts_qry, option_summary_qry, top_options_qry
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [50, 500, 5000]
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'pipeline_baseline.json')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# (stage, script, output tables), in flow order
+STAGES = [
+    ('holdings_ingest', 'holdings_ingest.py', ['current_holdings']),
+    ('chain_ingest', 'chain_ingest.py', ['put_option_data', 'call_option_data']),
+    ('stock_hist', 'stock_hist.py', ['stock_hist_data']),
+    ('stock_dim_ingest', 'stock_dim_ingest.py', ['stock_dim_data']),
+    ('put_leads', 'put_leads.py', ['put_candidate_tickers', 'put_candidate_options']),
+]
+
+# pipeline.py stages matching STAGES (the sheets stage needs Google credentials)
+PIPELINE_RUNNER_STAGES = ['holdings', 'put_candidates', 'fetch_chains', 'write_chains', 'archive_chains', 'stock_hist',
+                          'stock_dim', 'put_leads']
+
+# Same slider defaults as the dashboard
+DASHBOARD_FILTERS = {'min_days': 7, 'max_days': 365, 'min_discount': 0.10, 'max_discount': 1.0, 'top_n': 3}
+
+# Wall time differences below this are noise, not regressions
+MIN_REGRESSION_SECONDS = 1.0
+
+
+def reset_database(db_host, db_name):
+    """Drop and recreate the benchmark database."""
+    admin = create_engine(f'postgresql://root:root@{db_host}:5432/postgres', isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{db_name}" WITH (FORCE)')
+        conn.exec_driver_sql(f'CREATE DATABASE "{db_name}"')
+    admin.dispose()
+
+
+def wal_lsn(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("SELECT pg_current_wal_lsn()").scalar()
+
+
+def wal_bytes(engine, lsn_start, lsn_end):
+    with engine.connect() as conn:
+        return int(conn.exec_driver_sql("SELECT pg_wal_lsn_diff(%s, %s)", (lsn_end, lsn_start)).scalar())
+
+
+def table_rows(engine, tables):
+    with engine.connect() as conn:
+        return sum(conn.exec_driver_sql(f'SELECT count(*) FROM "{t}"').scalar() for t in tables)
+
+
+def run_script(script, env, script_args=()):
+    """
+    Run one pipeline script in its own process.
+
+    Returns (wall seconds, peak RSS in MB).  Raises RuntimeError with the end
+    of the script's output if it fails.
+    """
+    with tempfile.TemporaryFile(mode='w+') as log:
+        t_start = perf_counter()
+        proc = subprocess.Popen([sys.executable, script, *script_args], cwd=SCRIPTS_DIR, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = perf_counter() - t_start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if proc.returncode != 0:
+            log.seek(0)
+            raise RuntimeError(f"{script} exited with {proc.returncode}:\n{log.read()[-4000:]}")
+    # ru_maxrss is in KB on Linux
+    return wall, rusage.ru_maxrss / 1024
+
+
+def stage_metrics(wall, peak_rss_mb, rows, db_bytes):
+    return {
+        'wall_s': round(wall, 3),
+        'peak_rss_mb': round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+        'rows': int(rows),
+        'rows_per_s': round(rows / wall, 1) if wall > 0 else None,
+        'db_bytes': int(db_bytes),
+    }
+
+
+def run_dashboard_queries(engine):
+    """Summary, counts, first and last page with the dashboard's default filters."""
+    t_start = perf_counter()
+    rows = len(pd.read_sql_query(option_summary_qry, engine))
+    counts = pd.read_sql_query(option_counts_qry, engine, params=DASHBOARD_FILTERS).iloc[0]
+    top_n_count = int(counts['top_n_count'])
+    for offset in sorted({0, max(top_n_count - 50, 0)}):
+        rows += len(pd.read_sql_query(top_options_qry, engine,
+                                      params={**DASHBOARD_FILTERS, 'limit': 50, 'offset': offset}))
+    wall = perf_counter() - t_start
+    return stage_metrics(wall, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, rows, 0)
+
+
+def run_size(n_tickers, db_host, db_name, latency_ms, in_process=False):
+    """Run every stage for one universe size.  Returns {stage: metrics}."""
+    reset_database(db_host, db_name)
+    engine = create_engine(f'postgresql://root:root@{db_host}:5432/{db_name}')
+
+    # Fresh Parquet chain archive per size (see chain_archive.py)
+    archive_dir = tempfile.TemporaryDirectory()
+    env = dict(os.environ)
+    env.update({
+        'DATABASE_HOST': db_host,
+        'DATABASE_NAME': db_name,
+        'MARKET_DATA_PROVIDER': 'synthetic',
+        'SYNTHETIC_TICKERS': str(n_tickers),
+        'SYNTHETIC_LATENCY_MS': str(latency_ms),
+        # Measure the full fetch, not cache hits from an earlier size
+        'MARKET_CACHE': 'off',
+        'CHAIN_ARCHIVE_PATH': archive_dir.name,
+    })
+
+    if in_process:
+        stages = [('pipeline', 'pipeline.py', PIPELINE_RUNNER_STAGES, [t for _, _, tables in STAGES for t in tables])]
+    else:
+        stages = [(stage, script, (), tables) for stage, script, tables in STAGES]
+
+    results = {}
+    for stage, script, script_args, tables in stages:
+        lsn_start = wal_lsn(engine)
+        wall, peak_rss_mb = run_script(script, env, script_args)
+        metrics = stage_metrics(wall, peak_rss_mb, table_rows(engine, tables),
+                                wal_bytes(engine, lsn_start, wal_lsn(engine)))
+        results[stage] = metrics
+        print(f"  {stage:<18} {metrics['wall_s']:>8.2f}s  {metrics['peak_rss_mb']:>8.1f} MB  "
+              f"{metrics['rows']:>9} rows  {metrics['db_bytes'] / 1e6:>8.1f} MB written")
+
+    results['dashboard_queries'] = run_dashboard_queries(engine)
+    print(f"  {'dashboard_queries':<18} {results['dashboard_queries']['wall_s']:>8.2f}s")
+    engine.dispose()
+    archive_dir.cleanup()
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return a list of regression messages (wall time and peak RSS per size and stage)."""
+    regressions = []
+    for size, stages in results['sizes'].items():
+        for stage, metrics in stages.items():
+            base = baseline.get('sizes', {}).get(size, {}).get(stage)
+            if not base:
+                continue
+            for metric in ('wall_s', 'peak_rss_mb'):
+                new, old = metrics.get(metric), base.get(metric)
+                if not new or not old or new <= old * (1 + tolerance):
+                    continue
+                if metric == 'wall_s' and new - old < MIN_REGRESSION_SECONDS:
+                    continue
+                regressions.append(f"{size} tickers / {stage}: {metric} {old} -> {new} (+{new / old - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='universe sizes (tickers)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='synthetic per-request latency')
+    parser.add_argument('--in-process', action='store_true', help='run the stages through pipeline.py in one process')
+    parser.add_argument('--output', help='results JSON (default benchmarks/results/pipeline_<time>.json)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown / growth vs baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='write these results as the new baseline')
+    args = parser.parse_args()
+
+    db_host = os.getenv('DATABASE_HOST', 'localhost')
+    db_name = os.getenv('BENCH_DATABASE_NAME', 'option_data_bench')
+
+    results = {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                     capture_output=True, text=True).stdout.strip(),
+        'latency_ms': args.latency_ms,
+        'in_process': args.in_process,
+        'sizes': {},
+    }
+    for n_tickers in args.sizes:
+        print(f"{n_tickers} tickers")
+        results['sizes'][str(n_tickers)] = run_size(n_tickers, db_host, db_name, args.latency_ms, args.in_process)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Updated baseline {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}.  Run with --update-baseline to create one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions against baseline:")
+        for message in regressions:
+            print(f"  {message}")
+        sys.exit(1)
+    print(f"No regressions against baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
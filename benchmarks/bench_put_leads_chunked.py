@@ -0,0 +1,83 @@
+"""
+Benchmark: put_leads chunked mode vs the in-memory pandas path
+
+Reads put_option_data / stock_dim_data / stock_hist_data from a local
+Postgres and builds the put_candidate_options rows:
+- chunked, at each of CHUNK_ROWS: put_option_data streamed through a
+  server-side cursor, ticker-aligned, one chunk selected at a time
+- pandas: every option row loaded, then selected at once
+
+Each chunked result must equal the pandas one exactly.  Printed per run:
+time, number of chunks and the largest chunk held (MB).  Chunked runs go
+first, since the process peak RSS only grows.  Nothing is written back.
+
+Run with: python benchmarks/bench_put_leads_chunked.py
+Set DATABASE_HOST if Postgres is not on localhost.
+"""
+
+import os
+import sys
+from time import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from frame_schema import (OPTION_DTYPES, STOCK_DIM_DTYPES, compact, frame_mb, memory_report, peak_rss_mb,
+                          read_frame)
+from greeks import add_option_greeks
+from indicators import active_indicators, history_requirements
+from pg_loader import database_url
+from put_leads import (add_put_option_metrics, build_put_candidates, candidate_option_chunks, load_stock_hist,
+                       select_candidate_options)
+
+CHUNK_ROWS = [10000, 50000, 200000]
+
+
+def sorted_options(df):
+    df = df.assign(ticker=df['ticker'].astype(str))
+    return df.sort_values(['ticker', 'exp_date', 'strike']).reset_index(drop=True)
+
+
+def main():
+    os.environ.setdefault('DATABASE_HOST', 'localhost')
+    engine = create_engine(database_url())
+
+    indicator_names = active_indicators()
+    hist_columns, lookback_days = history_requirements(indicator_names)
+    stock_dim_data = compact(pd.read_sql_query("SELECT * FROM stock_dim_data", engine), STOCK_DIM_DTYPES)
+    stock_hist_data = load_stock_hist(engine, stock_dim_data, hist_columns, lookback_days)
+    tickers = pd.read_sql_query("SELECT DISTINCT ticker FROM put_option_data", engine)['ticker']
+    put_candidates_df = build_put_candidates(tickers, stock_dim_data, stock_hist_data, indicator_names, 'any')
+    memory_report('inputs', stock_dim_data=stock_dim_data, stock_hist_data=stock_hist_data)
+
+    chunked = {}
+    for chunk_rows in CHUNK_ROWS:
+        t_start = time()
+        frames, largest_mb = [], 0.0
+        for put_option_data in candidate_option_chunks(engine, put_candidates_df, chunk_rows=chunk_rows):
+            largest_mb = max(largest_mb, frame_mb(put_option_data))
+            frames.append(put_option_data.assign(ticker=put_option_data['ticker'].astype(str)))
+        secs = time() - t_start
+        chunked[chunk_rows] = sorted_options(pd.concat(frames, ignore_index=True))
+        print(f"chunked {chunk_rows:>7} rows: {secs:.2f}s, {len(frames)} chunks, largest {largest_mb:.1f} MB, "
+              f"peak RSS {peak_rss_mb() or 0:.0f} MB")
+
+    # In-memory reference
+    t_start = time()
+    put_option_data = add_put_option_metrics(read_frame("SELECT * FROM put_option_data", engine, OPTION_DTYPES))
+    loaded_mb = frame_mb(put_option_data)
+    put_option_data = select_candidate_options(put_option_data, put_candidates_df)
+    pandas_df = sorted_options(compact(add_option_greeks(put_option_data), OPTION_DTYPES))
+    print(f"pandas: {time() - t_start:.2f}s, {loaded_mb:.1f} MB of option rows loaded, "
+          f"peak RSS {peak_rss_mb() or 0:.0f} MB")
+
+    for chunk_rows, chunked_df in chunked.items():
+        pd.testing.assert_frame_equal(pandas_df, chunked_df, check_exact=True)
+    print(f"Outputs match: {len(pandas_df)} candidate option rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: put_leads pandas path vs SQL-backed path
+
+Reads the current put_option_data / stock_dim_data / stock_hist_data from a
+local Postgres, builds put_candidate_options both ways, checks they match and
+prints the time and rows transferred for each.  Nothing is written back.
+
+Both outputs are compacted with OPTION_DTYPES and compared dtype for dtype;
+floats may differ by RTOL at most (Postgres float8 vs numpy float64 rounding
+of the same expressions).
+
+Run with: python benchmarks/bench_put_leads_sql.py
+Set DATABASE_HOST if Postgres is not on localhost.
+"""
+
+import os
+import sys
+from time import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from frame_schema import OPTION_DTYPES, compact
+from indicators import active_indicators, history_requirements
+from pg_loader import database_url
+from put_leads import (add_put_option_metrics, build_put_candidates, load_candidate_options_sql,
+                       load_stock_hist, select_candidate_options)
+
+RTOL = 1e-12
+
+
+def sorted_options(df):
+    # Ticker categories come from different row sets on each side, so compare the strings
+    df = compact(df, OPTION_DTYPES).astype({'ticker': str})
+    return df.sort_values(['ticker', 'exp_date', 'strike']).reset_index(drop=True)
+
+
+def main():
+    os.environ.setdefault('DATABASE_HOST', 'localhost')
+    engine = create_engine(database_url())
+
+    indicator_names = active_indicators()
+    hist_columns, lookback_days = history_requirements(indicator_names)
+    stock_dim_data = pd.read_sql_query("SELECT * FROM stock_dim_data", engine)
+    stock_dim_data['latest_close_date'] = pd.to_datetime(stock_dim_data['latest_close_date'])
+    stock_hist_data = load_stock_hist(engine, stock_dim_data, hist_columns, lookback_days)
+
+    # pandas reference path
+    t_start = time()
+    put_option_data = pd.read_sql_query("SELECT * FROM put_option_data", engine)
+    rows_loaded = len(put_option_data)
+    put_option_data['exp_date'] = pd.to_datetime(put_option_data['exp_date'])
+    put_option_data = add_put_option_metrics(put_option_data)
+    put_candidates_df = build_put_candidates(put_option_data['ticker'].unique(), stock_dim_data,
+                                             stock_hist_data, indicator_names, 'any')
+    pandas_df = select_candidate_options(put_option_data, put_candidates_df)
+    pandas_secs = time() - t_start
+
+    # SQL-backed path
+    t_start = time()
+    tickers = pd.read_sql_query("SELECT DISTINCT ticker FROM put_option_data", engine)['ticker']
+    put_candidates_df = build_put_candidates(tickers, stock_dim_data, stock_hist_data, indicator_names, 'any')
+    sql_df = load_candidate_options_sql(engine, put_candidates_df)
+    sql_secs = time() - t_start
+
+    pandas_df = sorted_options(pandas_df)
+    sql_df = sorted_options(sql_df)
+    pd.testing.assert_frame_equal(pandas_df, sql_df, check_dtype=True, check_exact=False, rtol=RTOL, atol=0)
+    print(f"Outputs match: {len(sql_df)} candidate option rows")
+
+    print(f"pandas: {pandas_secs:.2f}s, {rows_loaded} option rows loaded")
+    print(f"sql:    {sql_secs:.2f}s, {len(sql_df)} option rows loaded")
+
+
+if __name__ == "__main__":
+    main()
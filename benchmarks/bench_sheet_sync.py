@@ -0,0 +1,101 @@
+"""
+Benchmark: full rewrite vs incremental Google Sheets sync
+
+Writes the three write_to_sheets.py sheets to FakeWorksheets (sheet_sync.py)
+with the synthetic market data provider, and counts API calls and cells
+written for:
+- full        : every run rewrites the sheet (what set_with_dataframe did)
+- incremental : sync_worksheet with the state kept from the previous run
+
+over a same-day rerun (nothing changed) and a run per following business day
+(quotes move, a day of history rolls in and out, tickers come and go).
+
+What each sync writes is checked in tests/test_sheet_sync.py.
+
+Run with: python benchmarks/bench_sheet_sync.py
+"""
+
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Import shared modules from the flow scripts directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
+
+from providers import SyntheticProvider
+from sheet_sync import FakeWorksheet, sync_worksheet
+from write_to_sheets import SHEET_KEYS
+
+N_TICKERS = 200
+N_DAYS = 5
+# Share of tickers that drop out of / join the candidate list each day
+TICKER_CHURN = 0.05
+
+
+def make_sheets(provider, tickers, today):
+    """Dataframes shaped like the three sheets for one run day."""
+    day = pd.Timestamp(today)
+    options, hist, candidates = [], [], []
+    for ticker_symbol in tickers:
+        bars = provider.history(ticker_symbol)
+        bars = bars[(bars.index > day - pd.Timedelta(days=31)) & (bars.index <= day)]
+        puts = provider.chain(ticker_symbol, provider.expirations(ticker_symbol)[0])[1]
+        puts = puts[puts['strike'] < bars['Close'].iloc[-1]].head(10)
+        options.append(pd.DataFrame({
+            'ticker': ticker_symbol, 'exp_date': provider.expirations(ticker_symbol)[0], 'strike': puts['strike'],
+            'bid': puts['bid'], 'ask': puts['ask'], 'current_price': bars['Close'].iloc[-1],
+        }))
+        hist.append(pd.DataFrame({'ticker': ticker_symbol, 'hist_date': bars.index, 'close': bars['Close'].values}))
+        candidates.append({'ticker': ticker_symbol, 'current_price': bars['Close'].iloc[-1],
+                           'week_52_high': bars['High'].max(), 'week_52_low': bars['Low'].min()})
+    return {
+        'put_candidate_gs_src': pd.concat(options, ignore_index=True),
+        'put_stock_hist_data': pd.concat(hist, ignore_index=True),
+        'Put_Candidates': pd.DataFrame(candidates),
+    }
+
+
+def main():
+    universe = [f"SYN{i:05d}" for i in range(int(N_TICKERS * 1.5))]
+    rng = np.random.default_rng(0)
+    tickers = list(universe[:N_TICKERS])
+    days = pd.bdate_range(end=pd.Timestamp(date.today()), periods=N_DAYS + 1)[:-1]
+
+    sheets = {name: (FakeWorksheet(), FakeWorksheet()) for name in SHEET_KEYS}
+    states = {name: None for name in SHEET_KEYS}
+
+    print(f"{N_TICKERS} tickers, {N_DAYS} run days, {TICKER_CHURN:.0%} ticker churn per day\n")
+    print(f"{'run':<15} {'sheet':<22} {'rows':>6} {'full calls':>10} {'full cells':>11} "
+          f"{'incr calls':>10} {'incr cells':>11}")
+    runs = [(days[0], 'first')] + [(days[0], 'rerun')] + [(d, 'next day') for d in days[1:]]
+    totals = {'full': [0, 0], 'incremental': [0, 0]}
+    for run_day, label in runs:
+        if label == 'next day':
+            # Some tickers drop out, new ones join
+            n_churn = int(len(tickers) * TICKER_CHURN)
+            dropped = set(rng.choice(tickers, n_churn, replace=False))
+            joined = [t for t in universe if t not in tickers][:n_churn]
+            tickers = [t for t in tickers if t not in dropped] + joined
+        provider = SyntheticProvider(n_tickers=len(universe), today=run_day.date())
+        for name, df in make_sheets(provider, tickers, run_day).items():
+            full_ws, incr_ws = sheets[name]
+            key_columns = SHEET_KEYS[name][1]
+            _, full_stats = sync_worksheet(full_ws, df, key_columns, None)
+            states[name], incr_stats = sync_worksheet(incr_ws, df, key_columns, states[name])
+            for mode, stats in (('full', full_stats), ('incremental', incr_stats)):
+                totals[mode][0] += stats['api_calls']
+                totals[mode][1] += stats['cells_written']
+            print(f"{label + ' ' + run_day.strftime('%m-%d'):<15} {name:<22} {len(df):>6} "
+                  f"{full_stats['api_calls']:>10} {full_stats['cells_written']:>11} "
+                  f"{incr_stats['api_calls']:>10} {incr_stats['cells_written']:>11}")
+
+    print(f"\nTotal full:        {totals['full'][0]} API calls, {totals['full'][1]} cells")
+    print(f"Total incremental: {totals['incremental'][0]} API calls, {totals['incremental'][1]} cells "
+          f"({totals['incremental'][1] / totals['full'][1]:.0%} of the cells)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Put Leads Backtest
+
+Replays the put_leads candidate rules over every stored option snapshot and
+measures what selling the top ranked put would have returned.
+
+For every (snapshot date, ticker) at once, instead of one put_leads run per
+date:
+1. Point in time stock dim: the last bar before the snapshot date gives
+   current_price and latest_close_date, the 365 days of bars ending there
+   the 52 week high / low.  Bars of the snapshot day itself are not used,
+   since the ingest runs before the close
+2. The registered indicators (indicators.py) on those rows, and each rule's
+   put_candidate_ind
+3. The put each ticker would have been shown first on the dashboard: bid > 0,
+   days til strike and price strike discount inside BACKTEST_FILTERS, best
+   annualized_return
+4. Settlement at expiry from stock_hist_data: the put is assigned when the
+   last close on or before exp_date is below the strike.  P&L per share is
+   the premium less max(strike - close, 0).  return is P&L over the strike
+   (cash secured)
+5. Statistics per rule: every signal alone, the 'any' and 'all' rules, and
+   all tickers as the baseline
+
+Each (date, ticker) a rule flags is one trade, so trades of consecutive days
+overlap.  Puts that have not expired by the last stored bar are left out and
+counted as open.  The premium is the bid (BACKTEST_FILL=mid for the mid).
+
+Option snapshots come from the Parquet chain archive (chain_archive.py) or,
+with BACKTEST_SOURCE=postgres, the put_option_data snapshot partitions.  They
+are read one month at a time and reduced to one put per (date, ticker) right
+away, so memory follows a month of chains, not the whole history.
+
+Run with: python backtest.py [start_date] [end_date]   (default: the last 365 days)
+Writes the statistics to put_leads_backtest and prints them.
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.types import Float, Integer, VARCHAR
+
+from chain_archive import read_archive
+from frame_schema import DATE, HIST_DTYPES, OPTION_DTYPES, compact, memory_report, read_frame
+from indicators import INDICATORS, active_indicators, compute_indicators, history_requirements, put_candidate_ind
+from pg_loader import copy_replace, database_url
+from pipeline_metrics import flush, incr, stage
+from snapshot_store import snapshot_table
+
+# Same defaults as the dashboard sliders
+BACKTEST_FILTERS = {'min_days': 7, 'max_days': 365, 'min_discount': 0.10, 'max_discount': 1.0}
+
+BACKTEST_FILLS = ('bid', 'mid')
+BACKTEST_SOURCES = ('archive', 'postgres')
+
+# Window for the 52 week high / low, as in stock_dim_ingest.py
+WEEK_52_DAYS = 365
+
+OPTION_COLUMNS = ['snapshot_id', 'snapshot_date', 'ticker', 'strike', 'bid', 'ask', 'exp_date']
+
+backtest_schema_dc = {
+    'rule' : VARCHAR(64),
+    'trades' : Integer(),
+    'open_trades' : Integer(),
+    'assigned_rate' : Float(),
+    'win_rate' : Float(),
+    'mean_return' : Float(),
+    'median_return' : Float(),
+    'return_std' : Float(),
+    'worst_return' : Float(),
+    'mean_annualized_return' : Float(),
+    'total_pnl' : Float(),
+    'start_date' : VARCHAR(10),
+    'end_date' : VARCHAR(10),
+}
+
+
+def month_ranges(start_date, end_date):
+    """(first, last) dates of each calendar month between start_date and end_date, clipped to them."""
+    ranges = []
+    first = start_date
+    while first <= end_date:
+        next_month = (first.replace(day=1) + timedelta(days=32)).replace(day=1)
+        ranges.append((first, min(next_month - timedelta(days=1), end_date)))
+        first = next_month
+    return ranges
+
+
+def _latest_snapshot_per_day(option_df):
+    """Rows of the last snapshot of each snapshot_date (runs repeated on one day keep the last)."""
+    last_id = option_df.groupby('snapshot_date', observed=True)['snapshot_id'].transform('max')
+    return option_df[option_df['snapshot_id'] == last_id].drop(columns='snapshot_id')
+
+
+def load_option_snapshots(start_date, end_date, tickers=None, source=None, engine=None):
+    """
+    Put option snapshots between start_date and end_date (inclusive), one frame per month.
+
+    source is 'archive' (default BACKTEST_SOURCE or 'archive') or 'postgres'.
+    Yields compact frames with snapshot_date, ticker, strike, bid, ask, exp_date.
+    """
+    source = source or os.getenv('BACKTEST_SOURCE', 'archive')
+    if source not in BACKTEST_SOURCES:
+        raise ValueError(f"Unknown backtest source: {source}.  Use one of {BACKTEST_SOURCES}")
+    for first, last in month_ranges(start_date, end_date):
+        if source == 'archive':
+            option_df = read_archive('put_option_data', columns=OPTION_COLUMNS, start_date=first, end_date=last,
+                                     tickers=tickers)
+        else:
+            option_df = read_frame(
+                f"SELECT {', '.join(OPTION_COLUMNS)} FROM {snapshot_table('put_option_data')} "
+                "WHERE snapshot_date BETWEEN %(first)s AND %(last)s"
+                + (" AND ticker = ANY(%(tickers)s)" if tickers is not None else ''),
+                engine, OPTION_DTYPES, params={'first': first, 'last': last, 'tickers': list(tickers or [])})
+        if option_df.empty:
+            continue
+        option_df = compact(option_df, {**OPTION_DTYPES, 'snapshot_date': DATE})
+        yield _latest_snapshot_per_day(option_df)
+
+
+def point_in_time_dim(stock_hist):
+    """
+    Stock dim fields as of every bar: current_price and latest_close_date of
+    the bar, week_52_high / low over the WEEK_52_DAYS ending on it.
+    """
+    hist = stock_hist[['ticker', 'hist_date', 'high', 'low', 'close']].copy()
+    hist['ticker'] = hist['ticker'].astype(str)
+    hist = hist.sort_values(['ticker', 'hist_date'], kind='mergesort').reset_index(drop=True)
+    window = hist.groupby('ticker', sort=False).rolling(f'{WEEK_52_DAYS}D', on='hist_date')
+    return pd.DataFrame({
+        'ticker': hist['ticker'],
+        'latest_close_date': hist['hist_date'],
+        'current_price': hist['close'].astype('float64'),
+        'week_52_high': window['high'].max().to_numpy(),
+        'week_52_low': window['low'].min().to_numpy(),
+    }).sort_values('latest_close_date', kind='mergesort', ignore_index=True)
+
+
+def point_in_time_rows(snapshot_days, stock_dim):
+    """
+    stock_dim fields for each (snapshot_date, ticker) in snapshot_days, from the last bar before snapshot_date.
+
+    Rows with no earlier bar are dropped.
+    """
+    cands = snapshot_days.assign(ticker=snapshot_days['ticker'].astype(str))
+    cands = pd.merge_asof(cands.sort_values('snapshot_date'), stock_dim, left_on='snapshot_date',
+                          right_on='latest_close_date', by='ticker', direction='backward', allow_exact_matches=False)
+    return cands.dropna(subset=['current_price']).reset_index(drop=True)
+
+
+def select_top_puts(option_df, cands, filters, fill):
+    """
+    The first put the dashboard would list for each (snapshot_date, ticker) of cands.
+
+    Adds premium, days_til_strike, price_strike_discount and annualized_return
+    (on mid, as in put_leads.py).  Returns one row per (snapshot_date, ticker)
+    that has a put inside filters.
+    """
+    puts = option_df.assign(ticker=option_df['ticker'].astype(str)).merge(
+        cands[['snapshot_date', 'ticker', 'current_price']], on=['snapshot_date', 'ticker'])
+    mid = (puts['bid'] + puts['ask']) / 2
+    puts['premium'] = mid if fill == 'mid' else puts['bid']
+    puts['days_til_strike'] = (puts['exp_date'] - puts['snapshot_date']).dt.days
+    puts['price_strike_discount'] = 1 - puts['strike'] / puts['current_price']
+    puts['annualized_return'] = mid / puts['strike'] * 365 / puts['days_til_strike']
+    tradable = (
+        (puts['bid'] > 0)
+        & puts['days_til_strike'].between(filters['min_days'], filters['max_days'])
+        & puts['price_strike_discount'].between(filters['min_discount'], filters['max_discount'])
+    )
+    puts = puts[tradable].sort_values('annualized_return', ascending=False, kind='mergesort')
+    return puts.drop_duplicates(['snapshot_date', 'ticker']).reset_index(drop=True)
+
+
+def settle_trades(trades, stock_hist):
+    """
+    Expiry outcome of each put from the last close on or before exp_date.
+
+    Puts expiring after the ticker's last stored bar get open = True and no outcome.
+    """
+    hist = stock_hist[['ticker', 'hist_date', 'close']].assign(ticker=stock_hist['ticker'].astype(str))
+    hist = hist.rename(columns={'hist_date': 'settle_date', 'close': 'settle_close'}).sort_values('settle_date')
+    last_bar = hist.groupby('ticker')['settle_date'].max().rename('last_bar_date')
+
+    trades = pd.merge_asof(trades.sort_values('exp_date'), hist, left_on='exp_date', right_on='settle_date',
+                           by='ticker', direction='backward')
+    trades = trades.merge(last_bar, left_on='ticker', right_index=True, how='left')
+    trades['open'] = ~(trades['exp_date'] <= trades['last_bar_date'])
+
+    strike, close = trades['strike'].astype('float64'), trades['settle_close'].where(~trades['open'])
+    # 1.0 / 0.0, NaN while open
+    trades['assigned'] = (close < strike).astype('float64').where(close.notna())
+    trades['pnl'] = trades['premium'] - np.maximum(strike - close, 0)
+    trades['return'] = trades['pnl'] / strike
+    trades['annualized'] = trades['return'] * 365 / trades['days_til_strike']
+    return trades.drop(columns=['settle_date', 'last_bar_date'])
+
+
+def rule_flags(cands, indicator_names):
+    """Boolean column per rule over cands: each signal, 'any', 'all' and 'all_tickers'."""
+    flags = pd.DataFrame({name: cands[name] == 1 for name in indicator_names if INDICATORS[name]['signal']})
+    for rule in ('any', 'all'):
+        flags[rule] = put_candidate_ind(cands, indicator_names, rule=rule) == 1
+    flags['all_tickers'] = True
+    return flags
+
+
+def rule_stats(trades, flags):
+    """Return statistics per rule over the trades each rule flags."""
+    rows = []
+    for rule in flags.columns:
+        rule_trades = trades[flags.loc[trades['cand_idx'], rule].to_numpy()]
+        closed = rule_trades[~rule_trades['open']]
+        returns = closed['return'].astype('float64')
+        rows.append({
+            'rule': rule,
+            'trades': len(closed),
+            'open_trades': int(rule_trades['open'].sum()),
+            'assigned_rate': closed['assigned'].mean(),
+            'win_rate': (closed['pnl'] > 0).mean() if len(closed) else np.nan,
+            'mean_return': returns.mean(),
+            'median_return': returns.median(),
+            'return_std': returns.std(),
+            'worst_return': returns.min(),
+            'mean_annualized_return': closed['annualized'].astype('float64').mean(),
+            # Per contract (100 shares)
+            'total_pnl': closed['pnl'].astype('float64').sum() * 100,
+        })
+    return pd.DataFrame(rows)
+
+
+def run_backtest(option_chunks, stock_hist, indicator_names=None, filters=None, fill=None):
+    """
+    Backtest the candidate rules over option_chunks (a frame or an iterable of
+    frames from load_option_snapshots) against stock_hist.
+
+    Returns (stats, trades): one row per rule, and one row per selected put
+    with its outcome and the indicator columns.
+    """
+    indicator_names = active_indicators(indicator_names)
+    filters = {**BACKTEST_FILTERS, **(filters or {})}
+    fill = fill or os.getenv('BACKTEST_FILL', 'bid')
+    if fill not in BACKTEST_FILLS:
+        raise ValueError(f"Unknown backtest fill: {fill}.  Use one of {BACKTEST_FILLS}")
+    if isinstance(option_chunks, pd.DataFrame):
+        option_chunks = [option_chunks]
+
+    with stage('point_in_time_dim'):
+        stock_dim = point_in_time_dim(stock_hist)
+
+    cand_list, trade_list = [], []
+    with stage('select_puts'):
+        for option_df in option_chunks:
+            cands = point_in_time_rows(option_df[['snapshot_date', 'ticker']].drop_duplicates(), stock_dim)
+            top_puts = select_top_puts(option_df, cands, filters, fill)
+            incr('rows_fetched', len(option_df))
+            memory_report('select_puts', option_df=option_df, top_puts=top_puts)
+            cand_list.append(cands)
+            trade_list.append(top_puts)
+    if not cand_list:
+        print("No option snapshots in range")
+        return pd.DataFrame(columns=list(backtest_schema_dc)), pd.DataFrame()
+
+    with stage('compute_indicators'):
+        # Every (date, ticker) at once, so history is prepared a single time
+        cands = compute_indicators(pd.concat(cand_list, ignore_index=True), stock_hist, indicator_names)
+        cands['cand_idx'] = cands.index
+
+    with stage('settle_trades'):
+        trades = pd.concat(trade_list, ignore_index=True).merge(
+            cands[['snapshot_date', 'ticker', 'cand_idx', 'week_52_high', 'week_52_low'] + indicator_names], on=['snapshot_date', 'ticker'])
+        trades = settle_trades(trades, stock_hist)
+
+    with stage('rule_stats'):
+        stats = rule_stats(trades, rule_flags(cands, indicator_names).set_index(cands['cand_idx']))
+    print(f"Backtested {len(cands)} (date, ticker) rows, {len(trades)} puts selected, "
+          f"{int(trades['open'].sum())} still open")
+    return stats, trades
+
+
+def main():
+    end_date = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else date.today()
+    start_date = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else end_date - timedelta(days=365)
+    indicator_names = active_indicators()
+    _, lookback_days = history_requirements(indicator_names)
+
+    engine = create_engine(database_url())
+    try:
+        with stage('load_history'):
+            # 52 week window and indicator lookback before the first date, through today for settlement
+            since = start_date - timedelta(days=WEEK_52_DAYS + lookback_days)
+            stock_hist = read_frame("SELECT ticker, hist_date, high, low, close FROM stock_hist_data "
+                                    "WHERE hist_date >= %(since)s", engine, HIST_DTYPES, params={'since': since})
+            print(f"Loaded {len(stock_hist)} historical stock records since {since}")
+
+        stats, _ = run_backtest(load_option_snapshots(start_date, end_date, engine=engine), stock_hist,
+                                indicator_names)
+        stats['start_date'], stats['end_date'] = start_date.isoformat(), end_date.isoformat()
+
+        with stage('write_backtest'):
+            copy_replace(stats, 'put_leads_backtest', engine, dtype=backtest_schema_dc)
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(stats.drop(columns=['start_date', 'end_date']).to_string(index=False))
+    finally:
+        flush(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Option Chain Archive
+
+Keeps every option chain the ingest pulls as Parquet files on local disk, so
+history outlives the snapshot retention in Postgres (snapshot_store.py) and
+research can read it without scanning the database.
+
+Layout (hive partitioning), one file per snapshot and ticker:
+
+    CHAIN_ARCHIVE_PATH/put_option_data/snapshot_date=2025-01-17/ticker=AMD/part-20250117143000000-0.parquet
+    CHAIN_ARCHIVE_PATH/call_option_data/...
+
+Rows keep the put_option_data / call_option_data columns plus snapshot_id.
+A second run on the same day adds its own file next to the first one.
+
+    write_archive(chain_dfs, snapshot)                        # chain_ingest.py / pipeline.py
+    read_archive('put_option_data', tickers=['AMD'], start_date='2025-01-01', end_date='2025-01-31',
+                 columns=['strike', 'bid', 'ask', 'exp_date'])
+
+read_archive only opens the partitions matching the snapshot_date and ticker
+predicates.  exp_date predicates are checked against the Parquet row group
+statistics before any row is read.
+
+CHAIN_ARCHIVE=off skips writing.
+"""
+
+import os
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Root directory of the archive.  The flow mounts a host directory here
+CHAIN_ARCHIVE_PATH = os.getenv('CHAIN_ARCHIVE_PATH', 'chain_archive')
+CHAIN_ARCHIVE_ENABLED = os.getenv('CHAIN_ARCHIVE', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+# chain_dfs side -> archived table
+ARCHIVE_TABLES = {'puts': 'put_option_data', 'calls': 'call_option_data'}
+
+PARTITIONING = ds.partitioning(pa.schema([('snapshot_date', pa.date32()), ('ticker', pa.string())]), flavor='hive')
+
+ARCHIVE_SCHEMA = pa.schema([
+    ('strike', pa.float64()),
+    ('bid', pa.float64()),
+    ('ask', pa.float64()),
+    ('impliedVolatility', pa.float64()),
+    ('exp_date', pa.date32()),
+    ('as_of_date', pa.timestamp('us')),
+    ('snapshot_id', pa.int64()),
+    ('snapshot_date', pa.date32()),
+    ('ticker', pa.string()),
+])
+
+
+def _table_path(table_name, root=None):
+    return os.path.join(root or CHAIN_ARCHIVE_PATH, table_name)
+
+
+def _archive_table(chain_df, snapshot):
+    """chain_df stamped with the snapshot, as an Arrow table with ARCHIVE_SCHEMA."""
+    archive_df = pd.DataFrame({
+        'strike': chain_df['strike'].astype('float64'),
+        'bid': chain_df['bid'].astype('float64'),
+        'ask': chain_df['ask'].astype('float64'),
+        'impliedVolatility': chain_df['impliedVolatility'].astype('float64'),
+        'exp_date': pd.to_datetime(chain_df['exp_date']).dt.date,
+        'as_of_date': pd.Timestamp(snapshot['as_of_date']),
+        'snapshot_id': snapshot['snapshot_id'],
+        'snapshot_date': snapshot['snapshot_date'],
+        'ticker': chain_df['ticker'].astype(str),
+    })
+    return pa.Table.from_pandas(archive_df, schema=ARCHIVE_SCHEMA, preserve_index=False)
+
+
+def write_archive(chain_dfs, snapshot, root=None):
+    """
+    Write each side of chain_dfs to its archive table under the snapshot's date.
+
+    chain_dfs is the dict of side -> dataframe from fetch_chains, snapshot the
+    run's new_snapshot().  Returns the number of rows written.
+    """
+    if not CHAIN_ARCHIVE_ENABLED:
+        return 0
+    rows = 0
+    for side, table_name in ARCHIVE_TABLES.items():
+        chain_df = chain_dfs.get(side)
+        if chain_df is None or chain_df.empty:
+            continue
+        ds.write_dataset(
+            _archive_table(chain_df, snapshot), _table_path(table_name, root), format='parquet',
+            partitioning=PARTITIONING, basename_template=f"part-{snapshot['snapshot_id']}-{{i}}.parquet",
+            # Files of earlier snapshots in the same partitions are kept
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        rows += len(chain_df)
+    print(f"Archived {rows} option rows to {root or CHAIN_ARCHIVE_PATH}")
+    return rows
+
+
+def _as_date(value):
+    return pd.Timestamp(value).date() if value is not None else None
+
+
+def archive_filter(start_date=None, end_date=None, tickers=None, exp_start=None, exp_end=None):
+    """
+    Arrow filter expression for read_archive's predicates (None when there are none).
+
+    Dates are inclusive.  snapshot_date and ticker prune partitions, exp_date
+    prunes row groups.
+    """
+    predicates = []
+    if start_date is not None:
+        predicates.append(ds.field('snapshot_date') >= _as_date(start_date))
+    if end_date is not None:
+        predicates.append(ds.field('snapshot_date') <= _as_date(end_date))
+    if tickers is not None:
+        predicates.append(ds.field('ticker').isin(list(tickers)))
+    if exp_start is not None:
+        predicates.append(ds.field('exp_date') >= _as_date(exp_start))
+    if exp_end is not None:
+        predicates.append(ds.field('exp_date') <= _as_date(exp_end))
+    if not predicates:
+        return None
+    expression = predicates[0]
+    for predicate in predicates[1:]:
+        expression = expression & predicate
+    return expression
+
+
+def archive_dataset(table_name='put_option_data', root=None):
+    """The archived table as a pyarrow dataset (for scans that don't fit in one dataframe)."""
+    return ds.dataset(_table_path(table_name, root), format='parquet', partitioning=PARTITIONING,
+                      schema=ARCHIVE_SCHEMA)
+
+
+def read_archive(table_name='put_option_data', columns=None, start_date=None, end_date=None, tickers=None,
+                 exp_start=None, exp_end=None, root=None):
+    """
+    Archived option rows of table_name as a dataframe.
+
+    columns projects the read (default: every ARCHIVE_SCHEMA column).
+    start_date / end_date bound snapshot_date, tickers lists the tickers and
+    exp_start / exp_end bound exp_date, all inclusive.  Returns an empty
+    dataframe when nothing was archived yet.
+    """
+    columns = list(columns or ARCHIVE_SCHEMA.names)
+    if not os.path.isdir(_table_path(table_name, root)):
+        return ARCHIVE_SCHEMA.empty_table().select(columns).to_pandas()
+    table = archive_dataset(table_name, root).to_table(
+        columns=columns, filter=archive_filter(start_date, end_date, tickers, exp_start, exp_end))
+    return table.to_pandas()
+
+
+def archived_dates(table_name='put_option_data', root=None):
+    """Snapshot dates present in the archive, from the partition directories only."""
+    table_path = _table_path(table_name, root)
+    if not os.path.isdir(table_path):
+        return []
+    return sorted(date.fromisoformat(name.split('=', 1)[1]) for name in os.listdir(table_path)
+                  if name.startswith('snapshot_date='))
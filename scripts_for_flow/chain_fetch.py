@@ -0,0 +1,197 @@
+"""
+Concurrent Option Chain Fetcher
+
+Pulls option chains for many tickers at once instead of walking them one
+expiration at a time. Every (ticker, expiration) request runs on a bounded
+thread pool and results are collected as they arrive, so total run time is
+closer to the slowest requests than to the sum of every HTTP round trip.
+
+Puts and calls come back from the same option_chain(exp) response, so both
+sides can be kept from a single fetch.
+
+A fetch policy decides what is requested and kept (see FETCH_POLICY):
+- expirations between min_dte and max_dte days out, at most max_expirations
+  of them, instead of the first three listed
+- out of the money strikes only, within max_otm of the underlying price
+  (puts: strike below price, calls: strike above price).  The price comes
+  from the chain response, so it costs no extra request
+- quotes with a bid above min_bid (zero bids can't be sold)
+put_leads.py and the dashboard only ever use these rows.  CHAIN_PRUNE=off keeps
+every strike and quote of the selected expirations.
+
+Output keeps the put_option_data / call_option_data schema:
+strike, bid, ask, impliedVolatility, exp_date, as_of_date, ticker
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+
+from market_cache import cached_ticker
+from pipeline_metrics import call_with_retries, in_current_stage, incr
+
+# Columns kept from the yfinance option chain
+CHAIN_COLUMNS = ['strike', 'bid', 'ask', 'impliedVolatility']
+OUTPUT_COLUMNS = CHAIN_COLUMNS + ['exp_date', 'as_of_date', 'ticker']
+
+# Number of concurrent requests.  Override with CHAIN_FETCH_WORKERS in the flow
+DEFAULT_MAX_WORKERS = int(os.getenv('CHAIN_FETCH_WORKERS', '8'))
+
+# Expirations and strikes to fetch and keep.  Override in the flow with the CHAIN_* env vars
+FETCH_POLICY = {
+    # Days to expiry range of the expirations to request
+    'min_dte': int(os.getenv('CHAIN_MIN_DTE', '1')),
+    'max_dte': int(os.getenv('CHAIN_MAX_DTE', '45')),
+    # Nearest expirations in the range to request (0 for all of them)
+    'max_expirations': int(os.getenv('CHAIN_MAX_EXPIRATIONS', '3')),
+    # Out of the money band: |strike / price - 1| at most max_otm
+    'max_otm': float(os.getenv('CHAIN_MAX_OTM', '0.3')),
+    # Keep quotes with bid > min_bid
+    'min_bid': float(os.getenv('CHAIN_MIN_BID', '0')),
+    # Apply the strike band and bid filter (expirations are always picked by days to expiry)
+    'prune': os.getenv('CHAIN_PRUNE', 'on').lower() not in ('0', 'off', 'false', 'no'),
+}
+
+
+def empty_chain_df():
+    """Return an empty dataframe with the option data output columns."""
+    return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+
+def select_expirations(exp_dates, as_of_date, policy):
+    """Expiration date strings between policy min_dte and max_dte days after as_of_date, nearest first."""
+    as_of_day = pd.Timestamp(as_of_date).date()
+    in_range = sorted(exp for exp in exp_dates
+                      if policy['min_dte'] <= (datetime.strptime(exp, "%Y-%m-%d").date() - as_of_day).days
+                      <= policy['max_dte'])
+    return tuple(in_range[:policy['max_expirations']] if policy['max_expirations'] else in_range)
+
+
+def prune_chain(chain_df, side, price, policy):
+    """
+    Rows of one side of a chain inside the policy: out of the money within
+    max_otm of price, and bid above min_bid.
+
+    Without a price (missing from the response) only the bid filter applies.
+    """
+    keep = chain_df['bid'] > policy['min_bid']
+    if price:
+        otm_distance = chain_df['strike'] / price - 1
+        if side == 'puts':
+            otm_distance = -otm_distance
+        keep &= (otm_distance > 0) & (otm_distance <= policy['max_otm'])
+    return chain_df[keep]
+
+
+def _underlying_price(option_chain):
+    """Underlying price sent with the chain response (yfinance option_chain().underlying), or None."""
+    underlying = getattr(option_chain, 'underlying', None) or {}
+    price = underlying.get('regularMarketPrice')
+    return float(price) if price else None
+
+
+def _get_expirations(ticker_symbol, policy, as_of_date, ticker_factory):
+    """
+    Look up expiration dates for a ticker.
+
+    Returns the ticker object (reused for the chain requests) and a tuple of
+    the expiration date strings selected by the policy.
+    """
+    curr_ticker = ticker_factory(ticker_symbol)
+    exp_dates = call_with_retries(lambda: curr_ticker.options, label=f"{ticker_symbol} expirations")
+    return curr_ticker, select_expirations(exp_dates, as_of_date, policy)
+
+
+def _get_chain(curr_ticker, ticker_symbol, exp_str, sides, as_of_date, policy):
+    """
+    Pull one option chain, prune it to the policy and shape each requested
+    side into the output schema.
+
+    sides is a tuple of 'puts' and/or 'calls'.  Returns a dict of
+    side -> (dataframe, rows before pruning).
+    """
+    option_chain_curr = call_with_retries(curr_ticker.option_chain, exp_str, label=f"{ticker_symbol} {exp_str}")
+    # Expiration Dates coming from options attribute are strings.  Convert to date before storing it in final dataframe
+    curr_exp_dt = datetime.strptime(exp_str, "%Y-%m-%d").date()
+    price = _underlying_price(option_chain_curr)
+
+    chain_dfs = {}
+    for side in sides:
+        chain_df = getattr(option_chain_curr, side)[CHAIN_COLUMNS]
+        n_fetched = len(chain_df)
+        if policy['prune']:
+            chain_df = prune_chain(chain_df, side, price, policy)
+        chain_df = chain_df.copy()
+        chain_df['exp_date'] = curr_exp_dt
+        chain_df['as_of_date'] = as_of_date
+        chain_df['ticker'] = ticker_symbol
+        chain_dfs[side] = (chain_df, n_fetched)
+    return chain_dfs
+
+
+def fetch_chains(tickers, sides=('puts', 'calls'), max_workers=None, policy=None,
+                 as_of_date=None, ticker_factory=cached_ticker):
+    """
+    Fetch option chains for every ticker concurrently.
+
+    Expiration lookups and chain requests share one thread pool capped at
+    max_workers.  As soon as a ticker's expirations come back, its chain
+    requests are queued, so there is no barrier between the two phases.
+    Each (ticker, expiration) is requested once and every side in sides is
+    kept from that response, pruned to policy (default FETCH_POLICY).  Failed requests are retried, then counted
+    and skipped (see pipeline_metrics.py).
+
+    ticker_factory builds the object that exposes .options and
+    .option_chain(exp).  It defaults to the cached yfinance ticker (see
+    market_cache.py) and lets a fake provider stand in for yfinance.
+
+    Returns a dict of side -> dataframe with OUTPUT_COLUMNS.
+    """
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+    policy = policy or FETCH_POLICY
+    as_of_date = as_of_date or datetime.now()
+    chain_lists = {side: [] for side in sides}
+    rows_fetched = {side: 0 for side in sides}
+    # Workers count their requests towards the caller's stage
+    get_expirations, get_chain = in_current_stage(_get_expirations), in_current_stage(_get_chain)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for ticker_symbol in pd.unique(pd.Series(tickers)):
+            future = executor.submit(get_expirations, ticker_symbol, policy, as_of_date, ticker_factory)
+            pending[future] = (ticker_symbol, None)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                ticker_symbol, exp_str = pending.pop(future)
+
+                try:
+                    result = future.result()
+                except Exception:
+                    # Already retried, counted and logged by call_with_retries
+                    continue
+
+                if exp_str is None:
+                    # Expiration lookup finished.  Queue one chain request per expiration
+                    curr_ticker, exp_dates = result
+                    for exp in exp_dates:
+                        chain_future = executor.submit(get_chain, curr_ticker, ticker_symbol, exp, sides, as_of_date,
+                                                       policy)
+                        pending[chain_future] = (ticker_symbol, exp)
+                else:
+                    for side, (chain_df, n_fetched) in result.items():
+                        chain_lists[side].append(chain_df)
+                        rows_fetched[side] += n_fetched
+
+    chain_dfs = {}
+    for side, chain_list in chain_lists.items():
+        incr('rows_fetched', rows_fetched[side])
+        chain_df = pd.concat(chain_list, ignore_index=True) if chain_list else empty_chain_df()
+        print(f"Fetched {rows_fetched[side]} {side} rows, kept {len(chain_df)} "
+              f"for {chain_df['ticker'].nunique()} tickers")
+        chain_dfs[side] = chain_df[OUTPUT_COLUMNS]
+    return chain_dfs
+
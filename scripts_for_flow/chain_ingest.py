@@ -0,0 +1,124 @@
+import pandas as pd
+from chain_archive import write_archive
+from chain_fetch import fetch_chains
+from pg_loader import database_url
+from pipeline_metrics import flush, stage
+from providers import get_provider
+from snapshot_store import append_snapshot, new_snapshot
+# Use SQLAlchemy to create a connection to postgres
+from sqlalchemy import create_engine
+from sqlalchemy.types import Float
+from sqlalchemy.types import Date
+from sqlalchemy.types import DateTime
+from sqlalchemy.types import VARCHAR
+
+
+# #### General Logic
+# Replaces put_data_ingest.py and call_data_ingest.py, which fetched the same chains twice
+# * Build one ticker universe:
+# >* Tickers from the Put_Candidates google sheet
+# >* Tickers from current_holdings in postgres (holdings_ingest.py runs first)
+# * Fetch every (ticker, expiration) option chain once, concurrently (see chain_fetch.py)
+# >* Only expirations within the CHAIN_MIN_DTE / CHAIN_MAX_DTE days to expiry range
+# >* Only out of the money strikes within CHAIN_MAX_OTM of the price, with a bid (CHAIN_PRUNE=off keeps all)
+# * Keep the below fields from both the puts and the calls of each chain
+# >*  Strike
+# >*  Bid
+# >*  Ask
+# >* IV
+# * Add following fields:
+# >* Expiration Date
+# >* Current datetime
+# >* Ticker
+# * Append puts to the put_option_data snapshots and calls to the call_option_data snapshots (see snapshot_store.py)
+# * Archive both to the local Parquet chain archive, which keeps every snapshot (see chain_archive.py)
+
+
+# Specify the date types.  SQLAlchemy with to_sql doesn't choose the right date types by default
+column_typ_dict = {
+    'strike' : Float(),
+    'bid' : Float(),
+    'ask' : Float(),
+    'impliedVolatility' : Float(),
+    'exp_date' : Date(),
+    'as_of_date' : DateTime(),
+    'ticker' : VARCHAR(20)
+}
+
+holdings_sql = """
+    select
+    distinct ticker
+    from current_holdings
+"""
+
+
+def read_put_candidates(provider):
+    """Read the google sheet that contains all potential tickers we want to look out for a put."""
+    with stage('read_put_candidates'):
+        return provider.put_candidates()
+
+
+def fetch_option_chains(engine, provider, put_candidate_df, holdings_df=None):
+    """
+    Fetch puts and calls for the put candidates plus the holdings.
+
+    holdings_df is the current_holdings dataframe when the caller already has
+    it (pipeline.py).  Otherwise the holdings are read from postgres.
+
+    Returns the dict of side -> dataframe and the run's snapshot.
+    """
+    # #### Pull holdings from postgres table to get list of call candidates
+    if holdings_df is None:
+        holdings_df = pd.read_sql_query(holdings_sql, con=engine)
+
+    # Shared ticker universe: union of put candidates and holdings
+    unique_tickers = pd.concat([put_candidate_df.iloc[:, 0], holdings_df['ticker']]).dropna().unique()
+
+    print("Pulling option chains for {} tickers".format(len(unique_tickers)))
+
+    # One run-level snapshot.  Every row from this run gets the same snapshot_id and as_of_date (Los Angeles time)
+    snapshot = new_snapshot()
+
+    # One fetch per (ticker, expiration), both sides kept.  Requests, errors and rows are counted in pipeline_metrics
+    with stage('fetch_chains'):
+        chain_dfs = fetch_chains(unique_tickers, sides=('puts', 'calls'), as_of_date=snapshot['as_of_date'],
+                                 ticker_factory=provider.ticker)
+    return chain_dfs, snapshot
+
+
+def write_option_chains(engine, chain_dfs, snapshot):
+    """
+    Append the puts to put_option_data and the calls to call_option_data as one snapshot.
+
+    put_option_data and call_option_data are views of the latest snapshot.
+    """
+    with stage('write_snapshots'):
+        append_snapshot(chain_dfs['puts'], 'put_option_data', engine, column_typ_dict, snapshot)
+        append_snapshot(chain_dfs['calls'], 'call_option_data', engine, column_typ_dict, snapshot)
+
+
+def archive_option_chains(chain_dfs, snapshot):
+    """Write the run's puts and calls to the Parquet chain archive."""
+    with stage('archive_chains'):
+        write_archive(chain_dfs, snapshot)
+
+
+def main():
+    # Market data provider (yfinance + google sheets, or synthetic.  See providers.py)
+    provider = get_provider()
+
+    # ### Create connection to postgres
+    # Use postgres docker service name when running this in Kestra docker container
+    # Set DATABASE_HOST=localhost if running locally outside Docker
+    engine = create_engine(database_url())
+    try:
+        put_candidate_df = read_put_candidates(provider)
+        chain_dfs, snapshot = fetch_option_chains(engine, provider, put_candidate_df)
+        write_option_chains(engine, chain_dfs, snapshot)
+        archive_option_chains(chain_dfs, snapshot)
+    finally:
+        flush(engine)
+
+
+if __name__ == "__main__":
+    main()
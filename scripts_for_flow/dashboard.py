@@ -9,13 +9,16 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 
 # Add current directory to path to import put_leads
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Import the main function from put_leads
 from put_leads import main
+from pg_loader import database_url
+from dashboard_queries import (legacy_snapshot_version_qry, option_counts_qry, option_summary_qry, snapshot_version_qry,
+                               top_options_qry)
 
 st.set_page_config(
     page_title="Put Option Candidates",
@@ -27,25 +30,73 @@ st.title("📊 Put Option Candidates Dashboard")
 st.markdown("---")
 
 # Read put_candidate tickers and put_candidate options data from postgres
-# Create postgres connection
-db_host = os.getenv('DATABASE_HOST', 'pgdatabase')
-# db_host = os.getenv('DATABASE_HOST', 'localhost'
-print(f"Connecting to database at {db_host}...")
-engine = create_engine(f'postgresql://root:root@{db_host}:5432/option_data')
-
-put_option_qry = """
-SELECT *
-  FROM put_candidate_options
- WHERE 1=1
-       AND bid > 0
-       AND ask > 0
-       AND days_til_strike >= 1
-"""
+# The slider filters, top N per ticker and paging all run in postgres as parameterized queries
+# (backed by the put_candidate_options indexes put_leads.py creates), so only the displayed page
+# comes back to the container.  Results are cached across sessions and keyed on the put_leads
+# snapshot version plus the query parameters.  A new put_leads run changes the version and the cache reloads.
+# How often (seconds) to re-check the snapshot version
+VERSION_CHECK_TTL = int(os.getenv('DASHBOARD_VERSION_TTL', '10'))
+
+
+@st.cache_resource
+def get_engine():
+    """One postgres engine (connection pool) shared by every session."""
+    # Create postgres connection
+    print(f"Connecting to database at {os.getenv('DATABASE_HOST', 'pgdatabase')}...")
+    return create_engine(database_url())
+
+
+@st.cache_data(ttl=VERSION_CHECK_TTL)
+def get_snapshot_version():
+    """Current put_leads snapshot version: (run count, last written_at) of put_leads_runs."""
+    if not inspect(get_engine()).has_table('put_leads_runs'):
+        version = pd.read_sql_query(legacy_snapshot_version_qry, get_engine()).iloc[0]
+        return ('legacy', str(version['max_as_of_date']), int(version['row_count']))
+    version = pd.read_sql_query(snapshot_version_qry, get_engine()).iloc[0]
+    return (int(version['run_count']), str(version['last_written_at']))
+
+
+@st.cache_data(max_entries=2)
+def load_put_candidates(snapshot_version):
+    """put_candidate_tickers for one snapshot version (typed, unformatted)."""
+    put_candidates_df = pd.read_sql_query("SELECT * FROM put_candidate_tickers", get_engine())
+    put_candidates_df['latest_close_date'] = pd.to_datetime(put_candidates_df['latest_close_date'])
+    return put_candidates_df
+
+
+@st.cache_data(max_entries=2)
+def load_option_summary(snapshot_version):
+    """Option count and average annualized_return for one snapshot version."""
+    summary = pd.read_sql_query(option_summary_qry, get_engine()).iloc[0]
+    return int(summary['option_count']), summary['avg_return']
 
 
-put_candidates_df = pd.read_sql_query("SELECT * FROM put_candidate_tickers", engine)
-# put_candidate_prices = pd.read_sql_query("SELECT * FROM put_candidate_options", engine)
-put_candidate_prices = pd.read_sql_query(put_option_qry, engine)
+@st.cache_data(max_entries=64)
+def load_option_counts(snapshot_version, filters):
+    """(filtered options, top N options) for one snapshot version and filter set."""
+    counts = pd.read_sql_query(option_counts_qry, get_engine(), params=filters).iloc[0]
+    return int(counts['filtered_count']), int(counts['top_n_count'])
+
+
+@st.cache_data(max_entries=64)
+def load_top_options(snapshot_version, filters, limit, offset):
+    """One page of the top N options per ticker for one snapshot version and filter set."""
+    top_options = pd.read_sql_query(top_options_qry, get_engine(),
+                                    params={**filters, 'limit': limit, 'offset': offset})
+    top_options['exp_date'] = pd.to_datetime(top_options['exp_date'])
+    top_options['put_candidate_ind'] = top_options['put_candidate_ind'].astype('int8')
+    return top_options
+
+
+@st.cache_data(max_entries=8)
+def top_options_csv(snapshot_version, filters, top_n_count):
+    """CSV download of every page of the current selection."""
+    return load_top_options(snapshot_version, filters, top_n_count, 0).to_csv(index=False)
+
+
+snapshot_version = get_snapshot_version()
+put_candidates_df = load_put_candidates(snapshot_version)
+option_count, avg_return = load_option_summary(snapshot_version)
 
 # Run the analysis
 # with st.spinner("Loading data and calculating candidates..."):
@@ -62,10 +113,9 @@ with col1:
 with col2:
     st.metric("Candidates", put_candidates_df['put_candidate_ind'].sum())
 with col3:
-    st.metric("Total Options", len(put_candidate_prices))
+    st.metric("Total Options", option_count)
 with col4:
-    if len(put_candidate_prices) > 0:
-        avg_return = put_candidate_prices['annualized_return'].mean()
+    if option_count > 0:
         st.metric("Avg Annualized Return", f"{avg_return:.1%}")
     else:
         st.metric("Avg Annualized Return", "N/A")
@@ -74,15 +124,7 @@ st.markdown("---")
 
 # Main results table
 st.subheader("🎯 Put Candidate Prices")
-if len(put_candidate_prices) > 0:
-    # Format the dataframe for display
-    display_df = put_candidate_prices.copy()
-    display_df['annualized_return'] = display_df['annualized_return'].apply(lambda x: f"{x:.2%}")
-    display_df['raw_return'] = display_df['raw_return'].apply(lambda x: f"{x:.2%}")
-    display_df['upfront_premium'] = display_df['upfront_premium'].apply(lambda x: f"${x:,.2f}")
-    display_df['money_aside'] = display_df['money_aside'].apply(lambda x: f"${x:,.2f}")
-    
-    
+if option_count > 0:
     # Sidebar filters
     st.sidebar.header("Filters")
 
@@ -118,38 +160,43 @@ if len(put_candidate_prices) > 0:
         step=0.5
     )
 
-    # Apply filters
-    filtered_df = display_df.copy()[
-        (display_df['days_til_strike'] >= min_days) & 
-        (display_df['days_til_strike'] <= max_days) &
-        (display_df['price_strike_discount'] >= min_discount) &
-        (display_df['price_strike_discount'] <= max_discount)
-    ].reset_index(drop=True)
-
-    filtered_df['price_strike_discount'] = filtered_df['price_strike_discount'].apply(lambda x: f"{x:.2%}")
-
-    # Get top 3 per ticker by annualized_return
-    top_3_per_ticker = (
-        filtered_df
-        .sort_values('annualized_return', ascending=False)
-        .groupby('ticker')
-        .head(3)
-        .reset_index(drop=True)
-    )[['ticker', 'put_candidate_ind', 'strike', 'current_price', 'price_strike_discount', 'exp_date',
-       'bid', 'ask', 'mid', 'upfront_premium', 'annualized_return', 'raw_return']]
+    top_n = st.sidebar.number_input("Options per Ticker", min_value=1, value=3, step=1)
+    page_size = st.sidebar.selectbox("Rows per Page", [25, 50, 100, 250], index=1)
+
+    # Query parameters.  price_strike_discount is stored as a fraction, the sliders are in percent
+    filters = {
+        'min_days': int(min_days),
+        'max_days': int(max_days),
+        'min_discount': min_discount / 100,
+        'max_discount': max_discount / 100,
+        'top_n': int(top_n),
+    }
+    filtered_count, top_n_count = load_option_counts(snapshot_version, filters)
+
+    page_count = max(1, -(-top_n_count // page_size))
+    page = st.sidebar.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+    top_options = load_top_options(snapshot_version, filters, page_size, (int(page) - 1) * page_size)
 
     # Display results
-    st.subheader(f"filtered_df ({len(filtered_df)} total)")
-    st.subheader(f"Top 3 Options per Ticker ({len(top_3_per_ticker)} total)")
+    st.subheader(f"filtered_df ({filtered_count} total)")
+    st.subheader(f"Top {top_n} Options per Ticker ({top_n_count} total, page {page} of {page_count})")
     st.dataframe(
-        top_3_per_ticker,
+        top_options,
         use_container_width=True,
-        hide_index=True
+        hide_index=True,
+        column_config={
+            'price_strike_discount': st.column_config.NumberColumn(format='percent'),
+            'exp_date': st.column_config.DateColumn(),
+            'upfront_premium': st.column_config.NumberColumn(format='dollar'),
+            'annualized_return': st.column_config.NumberColumn(format='percent'),
+            'raw_return': st.column_config.NumberColumn(format='percent'),
+            'prob_itm': st.column_config.NumberColumn(format='percent'),
+        }
     )
     # st.dataframe(top_3_per_ticker)
 
-    # Download button
-    csv = put_candidate_prices.to_csv(index=False)
+    # Download button (every page of the current selection)
+    csv = top_options_csv(snapshot_version, filters, top_n_count)
     st.download_button(
         label="📥 Download CSV",
         data=csv,
@@ -0,0 +1,68 @@
+"""
+Dashboard Queries
+
+SQL behind dashboard.py, kept out of the streamlit script so the benchmarks
+can run the same queries.  Parameters use the psycopg2 %(name)s style:
+min_days, max_days, min_discount, max_discount (fractions), top_n, limit, offset.
+"""
+
+# Columns shown in the options table
+option_columns = ['ticker', 'put_candidate_ind', 'strike', 'current_price', 'price_strike_discount', 'exp_date',
+                  'bid', 'ask', 'mid', 'upfront_premium', 'annualized_return', 'raw_return', 'delta', 'prob_itm']
+
+# Tradable options only
+put_option_where = """
+ WHERE 1=1
+       AND bid > 0
+       AND ask > 0
+       AND days_til_strike >= 1
+"""
+
+option_summary_qry = """
+SELECT count(*) AS option_count
+     , avg(annualized_return) AS avg_return
+  FROM put_candidate_options
+""" + put_option_where
+
+# Slider filters, then each ticker's options ranked by annualized_return
+ranked_options_cte = """
+WITH ranked AS (
+SELECT """ + ', '.join(option_columns) + """
+     , row_number() OVER (PARTITION BY ticker ORDER BY annualized_return DESC) AS ticker_rank
+  FROM put_candidate_options
+""" + put_option_where + """
+       AND days_til_strike BETWEEN %(min_days)s AND %(max_days)s
+       AND price_strike_discount BETWEEN %(min_discount)s AND %(max_discount)s
+)
+"""
+
+option_counts_qry = ranked_options_cte + """
+SELECT count(*) AS filtered_count
+     , count(*) FILTER (WHERE ticker_rank <= %(top_n)s) AS top_n_count
+  FROM ranked
+"""
+
+# One page of the top N options per ticker, best annualized_return first
+top_options_qry = ranked_options_cte + """
+SELECT """ + ', '.join(option_columns) + """
+  FROM ranked
+ WHERE ticker_rank <= %(top_n)s
+ ORDER BY annualized_return DESC, ticker, ticker_rank
+ LIMIT %(limit)s OFFSET %(offset)s
+"""
+
+# Snapshot version of the put_leads output.  put_leads.py appends a put_leads_runs row on every run that
+# writes, incremental upserts included, so the version changes even when the rewritten rows keep the same
+# max(as_of_date) and row count
+snapshot_version_qry = """
+SELECT count(*) AS run_count
+     , max(written_at) AS last_written_at
+  FROM put_leads_runs
+"""
+
+# Fallback for a database put_leads has not written put_leads_runs to yet
+legacy_snapshot_version_qry = """
+SELECT max(as_of_date) AS max_as_of_date
+     , count(*) AS row_count
+  FROM put_candidate_options
+"""
@@ -0,0 +1,231 @@
+"""
+Compact Frame Schemas
+
+In-memory dtypes for the option and history frames put_leads.py works on.
+Loaded with pandas defaults these are float64 everywhere, object ticker
+strings repeated on every row and int64 day counts:
+
+    put_option_data = read_frame("SELECT * FROM put_option_data", engine, OPTION_DTYPES)
+    put_option_data = compact(put_option_data, OPTION_DTYPES)       # frame built in memory
+    memory_report('load_inputs', put_option_data=put_option_data)
+
+- ticker is categorical (one code per row instead of a Python string)
+- quotes, IV and everything computed from them (mid, returns, greeks) stay
+  float64, so mid is (1.23 + 1.25) / 2 exactly as in Postgres.  float32
+  quotes would save 8 bytes a row at the cost of 1.2300000190734863
+- stock prices and strikes stay float64.  The momentum indicators compare
+  closes against their 8 day average exactly like the row-by-row reference,
+  ties included, and strikes are compared with the stock price and turned
+  into a (small) discount from it
+- day counts and 0/1 indicators are small ints, dates datetime64
+
+read_frame loads in chunks and compacts each one, so the object-dtype copy of
+a large table never exists in full.  read_frame_chunks hands the chunks over
+one at a time instead of concatenating them (put_leads.py chunked mode).  memory_report prints the size of the
+frames a stage holds and the process peak RSS.
+"""
+
+import os
+import sys
+
+import pandas as pd
+from pandas.api.types import CategoricalDtype
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.  memory_report then leaves out the peak RSS
+    resource = None
+
+# Rows per chunk read by read_frame.  Override with FRAME_READ_CHUNK_ROWS in the flow
+DEFAULT_READ_CHUNK_ROWS = int(os.getenv('FRAME_READ_CHUNK_ROWS', '200000'))
+
+TICKER = 'category'
+VALUE = 'float64'
+STOCK_PRICE = 'float64'
+DATE = 'datetime64[ns]'
+
+# put_option_data, plus the put_candidate_options columns added by put_leads.py
+OPTION_DTYPES = {
+    'ticker' : TICKER,
+    'strike' : STOCK_PRICE,
+    'bid' : VALUE,
+    'ask' : VALUE,
+    'impliedVolatility' : VALUE,
+    'exp_date' : DATE,
+    'as_of_date' : DATE,
+    'mid' : VALUE,
+    'upfront_premium' : VALUE,
+    'days_til_strike' : 'int16',
+    'money_aside' : VALUE,
+    'raw_return' : VALUE,
+    'annualized_return' : VALUE,
+    'put_candidate_ind' : 'int8',
+    'current_price' : STOCK_PRICE,
+    'price_strike_discount' : VALUE,
+    'iv' : VALUE,
+    'iv_from_mid' : 'int8',
+    'delta' : VALUE,
+    'theta' : VALUE,
+    'vega' : VALUE,
+    'prob_itm' : VALUE,
+}
+
+# stock_hist_data
+HIST_DTYPES = {
+    'ticker' : TICKER,
+    'hist_date' : DATE,
+    'open' : STOCK_PRICE,
+    'high' : STOCK_PRICE,
+    'low' : STOCK_PRICE,
+    'close' : STOCK_PRICE,
+    'as_of_date' : DATE,
+}
+
+# stock_dim_data
+STOCK_DIM_DTYPES = {
+    'ticker' : TICKER,
+    'current_price' : STOCK_PRICE,
+    'week_52_high' : STOCK_PRICE,
+    'week_52_low' : STOCK_PRICE,
+    'latest_close_date' : DATE,
+}
+
+# put_candidate_tickers: the indicator columns are 0/1
+CANDIDATE_DTYPES = {
+    **STOCK_DIM_DTYPES,
+    'lower_qrt_52wk_bound' : STOCK_PRICE,
+    'lower_qrt_ind' : 'int8',
+    'up_vs_pri_day_vs_8day' : 'int8',
+    'up_vs_pri_wk_vs_8day' : 'int8',
+    'put_candidate_ind' : 'int8',
+}
+
+
+def compact(df, dtypes):
+    """
+    Cast the columns of df that appear in dtypes, in place, and return df.
+
+    Integer columns holding nulls are left as they are.  Dates go through
+    pd.to_datetime, so strings and Python dates are accepted.
+    """
+    for column, dtype in dtypes.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        if dtype == DATE:
+            df[column] = pd.to_datetime(df[column]).astype(DATE)
+        elif dtype.startswith('int') and df[column].isna().any():
+            continue
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def _unify_categories(frames):
+    """Give the categorical columns of frames the same categories, so concat keeps them categorical."""
+    for column in frames[0].columns:
+        if not isinstance(frames[0][column].dtype, CategoricalDtype):
+            continue
+        categories = sorted(set().union(*(frame[column].cat.categories for frame in frames)))
+        for frame in frames:
+            frame[column] = frame[column].cat.set_categories(categories)
+    return frames
+
+
+def concat_frames(frames):
+    """pd.concat of compacted frames that keeps categorical columns categorical."""
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(_unify_categories(frames), ignore_index=True)
+
+
+def read_frame(sql, engine, dtypes, params=None, chunk_rows=None):
+    """
+    pd.read_sql_query(sql) compacted to dtypes, one chunk at a time.
+
+    Every chunk is compacted as soon as it arrives, so the default-dtype copy
+    of the whole result is never held at once.
+    """
+    chunks = [compact(chunk, dtypes) for chunk in
+              pd.read_sql_query(sql, engine, params=params, chunksize=chunk_rows or DEFAULT_READ_CHUNK_ROWS)]
+    if not chunks:
+        return compact(pd.read_sql_query(sql, engine, params=params), dtypes)
+    return concat_frames(chunks)
+
+
+def key_aligned(frames, key_column='ticker'):
+    """
+    Regroup a stream of frames sorted on key_column so the rows of one key are never split across two frames.
+
+    The rows of each frame's last key are held back and put in front of the
+    next frame.  A key with more rows than a frame keeps growing until it ends.
+    """
+    carry = None
+    for frame in frames:
+        if carry is not None:
+            frame = concat_frames([carry, frame])
+        if frame.empty:
+            continue
+        is_last_key = (frame[key_column] == frame[key_column].iloc[-1]).to_numpy()
+        carry = frame[is_last_key].reset_index(drop=True)
+        if not is_last_key.all():
+            yield frame[~is_last_key].reset_index(drop=True)
+    if carry is not None and len(carry):
+        yield carry
+
+
+def read_frame_chunks(sql, engine, dtypes, params=None, chunk_rows=None, key_column=None):
+    """
+    pd.read_sql_query(sql) compacted to dtypes, yielded chunk_rows rows at a time.
+
+    The result set stays in Postgres behind a server-side (named) cursor, so
+    only one chunk is held in Python however large the table is.  With
+    key_column (sql must ORDER BY it), chunks are cut on key boundaries
+    instead, see key_aligned.
+    """
+    chunk_rows = chunk_rows or DEFAULT_READ_CHUNK_ROWS
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor(name='read_frame_chunks')
+        cursor.itersize = chunk_rows
+        cursor.execute(sql, params)
+
+        def fetch():
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    return
+                columns = [column[0] for column in cursor.description]
+                yield compact(pd.DataFrame.from_records(rows, columns=columns), dtypes)
+
+        yield from (key_aligned(fetch(), key_column) if key_column else fetch())
+    finally:
+        conn.close()
+
+
+def frame_mb(df):
+    """Memory held by df in MB, object strings included."""
+    return 0.0 if df is None else df.memory_usage(deep=True).sum() / 2 ** 20
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KB on Linux
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def memory_report(stage_name, **frames):
+    """
+    Print the size of each frame a stage holds and the process peak RSS.
+
+    Returns a dict of frame name -> MB, plus 'peak_rss' (MB, or None).
+    """
+    report = {name: frame_mb(df) for name, df in frames.items() if df is not None}
+    report['peak_rss'] = peak_rss_mb()
+    sizes = ', '.join(f"{name} {mb:.1f} MB" for name, mb in report.items() if name != 'peak_rss')
+    rss = f"peak RSS {report['peak_rss']:.0f} MB" if report['peak_rss'] is not None else 'peak RSS n/a'
+    print(f"[memory] {stage_name}: {sizes + '; ' if sizes else ''}{rss}")
+    return report
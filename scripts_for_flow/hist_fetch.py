@@ -0,0 +1,111 @@
+"""
+Batched Stock History Fetch
+
+Pulls daily bars for many tickers with yfinance's multi-ticker download
+instead of one Ticker(t).history() request per ticker.
+
+Each ticker has its own start date: its last stored bar on incremental
+runs, or the lookback start for tickers with no stored history.  Tickers that share a start date are
+downloaded together, batch_size tickers per request, so a daily run with an
+up to date table is a handful of requests that each return a few rows per
+ticker.
+
+Output keeps the stock_hist_data schema:
+ticker, hist_date, open, high, low, close
+"""
+
+import os
+
+import pandas as pd
+
+from market_cache import cached_download
+from pipeline_metrics import call_with_retries, incr
+
+HIST_COLUMNS = ['ticker', 'hist_date', 'open', 'high', 'low', 'close']
+
+# yfinance field -> stock_hist_data column
+FIELD_NAMES = {'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close'}
+
+# Tickers per download request.  Override with STOCK_HIST_BATCH_SIZE in the flow
+DEFAULT_BATCH_SIZE = int(os.getenv('STOCK_HIST_BATCH_SIZE', '200'))
+
+
+def empty_hist_df():
+    """Return an empty dataframe with the stock history output columns."""
+    return pd.DataFrame(columns=HIST_COLUMNS)
+
+
+def _frame_from_download(raw, tickers):
+    """
+    Reshape a yf.download result into stock_hist_data rows.
+
+    With group_by='ticker' the columns are (ticker, field).  Tickers with no
+    data come back as all-NaN columns and are dropped.
+    """
+    frames = []
+    if raw is None or raw.empty:
+        return empty_hist_df()
+
+    for ticker_symbol in tickers:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if ticker_symbol not in raw.columns.get_level_values(0):
+                continue
+            ticker_raw = raw[ticker_symbol]
+        else:
+            ticker_raw = raw
+
+        hist = ticker_raw[list(FIELD_NAMES)].rename(columns=FIELD_NAMES).dropna(subset=['close'])
+        if hist.empty:
+            continue
+        hist = hist.rename_axis('hist_date').reset_index()
+        hist.insert(0, 'ticker', ticker_symbol)
+        hist.columns.name = None
+        frames.append(hist[HIST_COLUMNS])
+
+    if not frames:
+        return empty_hist_df()
+    hist_df = pd.concat(frames, ignore_index=True)
+
+    # Daily bars are stored as naive dates, like the values history() wrote before
+    hist_df['hist_date'] = pd.to_datetime(hist_df['hist_date'])
+    if hist_df['hist_date'].dt.tz is not None:
+        hist_df['hist_date'] = hist_df['hist_date'].dt.tz_localize(None)
+    return hist_df
+
+
+def fetch_history(starts, batch_size=DEFAULT_BATCH_SIZE, download=cached_download):
+    """
+    Download daily bars for every ticker from its start date through today.
+
+    starts is a dict of ticker -> start date (inclusive).  download is the
+    cached yf.download (or anything with the same signature).  Failed batches
+    are retried, then counted and skipped, so those tickers keep what is
+    already stored.
+
+    Returns a dataframe with HIST_COLUMNS.
+    """
+    by_start = {}
+    for ticker_symbol, start in starts.items():
+        by_start.setdefault(start, []).append(ticker_symbol)
+
+    frames = []
+    for start, tickers in sorted(by_start.items()):
+        for i in range(0, len(tickers), batch_size):
+            batch = tickers[i:i + batch_size]
+            try:
+                raw = call_with_retries(
+                    download, batch, start=start.strftime('%Y-%m-%d'), interval='1d',
+                    group_by='ticker', auto_adjust=True, threads=True, progress=False,
+                    label=f"{len(batch)} tickers from {start}"
+                )
+            except Exception:
+                # Already retried, counted and logged by call_with_retries
+                continue
+            frames.append(_frame_from_download(raw, batch))
+
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return empty_hist_df()
+    hist_df = pd.concat(frames, ignore_index=True)
+    incr('rows_fetched', len(hist_df))
+    return hist_df
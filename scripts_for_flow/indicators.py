@@ -0,0 +1,168 @@
+"""
+Put Candidate Indicator Registry
+
+Each indicator registers:
+- inputs        : candidate columns it reads (stock_dim_data columns or other registered columns)
+- hist_columns  : stock_hist_data columns it needs (empty if it does not use history)
+- lookback_days : calendar days of history it needs before latest_close_date
+- kernel        : vectorized function(put_candidates_df, hist) -> Series for every ticker
+- signal        : True if it is a 0/1 signal that feeds put_candidate_ind
+
+compute_indicators() only loads and prepares history when an active indicator
+needs it, computes registered columns in dependency order, and
+put_candidate_ind() combines the signals with an 'any', 'all' or 'weighted' rule.
+
+To try a new signal, register it here and add its name to PUT_LEADS_INDICATORS.
+"""
+
+import os
+
+import pandas as pd
+
+from momentum_signals import prepare_history, up_vs_pri_day_vs_8day, up_vs_pri_wk_vs_8day
+
+INDICATORS = {}
+
+# Signals used when PUT_LEADS_INDICATORS is not set (the original put_candidate_ind)
+DEFAULT_INDICATORS = ['lower_qrt_ind', 'up_vs_pri_day_vs_8day', 'up_vs_pri_wk_vs_8day']
+
+CANDIDATE_RULES = ('any', 'all', 'weighted')
+
+
+def register_indicator(name, inputs=(), hist_columns=(), lookback_days=0, signal=True):
+    """Decorator that adds a kernel to the INDICATORS registry under name."""
+    def wrap(kernel):
+        INDICATORS[name] = {
+            'kernel': kernel,
+            'inputs': tuple(inputs),
+            'hist_columns': tuple(hist_columns),
+            'lookback_days': lookback_days,
+            'signal': signal,
+        }
+        return kernel
+    return wrap
+
+
+@register_indicator('lower_qrt_52wk_bound', inputs=('week_52_low', 'week_52_high'), signal=False)
+def _lower_qrt_52wk_bound(put_candidates_df, hist):
+    return (
+        put_candidates_df['week_52_low'] +
+        (put_candidates_df['week_52_high'] - put_candidates_df['week_52_low']) * 0.25
+    )
+
+
+@register_indicator('lower_qrt_ind', inputs=('current_price', 'lower_qrt_52wk_bound'))
+def _lower_qrt_ind(put_candidates_df, hist):
+    return (put_candidates_df['current_price'] < put_candidates_df['lower_qrt_52wk_bound']).astype(int)
+
+
+# Prior day plus the 8 bars before it, with room for weekends and holidays
+@register_indicator('up_vs_pri_day_vs_8day', inputs=('ticker', 'latest_close_date', 'current_price'),
+                    hist_columns=('ticker', 'hist_date', 'close'), lookback_days=21)
+def _up_vs_pri_day_vs_8day(put_candidates_df, hist):
+    return up_vs_pri_day_vs_8day(put_candidates_df, hist)
+
+
+# Prior Friday (up to 7 days back), a week before that, then the 8 bars ending there
+@register_indicator('up_vs_pri_wk_vs_8day', inputs=('ticker', 'latest_close_date', 'current_price'),
+                    hist_columns=('ticker', 'hist_date', 'close'), lookback_days=35)
+def _up_vs_pri_wk_vs_8day(put_candidates_df, hist):
+    return up_vs_pri_wk_vs_8day(put_candidates_df, hist)
+
+
+def active_indicators(names=None):
+    """
+    Resolve the active signals and everything they depend on, in computation order.
+
+    names defaults to PUT_LEADS_INDICATORS (comma separated) or DEFAULT_INDICATORS.
+    Raises ValueError for unknown names or circular dependencies.
+    """
+    if names is None:
+        env_names = os.getenv('PUT_LEADS_INDICATORS')
+        names = env_names.split(',') if env_names else DEFAULT_INDICATORS
+
+    ordered = []
+    visiting = set()
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator: {name}")
+        if name in visiting:
+            raise ValueError(f"Circular indicator dependency at: {name}")
+        visiting.add(name)
+        for dep in INDICATORS[name]['inputs']:
+            if dep in INDICATORS:
+                visit(dep)
+        visiting.discard(name)
+        ordered.append(name)
+
+    for name in names:
+        visit(name.strip())
+    return ordered
+
+
+def history_requirements(names):
+    """Return (hist_columns, lookback_days) needed by the given indicators."""
+    hist_columns = []
+    lookback_days = 0
+    for name in names:
+        for c in INDICATORS[name]['hist_columns']:
+            if c not in hist_columns:
+                hist_columns.append(c)
+        lookback_days = max(lookback_days, INDICATORS[name]['lookback_days'])
+    return hist_columns, lookback_days
+
+
+def compute_indicators(put_candidates_df, stock_hist_data, names):
+    """
+    Add every indicator in names (from active_indicators) as a column of put_candidates_df.
+
+    History is sorted and prepared once and shared by all kernels.
+    stock_hist_data can be None when no indicator needs history.
+    """
+    hist = None
+    if stock_hist_data is not None and history_requirements(names)[0]:
+        hist = prepare_history(stock_hist_data)
+
+    for name in names:
+        print(f"Calculating {name}...")
+        put_candidates_df[name] = INDICATORS[name]['kernel'](put_candidates_df, hist)
+    return put_candidates_df
+
+
+def parse_weights(weights):
+    """Parse 'name=weight,name=weight' (PUT_CANDIDATE_WEIGHTS) into a dict."""
+    if isinstance(weights, dict):
+        return weights
+    parsed = {}
+    for item in weights.split(','):
+        name, weight = item.split('=')
+        parsed[name.strip()] = float(weight)
+    return parsed
+
+
+def put_candidate_ind(put_candidates_df, names, rule='any', weights=None, threshold=1.0):
+    """
+    Combine the active signals into put_candidate_ind (0/1).
+
+    rule:
+    - 'any'      : at least one signal is 1 (original behavior)
+    - 'all'      : every signal is 1
+    - 'weighted' : sum of weight * signal >= threshold (weights default to 1)
+    """
+    signal_names = [name for name in names if INDICATORS[name]['signal']]
+    signals = put_candidates_df[signal_names].fillna(0)
+
+    if rule == 'any':
+        ind = signals.sum(axis=1) > 0
+    elif rule == 'all':
+        ind = (signals == 1).all(axis=1)
+    elif rule == 'weighted':
+        weights = parse_weights(weights) if weights else {}
+        weight_series = pd.Series({name: weights.get(name, 1.0) for name in signal_names})
+        ind = signals.mul(weight_series, axis=1).sum(axis=1) >= threshold
+    else:
+        raise ValueError(f"Unknown candidate rule: {rule}.  Use one of {CANDIDATE_RULES}")
+    return ind.astype(int)
@@ -0,0 +1,240 @@
+"""
+Market Data Response Cache
+
+On-disk (SQLite) cache in front of the yfinance calls made by the ingest
+scripts, so retries and manual reruns of a flow task don't pull the same
+Yahoo responses again.
+
+Entries are keyed by (endpoint, ticker, params) and expire per endpoint:
+- options      : expiration date lists, hours
+- option_chain : one expiration's chain, minutes
+- info / last_price : quotes, minutes
+- history      : bars.  Requests that end before today only hold closed bars
+                 and never expire.  Open-ended requests include today's live bar
+                 and get a short TTL
+
+The file is bounded by MARKET_CACHE_MAX_MB.  When it grows past that, the
+least recently used entries are evicted.  Hits and misses are counted per
+endpoint (cache_stats() / print_cache_stats()).
+
+cached_ticker() is a drop-in for yf.Ticker in the scripts (options,
+option_chain, info, history, fast_info['lastPrice']) and cached_download()
+for yf.download.  Set MARKET_CACHE=off to bypass the cache.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import date
+from time import time
+from types import SimpleNamespace
+
+import pandas as pd
+import yfinance as yf
+
+from pipeline_metrics import incr
+
+MARKET_CACHE_PATH = os.getenv('MARKET_CACHE_PATH', 'market_cache.sqlite')
+MARKET_CACHE_MAX_BYTES = int(float(os.getenv('MARKET_CACHE_MAX_MB', '512')) * 1024 * 1024)
+MARKET_CACHE_ENABLED = os.getenv('MARKET_CACHE', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+# Seconds each endpoint's responses stay fresh.  None never expires
+ENDPOINT_TTLS = {
+    'options': 6 * 3600,
+    'option_chain': 10 * 60,
+    'info': 30 * 60,
+    'last_price': 60,
+    'history': 15 * 60,
+    'history_closed': None,
+}
+
+CACHE_DDL = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    last_access REAL NOT NULL
+)
+"""
+
+_lock = threading.Lock()
+_conn = None
+_stats = {}
+
+
+def _connection():
+    """Open the cache file once per process.  Access is serialized with _lock."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(MARKET_CACHE_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(CACHE_DDL)
+        _conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access_idx ON responses (last_access)")
+    return _conn
+
+
+def _count(endpoint, outcome):
+    # Called from the chain fetch worker threads
+    with _lock:
+        counts = _stats.setdefault(endpoint, {'hits': 0, 'misses': 0})
+        counts[outcome] += 1
+    incr('cache_' + outcome)
+
+
+def cache_key(endpoint, ticker, params=None):
+    """Stable text key for one request."""
+    return json.dumps([endpoint, ticker, params or {}], sort_keys=True, default=str)
+
+
+def cache_get(key, now=None):
+    """Return (True, value) for a fresh entry, (False, None) otherwise."""
+    now = now or time()
+    with _lock:
+        conn = _connection()
+        row = conn.execute("SELECT value, expires_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False, None
+        if row[1] is not None and row[1] <= now:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return False, None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+    return True, pickle.loads(row[0])
+
+
+def cache_set(key, endpoint, value, ttl, now=None, max_bytes=MARKET_CACHE_MAX_BYTES):
+    """Store value under key, then evict least recently used entries past max_bytes."""
+    now = now or time()
+    blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    expires_at = None if ttl is None else now + ttl
+    with _lock:
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, endpoint, value, size, expires_at, last_access) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, endpoint, blob, len(blob), expires_at, now)
+        )
+        _evict(conn, now, max_bytes)
+
+
+def _evict(conn, now, max_bytes):
+    """Drop expired entries, then the least recently used ones until the cache fits max_bytes."""
+    conn.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+    total = conn.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+    if total <= max_bytes:
+        return
+    evict_keys = []
+    for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+        if total <= max_bytes:
+            break
+        evict_keys.append((key,))
+        total -= size
+    conn.executemany("DELETE FROM responses WHERE key = ?", evict_keys)
+
+
+def _is_empty(value):
+    if isinstance(value, (pd.DataFrame, tuple, dict)):
+        return len(value) == 0
+    return value is None
+
+
+def cached_call(endpoint, ticker, params, loader):
+    """
+    Return the cached response for (endpoint, ticker, params), or call loader() and cache it.
+
+    Entries live for ENDPOINT_TTLS[endpoint].  Errors and empty responses (often
+    a throttled request) are not cached.
+    """
+    if not MARKET_CACHE_ENABLED:
+        return loader()
+    key = cache_key(endpoint, ticker, params)
+    hit, value = cache_get(key)
+    if hit:
+        _count(endpoint, 'hits')
+        return value
+    _count(endpoint, 'misses')
+    value = loader()
+    if not _is_empty(value):
+        cache_set(key, endpoint, value, ENDPOINT_TTLS[endpoint])
+    return value
+
+
+def history_endpoint(end):
+    """'history_closed' when every requested bar closed before today, otherwise 'history'."""
+    if end is None:
+        return 'history'
+    end_date = pd.Timestamp(end).date()
+    return 'history_closed' if end_date <= date.today() else 'history'
+
+
+def cache_stats():
+    """Hit / miss counts per endpoint since the process started."""
+    with _lock:
+        return {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+
+
+def print_cache_stats():
+    """Print the hit / miss counts, one line per endpoint."""
+    for endpoint, counts in sorted(cache_stats().items()):
+        total = counts['hits'] + counts['misses']
+        print(f"Market cache {endpoint}: {counts['hits']} hits, {counts['misses']} misses "
+              f"({counts['hits'] / total:.0%} hit rate)")
+
+
+class CachedTicker:
+    """
+    yf.Ticker with its responses cached.
+
+    Only the calls the ingest scripts make are exposed.  option_chain()
+    returns an object with .calls, .puts and .underlying like yfinance's.
+    fast_info only carries 'lastPrice'.
+    """
+
+    def __init__(self, ticker_symbol, ticker_factory=yf.Ticker):
+        self.ticker = ticker_symbol
+        self._ticker_factory = ticker_factory
+        self._yf_ticker = None
+
+    def _yf(self):
+        # Only build the yfinance object on a cache miss
+        if self._yf_ticker is None:
+            self._yf_ticker = self._ticker_factory(self.ticker)
+        return self._yf_ticker
+
+    @property
+    def options(self):
+        return cached_call('options', self.ticker, None, lambda: tuple(self._yf().options))
+
+    def option_chain(self, exp_str):
+        def load():
+            chain = self._yf().option_chain(exp_str)
+            return {'calls': chain.calls, 'puts': chain.puts, 'underlying': chain.underlying}
+        return SimpleNamespace(**cached_call('option_chain', self.ticker, {'exp': exp_str}, load))
+
+    @property
+    def info(self):
+        return cached_call('info', self.ticker, None, lambda: dict(self._yf().info))
+
+    @property
+    def fast_info(self):
+        last_price = cached_call('last_price', self.ticker, None, lambda: self._yf().fast_info['lastPrice'])
+        return {'lastPrice': last_price}
+
+    def history(self, **kwargs):
+        endpoint = history_endpoint(kwargs.get('end'))
+        return cached_call(endpoint, self.ticker, kwargs, lambda: self._yf().history(**kwargs))
+
+
+def cached_ticker(ticker_symbol):
+    """Drop-in for yf.Ticker (ticker_factory) backed by the response cache."""
+    return CachedTicker(ticker_symbol)
+
+
+def cached_download(tickers, **kwargs):
+    """Drop-in for yf.download backed by the response cache.  Keyed on the ticker batch and arguments."""
+    params = {k: v for k, v in kwargs.items() if k not in ('threads', 'progress')}
+    endpoint = history_endpoint(kwargs.get('end'))
+    return cached_call(endpoint, ','.join(tickers), params, lambda: yf.download(tickers, **kwargs))
@@ -0,0 +1,150 @@
+"""
+Vectorized Momentum Signals
+
+Computes the put_leads momentum indicators for every ticker at once instead
+of filtering and sorting stock_hist_data once per candidate row.
+
+The history is sorted by (ticker, hist_date) a single time.  The trailing
+8-day average and the row position within each ticker are computed with
+array shifts, and each candidate's "prior day" / "end of prior week" rows are
+found with merge_asof.  Outputs are the same 0/1 values as the row-by-row
+calculate_up_vs_pri_day_vs_8day / calculate_up_vs_pri_wk_vs_8day functions in
+put_leads.py.  History is expected to have one row per (ticker, hist_date).
+"""
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+MA_WINDOW = 8
+
+
+def prepare_history(stock_hist_data):
+    """
+    Sort history by ticker and date and add the columns the indicators need.
+
+    Adds:
+    - pos  : 0-based row number within the ticker
+    - ma8  : mean of the 8 closes ending on this row (NaN when fewer than 8 rows)
+    - prev_ma8 : ma8 ending on the previous row (NaN when fewer than 8 earlier rows)
+    """
+    hist = stock_hist_data[['ticker', 'hist_date', 'close']].copy()
+    hist['hist_date'] = pd.to_datetime(hist['hist_date']).astype('datetime64[ns]')
+    hist = hist.sort_values(['ticker', 'hist_date'], kind='mergesort').reset_index(drop=True)
+
+    close = hist['close'].to_numpy(dtype='float64')
+    pos = hist.groupby('ticker', sort=False).cumcount().to_numpy()
+
+    # Add the 8 closes in the same order Series.mean() does for 8 values (numpy pairwise sum),
+    # so ties against the average come out exactly like the row-by-row version
+    lag = [np.concatenate([np.full(k, np.nan), close[:len(close) - k]]) for k in range(MA_WINDOW - 1, -1, -1)]
+    ma8 = (((lag[0] + lag[1]) + (lag[2] + lag[3])) + ((lag[4] + lag[5]) + (lag[6] + lag[7]))) / MA_WINDOW
+    ma8[pos < MA_WINDOW - 1] = np.nan
+
+    hist['pos'] = pos
+    hist['ma8'] = ma8
+    hist['prev_ma8'] = np.where(pos >= MA_WINDOW, np.concatenate([[np.nan], ma8[:-1]]), np.nan)
+    return hist
+
+
+def _ticker_values(tickers):
+    """Distinct tickers of a plain or categorical column."""
+    return tickers.cat.categories if isinstance(tickers.dtype, pd.CategoricalDtype) else tickers.unique()
+
+
+def _with_categories(tickers, categories):
+    """tickers as a categorical column with exactly categories."""
+    if isinstance(tickers.dtype, pd.CategoricalDtype):
+        return tickers.cat.set_categories(categories)
+    return tickers.astype(pd.CategoricalDtype(categories))
+
+
+def _asof_lookup(candidates, key_col, hist, allow_exact_matches):
+    """
+    For each candidate, find the last history row of its ticker on or before key_col.
+
+    Returns hist columns aligned to candidates' index (NaN where there is no match).
+    """
+    left = candidates[['ticker', key_col]].dropna()
+    left = left.assign(_cand_idx=left.index).sort_values(key_col, kind='mergesort')
+    right = hist.sort_values('hist_date', kind='mergesort')
+    # merge_asof needs the same ticker dtype on both sides (one may be categorical, see frame_schema.py)
+    tickers = sorted(set(_ticker_values(left['ticker'])) | set(_ticker_values(right['ticker'])))
+    left['ticker'] = _with_categories(left['ticker'], tickers)
+    right = right.assign(ticker=_with_categories(right['ticker'], tickers))
+
+    matched = pd.merge_asof(
+        left, right,
+        left_on=key_col, right_on='hist_date', by='ticker',
+        direction='backward', allow_exact_matches=allow_exact_matches
+    )
+    return matched.set_index('_cand_idx').reindex(candidates.index)
+
+
+def _candidate_frame(put_candidates_df):
+    candidates = put_candidates_df[['ticker', 'latest_close_date', 'current_price']].copy()
+    candidates['latest_close_date'] = pd.to_datetime(candidates['latest_close_date']).astype('datetime64[ns]')
+    return candidates
+
+
+def up_vs_pri_day_vs_8day(put_candidates_df, hist):
+    """
+    Vectorized up_vs_pri_day_vs_8day for every candidate row.
+
+    hist comes from prepare_history().  Returns a 0/1 int Series aligned to
+    put_candidates_df.  1 if:
+    - Current price > prior day's price
+    - Prior day's price < 8-day moving average (ending day before prior day)
+    """
+    candidates = _candidate_frame(put_candidates_df)
+
+    # Prior day = last bar strictly before latest_close_date
+    prior_day = _asof_lookup(candidates, 'latest_close_date', hist, allow_exact_matches=False)
+
+    ind = (
+        (candidates['current_price'] > prior_day['close']) &
+        (prior_day['close'] < prior_day['prev_ma8'])
+    )
+    return ind.astype(int)
+
+
+def _end_prior_week_target(latest_close_date):
+    """
+    Last Friday before latest_close_date, same day offsets as calculate_up_vs_pri_wk_vs_8day.
+
+    Monday: 3 days back, Friday: 7, Sunday: 2, Saturday: 1, Tuesday-Thursday: weekday + 3.
+    """
+    weekday = latest_close_date.dt.weekday
+    days_back = np.select(
+        [weekday == 0, weekday == 4, weekday == 6, weekday >= 5],
+        [3, 7, 2, weekday - 4],
+        default=weekday + 3
+    )
+    return latest_close_date - pd.to_timedelta(days_back, unit='D')
+
+
+def up_vs_pri_wk_vs_8day(put_candidates_df, hist):
+    """
+    Vectorized up_vs_pri_wk_vs_8day for every candidate row.
+
+    hist comes from prepare_history().  Returns a 0/1 int Series aligned to
+    put_candidates_df.  1 if:
+    - Current price > end of prior week's price
+    - End of prior week's price < 8-day moving average (ending week before)
+    """
+    candidates = _candidate_frame(put_candidates_df)
+    candidates['end_prior_week_target'] = _end_prior_week_target(candidates['latest_close_date'])
+
+    # End of prior week = last bar on or before the prior Friday
+    prior_week = _asof_lookup(candidates, 'end_prior_week_target', hist, allow_exact_matches=True)
+
+    # Week before = last bar on or before 7 days prior to the end of prior week bar
+    candidates['week_before_target'] = prior_week['hist_date'] - timedelta(days=7)
+    week_before = _asof_lookup(candidates, 'week_before_target', hist, allow_exact_matches=True)
+
+    ind = (
+        (candidates['current_price'] > prior_week['close']) &
+        (prior_week['close'] < week_before['ma8'])
+    )
+    return ind.astype(int)
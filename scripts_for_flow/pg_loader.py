@@ -0,0 +1,209 @@
+"""
+Postgres Bulk Loader
+
+Loads a DataFrame into Postgres with COPY FROM STDIN instead of the row by row
+INSERTs that DataFrame.to_sql sends through SQLAlchemy.
+
+copy_replace() keeps the same result as the
+    df.head(0).to_sql(..., dtype=column_typ_dict, if_exists='replace')
+    df.to_sql(..., if_exists='append')
+pattern used by the ingest scripts:
+1. Create an empty staging table from the column_typ_dict (same column types as before)
+2. Stream the rows into the staging table as CSV
+3. Swap the staging table in for the target table in one transaction, so
+   readers never see a half loaded or missing table
+4. Rebuild any indexes the caller asks for inside that same transaction
+
+copy_replace_frames() does the same for a stream of dataframes (put_leads.py
+chunked mode), so a table can be replaced without holding it in memory.
+"""
+
+import io
+import os
+from itertools import chain
+from time import time
+
+import pandas as pd
+
+from pipeline_metrics import incr
+
+# Rows rendered to CSV per chunk while streaming into COPY
+DEFAULT_CHUNK_ROWS = 50000
+
+
+def database_url():
+    """
+    Postgres URL of the option_data database.
+
+    DATABASE_HOST defaults to pgdatabase (the docker network name).  Set
+    DATABASE_HOST=localhost when running outside Docker.  DATABASE_NAME points
+    a run at another database (the benchmarks use their own).
+    """
+    db_host = os.getenv('DATABASE_HOST', 'pgdatabase')
+    db_name = os.getenv('DATABASE_NAME', 'option_data')
+    return f'postgresql://root:root@{db_host}:5432/{db_name}'
+
+
+def quote_ident(name):
+    """Double-quote a Postgres identifier (column names like impliedVolatility are case sensitive)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _CsvStream(io.RawIOBase):
+    """
+    File-like object that renders a DataFrame to CSV one chunk at a time.
+
+    psycopg2's copy_expert pulls from read(), so only one chunk of rows is
+    held as text at a time instead of the whole table.
+    """
+
+    def __init__(self, df, chunk_rows):
+        self._df = df
+        self._chunk_rows = chunk_rows
+        self._next_row = 0
+        self._buffer = b''
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        # Render the next chunk once the current one has been consumed
+        while self._pos >= len(self._buffer) and self._next_row < len(self._df):
+            chunk = self._df.iloc[self._next_row:self._next_row + self._chunk_rows]
+            self._next_row += self._chunk_rows
+            self._buffer = chunk.to_csv(index=False, header=False).encode('utf-8')
+            self._pos = 0
+
+        if size < 0:
+            size = len(self._buffer) - self._pos
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+
+def relkind(cursor, relation_name):
+    """pg_class relkind of a public relation ('r' table, 'v' view, 'p' partitioned table) or None."""
+    cursor.execute(
+        "SELECT relkind FROM pg_class WHERE relname = %s AND relnamespace = 'public'::regnamespace",
+        (relation_name,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def index_name(table_name, columns):
+    """Index name used for columns of table_name, e.g. put_candidate_options_ticker_idx."""
+    return f"{table_name}_{'_'.join(columns)}_idx"
+
+
+def create_indexes(cursor, table_name, indexes):
+    """Create each index in indexes (a list of column tuples) on table_name if missing."""
+    for columns in indexes:
+        column_list = ', '.join(quote_ident(c) for c in columns)
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {quote_ident(index_name(table_name, columns))} "
+            f"ON {quote_ident(table_name)} ({column_list})"
+        )
+
+
+def copy_rows(cursor, df, table_name, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream every row of df into table_name with COPY FROM STDIN (CSV)."""
+    columns = ', '.join(quote_ident(c) for c in df.columns)
+    copy_sql = f"COPY {quote_ident(table_name)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    cursor.copy_expert(copy_sql, _CsvStream(df, chunk_rows))
+    incr('rows_written', len(df))
+
+
+def copy_replace(df, table_name, engine, dtype=None, chunk_rows=DEFAULT_CHUNK_ROWS, indexes=()):
+    """
+    Replace table_name with the contents of df using COPY.
+
+    dtype is the column_typ_dict each script defines.  It is used to create
+    the staging table, so the final table has the same column types that
+    to_sql(..., dtype=column_typ_dict) produced.
+
+    indexes is a list of column tuples.  The old table's indexes go away with
+    the swap, so they are rebuilt on the new table before the commit.
+    """
+    return copy_replace_frames([df], table_name, engine, dtype, chunk_rows, indexes)
+
+
+def copy_replace_frames(frames, table_name, engine, dtype=None, chunk_rows=DEFAULT_CHUNK_ROWS, indexes=()):
+    """
+    copy_replace for a stream of dataframes (a generator is consumed one frame at a time).
+
+    Every frame is copied into the same staging table and the swap happens
+    once the stream ends, so only one frame has to be in memory.  The staging
+    table is created from the first frame (from the keys of dtype when the
+    stream is empty).  Returns the number of rows loaded.
+    """
+    staging_name = f"{table_name}_staging"
+    frames = iter(frames)
+    first = next(frames, None)
+    template = first.head(n=0) if first is not None else pd.DataFrame(columns=list(dtype or {}))
+
+    # Create empty staging table with the script's column types
+    template.to_sql(name=staging_name, con=engine, dtype=dtype, if_exists='replace', index=False)
+
+    t_start = time()
+    rows = 0
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        for df in chain([first] if first is not None else [], frames):
+            copy_rows(cursor, df, staging_name, chunk_rows)
+            rows += len(df)
+
+        # Swap staging in for the target table inside the same transaction
+        cursor.execute(f"DROP TABLE IF EXISTS {quote_ident(table_name)}")
+        cursor.execute(f"ALTER TABLE {quote_ident(staging_name)} RENAME TO {quote_ident(table_name)}")
+        create_indexes(cursor, table_name, indexes)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    t_end = time()
+
+    print('Finished loading %d rows into %s.  Took %.3f seconds' % (rows, table_name, t_end - t_start))
+    return rows
+
+
+def create_table_if_missing(df, table_name, engine, dtype=None, index_column=None):
+    """
+    Create table_name from df's columns and dtype if it does not exist yet.
+
+    index_column adds an index (if missing) for the key used by replace_rows.
+    Columns of dtype that an existing table lacks are added, so a table
+    created before a script gained columns keeps accepting its rows.
+    """
+    df.head(n=0).to_sql(name=table_name, con=engine, dtype=dtype, if_exists='append', index=False)
+    with engine.begin() as conn:
+        for column, column_type in (dtype or {}).items():
+            if column in df.columns:
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {quote_ident(table_name)} ADD COLUMN IF NOT EXISTS {quote_ident(column)} "
+                    f"{column_type.compile(dialect=engine.dialect)}"
+                )
+        if index_column:
+            conn.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS {quote_ident(index_name(table_name, [index_column]))} "
+                f"ON {quote_ident(table_name)} ({quote_ident(index_column)})"
+            )
+
+
+def replace_rows(cursor, df, table_name, key_column, keys, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Delete the rows of table_name whose key_column is in keys, then COPY df in.
+
+    Runs on the caller's cursor so several tables can be upserted in one
+    transaction.  df should only hold rows for keys.
+    """
+    cursor.execute(
+        f"DELETE FROM {quote_ident(table_name)} WHERE {quote_ident(key_column)} = ANY(%s)",
+        (list(keys),)
+    )
+    if len(df):
+        copy_rows(cursor, df, table_name, chunk_rows)
@@ -0,0 +1,198 @@
+"""
+Pipeline Runner
+
+Runs the ingestion and analysis stages in one process, so the flow starts one
+container instead of one per script.  Each stage declares the stages it needs:
+
+    holdings        ─┐
+    put_candidates  ─┴─> fetch_chains ─┬─> write_chains ──────────────────┐
+                                       ├─> stock_hist ─> stock_dim ───────┴─> put_leads ─> put_to_sheets
+                                       └─> archive_chains
+
+A stage starts as soon as everything it needs has finished, so independent
+stages run at the same time (the two sheet reads, and writing the option
+snapshots and the Parquet archive while the history is downloaded).  Stages hand their dataframes to
+the next stages in memory (holdings and option tickers, the new puts and
+stock dim rows for put_leads, the put_leads output for the sheets) and still
+write their tables as before.
+
+The stock dim stage reads its 52 week window back from stock_hist_data, since
+an incremental history run only holds the new bars.  put_leads in sql mode
+reads put_option_data from Postgres by design.
+
+Run everything:      python pipeline.py
+Run some stages:     python pipeline.py put_leads put_to_sheets
+Stages that are not run are not passed in memory; the stages that need them
+read the tables written by an earlier run instead.
+
+A failed stage skips the stages that depend on it.  The others finish, then
+the runner exits with an error.  Stage metrics are flushed once at the end,
+tagged with the stage name (see pipeline_metrics.py).
+PIPELINE_MAX_STAGES caps how many stages run at once.
+"""
+
+import os
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from chain_ingest import archive_option_chains, fetch_option_chains, read_put_candidates, write_option_chains
+from holdings_ingest import ingest_holdings
+from pg_loader import database_url
+from pipeline_metrics import flush, script_scope, stage
+from providers import get_provider
+from put_leads import analyze_put_leads
+from stock_dim_ingest import ingest_stock_dim
+from stock_hist import ingest_history
+from write_to_sheets import write_sheets
+
+DEFAULT_MAX_STAGES = int(os.getenv('PIPELINE_MAX_STAGES', '4'))
+
+
+def _ticker_universe(results):
+    """Holdings plus put option tickers from this run (tickers_sql in memory), or None to read the tables."""
+    if 'holdings' not in results or 'fetch_chains' not in results:
+        return None
+    holdings_df, _ = results['holdings']
+    chain_dfs, _ = results['fetch_chains']
+    return pd.concat([holdings_df['ticker'], chain_dfs['puts']['ticker']]).dropna().unique()
+
+
+def holdings_stage(engine, provider, results):
+    return ingest_holdings(engine, provider)
+
+
+def put_candidates_stage(engine, provider, results):
+    return read_put_candidates(provider)
+
+
+def fetch_chains_stage(engine, provider, results):
+    put_candidate_df = results.get('put_candidates')
+    if put_candidate_df is None:
+        put_candidate_df = read_put_candidates(provider)
+    holdings_df = results['holdings'][0] if 'holdings' in results else None
+    return fetch_option_chains(engine, provider, put_candidate_df, holdings_df)
+
+
+def write_chains_stage(engine, provider, results):
+    if 'fetch_chains' not in results:
+        raise ValueError("write_chains writes the chains fetched in the same run.  Run it with fetch_chains")
+    chain_dfs, snapshot = results['fetch_chains']
+    write_option_chains(engine, chain_dfs, snapshot)
+
+
+def archive_chains_stage(engine, provider, results):
+    if 'fetch_chains' not in results:
+        raise ValueError("archive_chains archives the chains fetched in the same run.  Run it with fetch_chains")
+    archive_option_chains(*results['fetch_chains'])
+
+
+def stock_hist_stage(engine, provider, results):
+    return ingest_history(engine, provider, tickers=_ticker_universe(results))
+
+
+def stock_dim_stage(engine, provider, results):
+    return ingest_stock_dim(engine, provider, tickers=_ticker_universe(results))
+
+
+def put_leads_stage(engine, provider, results):
+    inputs = {}
+    if 'fetch_chains' in results:
+        inputs['put_option_data'] = results['fetch_chains'][0]['puts']
+    if 'stock_dim' in results:
+        inputs['stock_dim_data'] = results['stock_dim']
+    return analyze_put_leads(engine, inputs=inputs)
+
+
+def put_to_sheets_stage(engine, provider, results):
+    # None when put_leads ran incrementally and only holds the recomputed tickers
+    put_leads_result = results.get('put_leads')
+    if put_leads_result is None:
+        return write_sheets(engine)
+    put_candidates_df, put_options_df = put_leads_result
+    return write_sheets(engine, put_options_df=put_options_df, put_candidate_df=put_candidates_df)
+
+
+# stage name: (stages it needs, function(engine, provider, results)), in flow order
+PIPELINE_STAGES = {
+    'holdings': ((), holdings_stage),
+    'put_candidates': ((), put_candidates_stage),
+    'fetch_chains': (('holdings', 'put_candidates'), fetch_chains_stage),
+    'write_chains': (('fetch_chains',), write_chains_stage),
+    'archive_chains': (('fetch_chains',), archive_chains_stage),
+    'stock_hist': (('fetch_chains',), stock_hist_stage),
+    'stock_dim': (('stock_hist',), stock_dim_stage),
+    'put_leads': (('write_chains', 'stock_dim'), put_leads_stage),
+    'put_to_sheets': (('put_leads',), put_to_sheets_stage),
+}
+
+
+def _run_stage(name, engine, provider, results):
+    """Run one stage with its metrics tagged by the stage name."""
+    _, stage_fn = PIPELINE_STAGES[name]
+    with script_scope(name), stage('total'):
+        return stage_fn(engine, provider, results)
+
+
+def run_pipeline(stage_names=None, engine=None, provider=None, max_stages=DEFAULT_MAX_STAGES):
+    """
+    Run stage_names (default: every stage) in dependency order, independent stages concurrently.
+
+    Dependencies outside stage_names count as already done.  Returns the dict
+    of stage name -> result.  Raises RuntimeError naming the failed stages.
+    """
+    stage_names = list(stage_names or PIPELINE_STAGES)
+    unknown = [name for name in stage_names if name not in PIPELINE_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown pipeline stages: {unknown}.  Use any of {list(PIPELINE_STAGES)}")
+    engine = engine or create_engine(database_url())
+    provider = provider or get_provider()
+
+    pending = [name for name in PIPELINE_STAGES if name in stage_names]
+    results, failed, skipped = {}, {}, []
+    t_start = perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_stages) as executor:
+        running = {}
+        while pending or running:
+            for name in list(pending):
+                needs = [dep for dep in PIPELINE_STAGES[name][0] if dep in stage_names]
+                if any(dep in failed or dep in skipped for dep in needs):
+                    pending.remove(name)
+                    skipped.append(name)
+                    print(f"[pipeline] {name} skipped: an upstream stage failed")
+                elif all(dep in results for dep in needs):
+                    pending.remove(name)
+                    # Stages only read results of stages that already finished
+                    running[executor.submit(_run_stage, name, engine, provider, dict(results))] = name
+                    print(f"[pipeline] {name} started at {perf_counter() - t_start:.1f}s")
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                    print(f"[pipeline] {name} finished at {perf_counter() - t_start:.1f}s")
+                except Exception as e:
+                    failed[name] = e
+                    print(f"[pipeline] {name} failed:")
+                    traceback.print_exception(type(e), e, e.__traceback__)
+
+    flush(engine)
+    if failed:
+        raise RuntimeError(f"Pipeline stages failed: {', '.join(failed)}.  Skipped: {', '.join(skipped) or 'none'}")
+    return results
+
+
+def main():
+    run_pipeline(sys.argv[1:] or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Pipeline Metrics
+
+Per-stage instrumentation for the flow scripts, instead of progress prints.
+
+    with stage('fetch_chains'):
+        ...                                   # wall time and ok / failed status are recorded
+        incr('rows_fetched', len(chain_df))   # counters go to the innermost open stage
+
+    result = call_with_retries(fn, arg, label='AMD 2025-01-17')   # counts api_calls / api_errors / retries
+
+    flush(engine)                             # once, at the end of the script
+
+flush() emits the stages three ways:
+- Kestra outputs and metrics (the ::{...}:: lines Kestra's script tasks parse),
+  tagged with script and stage, so runs can be charted in Kestra
+- rows in the pipeline_metrics Postgres table (one row per run, script and stage)
+- one summary line per stage on stdout
+
+PIPELINE_RUN_ID ties the scripts of one flow execution together (the flows
+pass {{ execution.id }}).  FETCH_RETRIES sets how many times a failed API
+request is retried.
+
+Open stages are tracked per thread.  Work handed to a thread pool inside a
+stage is wrapped with in_current_stage() so its counters land in that stage.
+script_scope() tags the stages of one script when several run in one process
+(pipeline.py).
+"""
+
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, sleep
+
+import pandas as pd
+from sqlalchemy.types import BigInteger, DateTime, Float, VARCHAR
+
+COUNTERS = ('api_calls', 'api_errors', 'retries', 'cache_hits', 'cache_misses', 'rows_fetched', 'rows_written')
+
+# Retries per failed API request, with a short linear backoff
+DEFAULT_RETRIES = int(os.getenv('FETCH_RETRIES', '1'))
+RETRY_BACKOFF_SECONDS = 0.5
+
+# Only the first few errors of a stage are printed.  The rest are counted
+MAX_LOGGED_ERRORS = 5
+
+RUN_ID = os.getenv('PIPELINE_RUN_ID') or datetime.now().strftime('%Y%m%d%H%M%S')
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or 'interactive'))[0]
+
+metrics_schema_dc = {
+    'run_id' : VARCHAR(64),
+    'script' : VARCHAR(64),
+    'stage' : VARCHAR(64),
+    'status' : VARCHAR(10),
+    'started_at' : DateTime(),
+    'wall_s' : Float(),
+    **{counter : BigInteger() for counter in COUNTERS},
+}
+
+_lock = threading.Lock()
+_stages = {}
+_local = threading.local()
+
+
+def _open_stages():
+    if not hasattr(_local, 'open_stages'):
+        _local.open_stages = []
+    return _local.open_stages
+
+
+def _stage_record(name, script=None):
+    key = (script or current_script(), name)
+    if key not in _stages:
+        _stages[key] = {'script': key[0], 'stage': name, 'status': 'ok', 'started_at': None, 'wall_s': 0.0,
+                        **{counter: 0 for counter in COUNTERS}}
+    return _stages[key]
+
+
+def current_stage():
+    """Innermost open stage of this thread, or 'script' outside any stage."""
+    open_stages = _open_stages()
+    return open_stages[-1] if open_stages else 'script'
+
+
+def current_script():
+    """Script the stages of this thread are tagged with (SCRIPT unless inside script_scope)."""
+    return getattr(_local, 'script', None) or SCRIPT
+
+
+@contextmanager
+def script_scope(name):
+    """Tag the stages opened in this thread with script name instead of SCRIPT."""
+    previous = getattr(_local, 'script', None)
+    _local.script = name
+    try:
+        yield
+    finally:
+        _local.script = previous
+
+
+@contextmanager
+def stage(name):
+    """Time a block as stage name.  A stage that raises is recorded as failed."""
+    with _lock:
+        record = _stage_record(name)
+        record['started_at'] = record['started_at'] or datetime.now()
+    _open_stages().append(name)
+    t_start = perf_counter()
+    try:
+        yield record
+    except Exception:
+        record['status'] = 'failed'
+        raise
+    finally:
+        record['wall_s'] += perf_counter() - t_start
+        _open_stages().pop()
+
+
+def in_current_stage(fn):
+    """Wrap fn so it counts towards the calling thread's script and stage when run on a worker thread."""
+    script, stage_name = current_script(), current_stage()
+
+    def run_in_stage(*args, **kwargs):
+        with script_scope(script):
+            _open_stages().append(stage_name)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _open_stages().pop()
+    return run_in_stage
+
+
+def incr(counter, n=1, stage_name=None):
+    """Add n to a counter of stage_name (default: the innermost open stage).  Safe from worker threads."""
+    with _lock:
+        _stage_record(stage_name or current_stage())[counter] += int(n)
+
+
+def call_with_retries(fn, *args, retries=None, label='', stage_name=None, **kwargs):
+    """
+    Call fn(*args, **kwargs) as one API request, retrying failures.
+
+    Counts api_calls for every attempt, retries for every repeat and
+    api_errors when the last attempt fails, then re-raises.
+    """
+    stage_name = stage_name or current_stage()
+    retries = DEFAULT_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        incr('api_calls', stage_name=stage_name)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt < retries:
+                incr('retries', stage_name=stage_name)
+                sleep(RETRY_BACKOFF_SECONDS * (attempt + 1))
+                continue
+            incr('api_errors', stage_name=stage_name)
+            with _lock:
+                errors = _stage_record(stage_name)['api_errors']
+            if errors <= MAX_LOGGED_ERRORS:
+                print(f"Error in {stage_name} {label}: {e}")
+            if errors == MAX_LOGGED_ERRORS:
+                print(f"Further {stage_name} errors are only counted")
+            raise
+
+
+def stage_metrics():
+    """Dataframe of the recorded stages, one row per stage (pipeline_metrics columns)."""
+    with _lock:
+        rows = [dict(record) for record in _stages.values()]
+    metrics_df = pd.DataFrame(rows, columns=['script', 'stage', 'status', 'started_at', 'wall_s', *COUNTERS])
+    metrics_df.insert(0, 'run_id', RUN_ID)
+    return metrics_df
+
+
+def _kestra_line(payload):
+    print('::' + json.dumps(payload, default=str) + '::')
+
+
+def flush(engine=None):
+    """
+    Emit the recorded stages as Kestra outputs / metrics, append them to
+    pipeline_metrics (when engine is given) and print one line per stage.
+    """
+    metrics_df = stage_metrics()
+    if metrics_df.empty:
+        return metrics_df
+
+    outputs = {}
+    kestra_metrics = []
+    for record in metrics_df.to_dict('records'):
+        tags = {'script': record['script'], 'stage': record['stage']}
+        outputs.setdefault(record['script'], {})[record['stage']] = {k: record[k] for k in ('status', 'wall_s', *COUNTERS)}
+        kestra_metrics.append({'name': 'wall_s', 'type': 'timer', 'value': record['wall_s'], 'tags': tags})
+        for counter in COUNTERS:
+            if record[counter]:
+                kestra_metrics.append({'name': counter, 'type': 'counter', 'value': record[counter], 'tags': tags})
+    _kestra_line({'outputs': outputs})
+    _kestra_line({'metrics': kestra_metrics})
+
+    for record in metrics_df.to_dict('records'):
+        counts = ', '.join(f"{counter}={record[counter]}" for counter in COUNTERS if record[counter])
+        print(f"[{record['script']}] {record['stage']}: {record['status']} in {record['wall_s']:.2f}s"
+              + (f" ({counts})" if counts else ''))
+
+    if engine is not None:
+        try:
+            metrics_df.to_sql('pipeline_metrics', con=engine, dtype=metrics_schema_dc, if_exists='append', index=False)
+        except Exception as e:
+            # Metrics never fail the run
+            print(f"Could not write pipeline_metrics: {e}")
+    return metrics_df
+
+
+def reset():
+    """Forget recorded stages (for runs that call several scripts' main() in one process)."""
+    with _lock:
+        _stages.clear()
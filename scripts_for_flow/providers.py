@@ -0,0 +1,259 @@
+"""
+Market Data Providers
+
+The ingest scripts get expirations, chains, quotes, history and the Google
+Sheets ticker lists through a provider instead of calling yfinance and gspread
+directly:
+
+- provider.ticker(symbol)    : object with .options, .option_chain(exp), .info,
+                               .history(...), .fast_info['lastPrice'] (yf.Ticker interface)
+- provider.download(tickers, start=..., group_by='ticker', ...) : yf.download interface
+- provider.holdings()        : Select_Holdings sheet as a dataframe
+- provider.put_candidates()  : Put_Candidates sheet as a dataframe (tickers in the first column)
+
+MARKET_DATA_PROVIDER picks the implementation:
+- 'yfinance' (default) : yfinance through the response cache (market_cache.py) and gspread
+- 'synthetic'          : seeded, offline data for N tickers x M expirations x K strikes,
+                         with optional latency and error injection for load tests
+
+Synthetic settings (env): SYNTHETIC_SEED, SYNTHETIC_TICKERS, SYNTHETIC_EXPIRATIONS,
+SYNTHETIC_STRIKES, SYNTHETIC_LATENCY_MS, SYNTHETIC_ERROR_RATE.
+"""
+
+import math
+import os
+import zlib
+from datetime import date, timedelta
+from functools import lru_cache
+from time import sleep
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from greeks import norm_cdf
+from market_cache import cached_download, cached_ticker
+
+PROVIDERS = ('yfinance', 'synthetic')
+
+# Service account used by the sheet scripts
+GSHEETS_CREDENTIALS = 'studiotlanalyticsSvcAccnt-a59159d08cb6.json'
+
+
+class YFinanceProvider:
+    """Live data: cached yfinance calls and the Google Sheets ticker lists."""
+
+    name = 'yfinance'
+
+    def ticker(self, ticker_symbol):
+        return cached_ticker(ticker_symbol)
+
+    def download(self, tickers, **kwargs):
+        return cached_download(tickers, **kwargs)
+
+    def _sheet_records(self, sheet_name):
+        import gspread
+        gc = gspread.service_account(filename=GSHEETS_CREDENTIALS)
+        wksht = gc.open(sheet_name).get_worksheet(0)
+        return pd.DataFrame(wksht.get_all_records())
+
+    def holdings(self):
+        return self._sheet_records("Select_Holdings")
+
+    def put_candidates(self):
+        return self._sheet_records("Put_Candidates")
+
+
+class SyntheticProvider:
+    """
+    Deterministic offline market data.
+
+    Every value is derived from (seed, ticker, request), so results don't depend
+    on thread scheduling and a rerun returns the same data.  Daily closes are a
+    geometric random walk from a fixed epoch, so bars stored by an earlier run
+    line up with later ones.  Chains are Black-Scholes prices over a strike grid
+    around the last close with a put skew, a bid/ask spread and zero bids on the
+    far wings.
+
+    latency_ms sleeps before every request (with up to 50% deterministic jitter).
+    error_rate is the share of requests that raise, also deterministic per request.
+    """
+
+    name = 'synthetic'
+    epoch = date(2024, 1, 2)
+
+    def __init__(self, seed=0, n_tickers=50, n_expirations=3, n_strikes=40, latency_ms=0.0, error_rate=0.0,
+                 today=None):
+        self.seed = seed
+        self.tickers = [f"SYN{i:05d}" for i in range(n_tickers)]
+        self.n_expirations = n_expirations
+        self.n_strikes = n_strikes
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.today = today or date.today()
+        self._dates = pd.bdate_range(self.epoch, self.today, name='Date')
+
+    def _rng(self, *key):
+        return np.random.default_rng([self.seed, zlib.crc32(repr(key).encode('utf-8'))])
+
+    def _request(self, *key):
+        """Simulated network round trip for one request."""
+        rng = self._rng('request', *key)
+        if self.latency_ms:
+            sleep(self.latency_ms * (1 + 0.5 * rng.random()) / 1000)
+        if self.error_rate and rng.random() < self.error_rate:
+            raise RuntimeError(f"Synthetic provider error for {key}")
+
+    @lru_cache(maxsize=None)
+    def _bars(self, ticker_symbol):
+        """Daily OHLC bars from the epoch through today."""
+        rng = self._rng('bars', ticker_symbol)
+        dates = self._dates
+        start_price = float(np.exp(rng.uniform(np.log(10), np.log(500))))
+        daily_vol = rng.uniform(0.15, 0.6) / math.sqrt(252)
+        returns = rng.normal(0.0002, daily_vol, len(dates))
+        close = start_price * np.exp(np.cumsum(returns))
+        open_ = close * np.exp(rng.normal(0, daily_vol / 2, len(dates)))
+        high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, daily_vol / 2, len(dates))))
+        low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, daily_vol / 2, len(dates))))
+        volume = rng.integers(1e5, 5e6, len(dates))
+        return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume},
+                            index=dates).round(2)
+
+    def _vol(self, ticker_symbol):
+        return self._rng('vol', ticker_symbol).uniform(0.2, 0.7)
+
+    def expirations(self, ticker_symbol):
+        """The next n_expirations Fridays after today."""
+        days_to_friday = (4 - self.today.weekday()) % 7 or 7
+        first = self.today + timedelta(days=days_to_friday)
+        return tuple((first + timedelta(weeks=i)).strftime('%Y-%m-%d') for i in range(self.n_expirations))
+
+    def chain(self, ticker_symbol, exp_str):
+        """Calls and puts for one expiration, with the yfinance option_chain columns."""
+        rng = self._rng('chain', ticker_symbol, exp_str)
+        spot = float(self._bars(ticker_symbol)['Close'].iloc[-1])
+        t = max((date.fromisoformat(exp_str) - self.today).days, 1) / 365
+        step = 10 ** math.floor(math.log10(spot)) / 20
+        strikes = np.round(np.round(spot / step) * step + step * (np.arange(self.n_strikes) - self.n_strikes // 2), 2)
+        strikes = strikes[strikes > 0]
+
+        moneyness = np.log(strikes / spot)
+        iv = np.maximum(self._vol(ticker_symbol) * (1 - 0.8 * moneyness + 1.5 * moneyness ** 2), 0.05)
+        d1 = (-moneyness + 0.5 * iv ** 2 * t) / (iv * math.sqrt(t))
+        d2 = d1 - iv * math.sqrt(t)
+        call = spot * norm_cdf(d1) - strikes * norm_cdf(d2)
+        put = strikes * norm_cdf(-d2) - spot * norm_cdf(-d1)
+
+        sides = {}
+        for side, price in (('calls', call), ('puts', put)):
+            half_spread = np.maximum(0.01, price * rng.uniform(0.02, 0.08, len(strikes)))
+            bid = np.where(price < 0.05, 0.0, np.round(price - half_spread, 2)).clip(min=0)
+            ask = np.round(price + half_spread, 2)
+            in_the_money = strikes < spot if side == 'calls' else strikes > spot
+            sides[side] = pd.DataFrame({
+                'contractSymbol': [f"{ticker_symbol}{exp_str.replace('-', '')[2:]}{side[0].upper()}{int(k * 1000):08d}"
+                                   for k in strikes],
+                'strike': strikes,
+                'lastPrice': np.round(price, 2),
+                'bid': bid,
+                'ask': ask,
+                'volume': rng.integers(0, 5000, len(strikes)),
+                'openInterest': rng.integers(0, 20000, len(strikes)),
+                'impliedVolatility': iv,
+                'inTheMoney': in_the_money,
+            })
+        return sides['calls'], sides['puts']
+
+    def history(self, ticker_symbol, start=None, end=None, period=None):
+        bars = self._bars(ticker_symbol)
+        if period:
+            days = {'5d': 7, '1mo': 31, '3mo': 92, '6mo': 183, '1y': 366}[period]
+            start = self.today - timedelta(days=days)
+        if start is not None:
+            bars = bars[bars.index >= pd.Timestamp(start)]
+        if end is not None:
+            bars = bars[bars.index < pd.Timestamp(end)]
+        return bars
+
+    def info(self, ticker_symbol):
+        bars = self.history(ticker_symbol, period='1y')
+        return {
+            'symbol': ticker_symbol,
+            'currentPrice': float(bars['Close'].iloc[-1]),
+            'regularMarketPrice': float(bars['Close'].iloc[-1]),
+            'fiftyTwoWeekHigh': float(bars['High'].max()),
+            'fiftyTwoWeekLow': float(bars['Low'].min()),
+        }
+
+    def ticker(self, ticker_symbol):
+        return SyntheticTicker(self, ticker_symbol)
+
+    def download(self, tickers, start=None, end=None, period=None, group_by='ticker', **kwargs):
+        self._request('download', tuple(tickers), str(start), str(end), period)
+        frames = {t: self.history(t, start=start, end=end, period=period) for t in tickers}
+        return pd.concat(frames, axis=1, names=['Ticker', 'Price'])
+
+    def holdings(self):
+        """Roughly every tenth synthetic ticker, spread over two accounts."""
+        rng = self._rng('holdings')
+        held = self.tickers[::10]
+        return pd.DataFrame({
+            'ticker': held,
+            'shares': rng.integers(1, 10, len(held)) * 100,
+            'avg_cost_basis': [round(float(self._bars(t)['Close'].iloc[-60:].mean()), 2) for t in held],
+            'account_alias': ['brokerage' if i % 2 else 'ira' for i in range(len(held))],
+        })
+
+    def put_candidates(self):
+        return pd.DataFrame({'ticker': self.tickers})
+
+
+class SyntheticTicker:
+    """yf.Ticker interface over a SyntheticProvider."""
+
+    def __init__(self, provider, ticker_symbol):
+        self._provider = provider
+        self.ticker = ticker_symbol
+
+    @property
+    def options(self):
+        self._provider._request('options', self.ticker)
+        return self._provider.expirations(self.ticker)
+
+    def option_chain(self, exp_str):
+        self._provider._request('option_chain', self.ticker, exp_str)
+        calls, puts = self._provider.chain(self.ticker, exp_str)
+        underlying = {'symbol': self.ticker, 'regularMarketPrice': self._provider.info(self.ticker)['currentPrice']}
+        return SimpleNamespace(calls=calls, puts=puts, underlying=underlying)
+
+    @property
+    def info(self):
+        self._provider._request('info', self.ticker)
+        return self._provider.info(self.ticker)
+
+    @property
+    def fast_info(self):
+        self._provider._request('last_price', self.ticker)
+        return {'lastPrice': self._provider.info(self.ticker)['currentPrice']}
+
+    def history(self, start=None, end=None, period=None, **kwargs):
+        self._provider._request('history', self.ticker, str(start), str(end), period)
+        return self._provider.history(self.ticker, start=start, end=end, period=period)
+
+
+def get_provider(name=None):
+    """Provider named by name or MARKET_DATA_PROVIDER (default 'yfinance')."""
+    name = name or os.getenv('MARKET_DATA_PROVIDER', 'yfinance')
+    if name == 'yfinance':
+        return YFinanceProvider()
+    if name == 'synthetic':
+        return SyntheticProvider(
+            seed=int(os.getenv('SYNTHETIC_SEED', '0')),
+            n_tickers=int(os.getenv('SYNTHETIC_TICKERS', '50')),
+            n_expirations=int(os.getenv('SYNTHETIC_EXPIRATIONS', '3')),
+            n_strikes=int(os.getenv('SYNTHETIC_STRIKES', '40')),
+            latency_ms=float(os.getenv('SYNTHETIC_LATENCY_MS', '0')),
+            error_rate=float(os.getenv('SYNTHETIC_ERROR_RATE', '0')),
+        )
+    raise ValueError(f"Unknown market data provider: {name}.  Use one of {PROVIDERS}")
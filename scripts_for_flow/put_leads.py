@@ -11,19 +11,26 @@ Author: Generated from put_leads.ipynb
 """
 
 import pandas as pd
-import numpy as np
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from datetime import datetime, timedelta
 import os
 from sqlalchemy.types import Float
-from sqlalchemy.types import Date
 from sqlalchemy.types import DateTime
 from sqlalchemy.types import VARCHAR
 from sqlalchemy.types import Integer
+from frame_schema import (CANDIDATE_DTYPES, HIST_DTYPES, OPTION_DTYPES, STOCK_DIM_DTYPES, compact, memory_report,
+                          read_frame, read_frame_chunks)
+from greeks import GREEK_COLUMNS, add_option_greeks
+from pg_loader import (copy_replace, copy_replace_frames, copy_rows, create_indexes, create_table_if_missing,
+                       database_url, replace_rows)
+from pipeline_metrics import RUN_ID, flush, incr, stage
+from indicators import active_indicators, compute_indicators, history_requirements, put_candidate_ind
 
 def calculate_up_vs_pri_day_vs_8day(row, stock_hist_data):
     """
-    Calculate up_vs_pri_day_vs_8day indicator.
+    Calculate up_vs_pri_day_vs_8day indicator for one candidate row.
+    
+    Row-by-row reference for momentum_signals.up_vs_pri_day_vs_8day.
     
     Returns 1 if:
     - Current price > prior day's price
@@ -64,7 +71,9 @@ def calculate_up_vs_pri_day_vs_8day(row, stock_hist_data):
 
 def calculate_up_vs_pri_wk_vs_8day(row, stock_hist_data):
     """
-    Calculate up_vs_pri_wk_vs_8day indicator.
+    Calculate up_vs_pri_wk_vs_8day indicator for one candidate row.
+    
+    Row-by-row reference for momentum_signals.up_vs_pri_wk_vs_8day.
     
     Returns 1 if:
     - Current price > end of prior week's price
@@ -121,37 +130,174 @@ def calculate_up_vs_pri_wk_vs_8day(row, stock_hist_data):
     return 1 if (condition1 and condition2) else 0
 
 
-def main():
-    """Main execution function."""
-    
-    # Connect to Postgres
-    # Use environment variable for database host, default to pgdatabase (Docker network)
-    # Set DATABASE_HOST=localhost if running locally outside Docker
-    db_host = os.getenv('DATABASE_HOST', 'pgdatabase')
-    # db_host = os.getenv('DATABASE_HOST', 'localhost'
-    print(f"Connecting to database at {db_host}...")
-    engine = create_engine(f'postgresql://root:root@{db_host}:5432/option_data')
-    
-    # 1) Pull the 3 tables into dataframes
-    print("Loading data from database...")
-    put_option_data = pd.read_sql_query("SELECT * FROM put_option_data", engine)
-    stock_dim_data = pd.read_sql_query("SELECT * FROM stock_dim_data", engine)
-    stock_hist_data = pd.read_sql_query("SELECT * FROM stock_hist_data", engine)
-    
-    print(f"Loaded {len(put_option_data)} put option records")
-    print(f"Loaded {len(stock_dim_data)} stock dimension records")
-    print(f"Loaded {len(stock_hist_data)} historical stock records")
-    
-    # Ensure date columns are datetime
-    print("\nConverting date columns...")
-    put_option_data['exp_date'] = pd.to_datetime(put_option_data['exp_date'])
-    stock_dim_data['latest_close_date'] = pd.to_datetime(stock_dim_data['latest_close_date'])
-    stock_hist_data['hist_date'] = pd.to_datetime(stock_hist_data['hist_date'])
-    
-    # 2) Add calculated columns to put_option_data
-    print("\nCalculating put option metrics...")
-    today = datetime.today()
+# Schema for put_candidates_df table (put_candidate_tickers)
+put_candidate_schema_dc = {
+    'ticker' : VARCHAR(20),
+    'current_price' : Float(),
+    'week_52_high' : Float(),
+    'week_52_low' : Float(),
+    'latest_close_date' : DateTime(),
+    'lower_qrt_52wk_bound' : Float(),
+    'lower_qrt_ind' : Integer(),
+    'up_vs_pri_day_vs_8day' : Integer(),
+    'up_vs_pri_wk_vs_8day' : Integer(),
+    'put_candidate_ind' : Integer(),
+}
+
+# Schema for put_candidates_prices table (put_candidate_options)
+put_candidate_prc_sc_dc = {
+    'strike' : Float(),
+    'bid' : Float(),
+    'ask' : Float(),
+    'impliedVolatility' : Float(),
+    'exp_date' : DateTime(),
+    'as_of_date' : DateTime(),
+    'ticker' : VARCHAR(20),
+    'mid' : Float(),
+    'upfront_premium' : Float(),
+    'days_til_strike' : Integer(),
+    'money_aside' : Float(),
+    'raw_return' : Float(),
+    'annualized_return' : Float(),
+    'put_candidate_ind': Integer(),
+    'current_price' : Float(),
+    'price_strike_discount' : Float(),
+    # Black-Scholes columns (see greeks.py)
+    'iv' : Float(),
+    'iv_from_mid' : Integer(),
+    'delta' : Float(),
+    'theta' : Float(),
+    'vega' : Float(),
+    'prob_itm' : Float(),
+}
+
+# SQL-backed version of add_put_option_metrics + select_candidate_options.
+# Computes the same columns with the same float operations, joins stock_dim_data and
+# drops strike >= current_price in Postgres, so only surviving rows come back.
+# annualized_return follows pandas division by zero (inf / -inf / NaN) for 0 days til strike.
+PUT_CANDIDATE_OPTIONS_SQL = """
+WITH metrics AS (
+    SELECT po.strike
+         , po.bid
+         , po.ask
+         , po."impliedVolatility"
+         , po.exp_date
+         , po.as_of_date
+         , po.ticker
+         , (po.bid + po.ask) / 2 AS mid
+         , (po.exp_date - po.as_of_date::date) AS days_til_strike
+         , po.strike * 100 AS money_aside
+         , sd.current_price
+      FROM put_option_data po
+      JOIN stock_dim_data sd
+        ON po.ticker = sd.ticker
+     WHERE po.strike < sd.current_price
+           {ticker_filter}
+), returns AS (
+    SELECT m.*
+         , m.mid * 100 AS upfront_premium
+         , m.mid * 100 / m.money_aside AS raw_return
+      FROM metrics m
+)
+SELECT r.strike
+     , r.bid
+     , r.ask
+     , r."impliedVolatility"
+     , r.exp_date
+     , r.as_of_date
+     , r.ticker
+     , r.mid
+     , r.upfront_premium
+     , r.days_til_strike
+     , r.money_aside
+     , r.raw_return
+     , CASE WHEN r.days_til_strike <> 0 THEN r.raw_return * 365 / r.days_til_strike
+            WHEN r.raw_return > 0 THEN 'Infinity'::float8
+            WHEN r.raw_return < 0 THEN '-Infinity'::float8
+            ELSE 'NaN'::float8
+       END AS annualized_return
+     , r.current_price
+     , (r.strike / r.current_price - 1) * -1 AS price_strike_discount
+  FROM returns r
+"""
+
+PUT_LEADS_MODES = ('pandas', 'sql', 'chunked')
+
+# Option rows read per chunk in chunked mode (a ticker is never split, so a chunk can be one ticker larger)
+PUT_LEADS_CHUNK_ROWS = int(os.getenv('PUT_LEADS_CHUNK_ROWS', '200000'))
+
+# Indexes on put_candidate_options: ticker for the incremental upsert, and the dashboard's
+# slider filters / top-N per ticker ranking (see dashboard.py)
+put_candidate_options_indexes = [
+    ('ticker',),
+    ('days_til_strike', 'price_strike_discount', 'ticker', 'annualized_return'),
+]
+
+# Per-ticker upstream watermarks: latest option pull and latest history bar
+WATERMARK_SQL = """
+SELECT po.ticker
+     , po.option_as_of_date
+     , sh.hist_date
+  FROM (SELECT ticker, max(as_of_date) AS option_as_of_date FROM put_option_data GROUP BY ticker) po
+  LEFT JOIN (SELECT ticker, max(hist_date) AS hist_date FROM stock_hist_data GROUP BY ticker) sh
+    ON po.ticker = sh.ticker
+"""
+
+watermark_schema_dc = {
+    'ticker' : VARCHAR(20),
+    'option_as_of_date' : DateTime(),
+    'hist_date' : DateTime(),
+}
+
+# One row per put_leads run that wrote output.  dashboard.py keys its caches on it, since an
+# incremental upsert can rewrite rows without changing max(as_of_date) or the row count
+put_leads_runs_schema_dc = {
+    'run_id' : VARCHAR(64),
+    'written_at' : DateTime(),
+    'mode' : VARCHAR(16),
+    'incremental' : Integer(),
+    'tickers' : Integer(),
+    'options_written' : Integer(),
+}
+
+
+def _ticker_filter(tickers, column='ticker', prefix='WHERE'):
+    """SQL filter and params restricting a query to tickers (no filter when tickers is None)."""
+    if tickers is None:
+        return '', {}
+    return f" {prefix} {column} = ANY(%(tickers)s)", {'tickers': list(tickers)}
+
+
+def _select_tickers(df, tickers):
+    """Copy of an in-memory input restricted to tickers (all rows when tickers is None), like _ticker_filter."""
+    if tickers is not None:
+        df = df[df['ticker'].isin(tickers)]
+    return df.reset_index(drop=True)
+
+
+def load_stock_hist(engine, stock_dim_data, hist_columns, lookback_days, tickers=None):
+    """
+    Load only the stock_hist_data columns and depth the active indicators need.
     
+    tickers restricts the load to those tickers (incremental mode).
+    Returns None when no indicator uses history.
+    """
+    if not hist_columns:
+        return None
+    
+    hist_since = stock_dim_data['latest_close_date'].min() - timedelta(days=lookback_days)
+    hist_filter, hist_params = _ticker_filter(tickers)
+    hist_sql = "SELECT {} FROM stock_hist_data{}".format(', '.join(hist_columns), hist_filter)
+    if pd.notna(hist_since):
+        hist_sql += " {} hist_date >= %(hist_since)s".format('AND' if hist_filter else 'WHERE')
+        hist_params['hist_since'] = hist_since.to_pydatetime()
+    stock_hist_data = read_frame(hist_sql, engine, HIST_DTYPES, params=hist_params or None)
+    print(f"Loaded {len(stock_hist_data)} historical stock records ({lookback_days} day lookback)")
+    return stock_hist_data
+
+
+def add_put_option_metrics(put_option_data):
+    """Add mid, upfront_premium, days_til_strike, money_aside, raw_return and annualized_return."""
     put_option_data['mid'] = (put_option_data['bid'] + put_option_data['ask']) / 2
     put_option_data['upfront_premium'] = put_option_data['mid'] * 100
     # Using as_of_date instead of today for more accurate calculation
@@ -164,48 +310,40 @@ def main():
     put_option_data['annualized_return'] = (
         put_option_data['raw_return'] * 365 / put_option_data['days_til_strike']
     )
+    return compact(put_option_data, OPTION_DTYPES)
+
+
+def build_put_candidates(tickers, stock_dim_data, stock_hist_data, indicator_names, candidate_rule):
+    """
+    Build the ticker level candidate frame (put_candidate_tickers).
     
-    # 3) Create put_candidates_df with unique tickers
-    print("\nCreating candidate dataframe...")
-    put_candidates_df = pd.DataFrame({'ticker': put_option_data['ticker'].unique()})
+    Joins stock_dim_data, computes the registered indicators and put_candidate_ind.
+    """
+    put_candidates_df = pd.DataFrame({'ticker': tickers})
     
     # Join stock_dim_data
     put_candidates_df = put_candidates_df.merge(stock_dim_data, on='ticker', how='left')
     
-    # Calculate lower_qrt_52wk_bound
-    print("Calculating lower quartile indicators...")
-    put_candidates_df['lower_qrt_52wk_bound'] = (
-        put_candidates_df['week_52_low'] + 
-        (put_candidates_df['week_52_high'] - put_candidates_df['week_52_low']) * 0.25
-    )
-    
-    # Calculate lower_qrt_ind
-    put_candidates_df['lower_qrt_ind'] = (
-        put_candidates_df['current_price'] < put_candidates_df['lower_qrt_52wk_bound']
-    ).astype(int)
-    
-    # 4) Calculate up_vs_pri_day_vs_8day
-    print("Calculating up_vs_pri_day_vs_8day indicator...")
-    put_candidates_df['up_vs_pri_day_vs_8day'] = put_candidates_df.apply(
-        lambda row: calculate_up_vs_pri_day_vs_8day(row, stock_hist_data), axis=1
-    )
+    # Calculate the registered indicators (lower_qrt_ind, up_vs_pri_day_vs_8day, up_vs_pri_wk_vs_8day, ...)
+    # Vectorized over all tickers (see indicators.py and momentum_signals.py).  The row-by-row functions above are the reference
+    put_candidates_df = compute_indicators(put_candidates_df, stock_hist_data, indicator_names)
     
-    # 5) Calculate up_vs_pri_wk_vs_8day
-    print("Calculating up_vs_pri_wk_vs_8day indicator...")
-    put_candidates_df['up_vs_pri_wk_vs_8day'] = put_candidates_df.apply(
-        lambda row: calculate_up_vs_pri_wk_vs_8day(row, stock_hist_data), axis=1
+    # Calculate put_candidate_ind
+    print(f"Calculating put_candidate_ind ({candidate_rule})...")
+    put_candidates_df['put_candidate_ind'] = put_candidate_ind(
+        put_candidates_df, indicator_names, rule=candidate_rule,
+        weights=os.getenv('PUT_CANDIDATE_WEIGHTS'),
+        threshold=float(os.getenv('PUT_CANDIDATE_THRESHOLD', '1.0'))
     )
+    return compact(put_candidates_df, CANDIDATE_DTYPES)
+
+
+def select_candidate_options(put_option_data, put_candidates_df):
+    """
+    Join candidate info onto the option rows and keep strikes below the current price.
     
-    # 6) Calculate put_candidate_ind
-    print("Calculating put_candidate_ind...")
-    put_candidates_df['put_candidate_ind'] = (
-        (put_candidates_df['lower_qrt_ind'] + 
-         put_candidates_df['up_vs_pri_day_vs_8day'] + 
-         put_candidates_df['up_vs_pri_wk_vs_8day']) > 0
-    ).astype(int)
-    
-    # 7) Create put_candidate_prices
-    print("\nFiltering and ranking put candidate prices...")
+    put_option_data must already have the add_put_option_metrics columns.
+    """
     # Set candidates to tickers with passing put_candidate_ind
     # If none, then pass all tickers, to surface the highest annualized return
     # Include put_candidate_ind in dataset
@@ -221,6 +359,224 @@ def main():
     # filtered_puts = put_option_data[put_option_data['strike']/put_option_data['current_price'] - 1 <= -0.095]
     # Convert negative price discount into positive number
     put_option_data['price_strike_discount'] = (put_option_data['strike']/put_option_data['current_price'] - 1) * -1
+    return compact(put_option_data, OPTION_DTYPES)
+
+
+def load_candidate_options_sql(engine, put_candidates_df, tickers=None):
+    """
+    SQL-backed select_candidate_options: metrics, join and strike filter run in Postgres.
+    
+    tickers restricts the query to those tickers (incremental mode).
+    Returns the same columns as the pandas path, in the same order (the greeks are added afterwards).
+    """
+    ticker_filter, params = _ticker_filter(tickers, column='po.ticker', prefix='AND')
+    put_option_data = read_frame(PUT_CANDIDATE_OPTIONS_SQL.format(ticker_filter=ticker_filter), engine,
+                                 OPTION_DTYPES, params=params or None)
+    
+    put_option_data = put_option_data.merge(put_candidates_df[['ticker', 'put_candidate_ind']], on='ticker')
+    columns = [c for c in put_candidate_prc_sc_dc if c not in GREEK_COLUMNS]
+    return compact(put_option_data[columns], OPTION_DTYPES)
+
+
+def candidate_option_chunks(engine, put_candidates_df, tickers=None, chunk_rows=None):
+    """
+    Chunked select_candidate_options: yields the put_candidate_options rows one ticker-aligned chunk at a time.
+
+    put_option_data is read in ticker order through a server-side cursor,
+    chunk_rows rows at a time (default PUT_LEADS_CHUNK_ROWS), and each chunk
+    goes through add_put_option_metrics, select_candidate_options and the
+    greeks before the next one is read.  Every step works per ticker, so the
+    rows match the pandas path.  tickers restricts the read (incremental mode).
+    """
+    option_filter, option_params = _ticker_filter(tickers)
+    option_frames = read_frame_chunks("SELECT * FROM put_option_data" + option_filter + " ORDER BY ticker", engine,
+                                      OPTION_DTYPES, params=option_params or None,
+                                      chunk_rows=chunk_rows or PUT_LEADS_CHUNK_ROWS, key_column='ticker')
+    for put_option_data in option_frames:
+        with stage('select_options'):
+            incr('rows_fetched', len(put_option_data))
+            put_option_data = select_candidate_options(add_put_option_metrics(put_option_data), put_candidates_df)
+            put_option_data = compact(add_option_greeks(put_option_data), OPTION_DTYPES)
+        yield put_option_data
+
+
+def record_run(engine, mode, incremental, tickers, options_written):
+    """Append this run to put_leads_runs, once its output tables are written."""
+    run_df = pd.DataFrame([{
+        'run_id': RUN_ID,
+        'written_at': datetime.now(),
+        'mode': mode,
+        'incremental': int(incremental),
+        'tickers': tickers,
+        'options_written': options_written,
+    }])
+    run_df.to_sql('put_leads_runs', con=engine, dtype=put_leads_runs_schema_dc, if_exists='append', index=False)
+
+
+def load_watermarks(engine):
+    """
+    Return (current, stored) per-ticker watermarks.
+    
+    current comes from put_option_data / stock_hist_data, stored is what the last
+    put_leads run recorded in put_leads_watermarks (empty if it has never run).
+    """
+    current = pd.read_sql_query(WATERMARK_SQL, engine)
+    if inspect(engine).has_table('put_leads_watermarks'):
+        stored = pd.read_sql_query("SELECT * FROM put_leads_watermarks", engine)
+    else:
+        stored = current.head(0)
+    return current, stored
+
+
+def changed_tickers(current, stored):
+    """
+    Compare watermarks and return (changed, removed) ticker lists.
+    
+    changed: new tickers, or tickers whose option as_of_date or latest hist_date moved.
+    removed: tickers that were recorded before but no longer have option data.
+    """
+    merged = current.merge(stored, on='ticker', how='left', suffixes=('', '_stored'), indicator=True)
+    moved = pd.Series(False, index=merged.index)
+    for col in ['option_as_of_date', 'hist_date']:
+        new_val = pd.to_datetime(merged[col])
+        old_val = pd.to_datetime(merged[col + '_stored'])
+        moved |= ~((new_val == old_val) | (new_val.isna() & old_val.isna()))
+    changed = merged.loc[(merged['_merge'] == 'left_only') | moved, 'ticker'].tolist()
+    removed = sorted(set(stored['ticker']) - set(current['ticker']))
+    return changed, removed
+
+
+def write_incremental(engine, put_candidates_df, put_option_data, watermarks, changed, removed):
+    """
+    Upsert the recomputed tickers into put_candidate_tickers and put_candidate_options.
+    
+    Rows for changed and removed tickers are deleted and the new rows copied in,
+    together with their watermarks, in one transaction.  put_option_data can
+    also be a stream of frames (chunked mode).  Returns the option rows written.
+    """
+    option_frames = [put_option_data] if isinstance(put_option_data, pd.DataFrame) else put_option_data
+    create_table_if_missing(put_candidates_df, 'put_candidate_tickers', engine, put_candidate_schema_dc, 'ticker')
+    option_columns = pd.DataFrame(columns=list(put_candidate_prc_sc_dc))
+    create_table_if_missing(option_columns, 'put_candidate_options', engine, put_candidate_prc_sc_dc, 'ticker')
+    create_table_if_missing(watermarks, 'put_leads_watermarks', engine, watermark_schema_dc, 'ticker')
+
+    keys = changed + removed
+    option_rows = 0
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        create_indexes(cursor, 'put_candidate_options', put_candidate_options_indexes)
+        replace_rows(cursor, put_candidates_df, 'put_candidate_tickers', 'ticker', keys)
+        # Delete the old option rows, then copy the new ones in frame by frame
+        replace_rows(cursor, option_columns, 'put_candidate_options', 'ticker', keys)
+        for option_frame in option_frames:
+            copy_rows(cursor, option_frame, 'put_candidate_options')
+            option_rows += len(option_frame)
+        replace_rows(cursor, watermarks, 'put_leads_watermarks', 'ticker', keys)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"Upserted {len(changed)} changed tickers, removed {len(removed)} tickers")
+    return option_rows
+
+
+def run_put_leads(engine, indicator_names, candidate_rule, mode, incremental, hist_columns, lookback_days,
+                  inputs=None):
+    """
+    Steps 0-4 of main(), each timed as a pipeline_metrics stage.
+
+    inputs optionally holds the put_option_data and stock_dim_data dataframes
+    the upstream stages just wrote (pipeline.py).  Those are used instead of
+    reading the tables back.  put_option_data is only used in pandas mode.
+
+    Returns put_candidates_df and the selected options when every ticker was
+    recomputed (the full tables).  Incremental runs return None, and so do
+    chunked runs, which never hold all the selected options at once.
+    """
+    inputs = inputs or {}
+    # sql and chunked mode never load the whole of put_option_data
+    options_in_memory = mode == 'pandas'
+    # 0) Compare upstream watermarks to find the tickers that need recomputing
+    with stage('load_watermarks'):
+        watermarks, stored_watermarks = load_watermarks(engine)
+    only_tickers = None
+    if incremental and len(stored_watermarks) > 0:
+        changed, removed = changed_tickers(watermarks, stored_watermarks)
+        print(f"Incremental run: {len(changed)} changed, {len(removed)} removed out of {len(watermarks)} tickers")
+        if not changed and not removed:
+            print("No upstream changes.  Nothing to recompute")
+            return
+        if not changed:
+            # Only removals: delete their rows, nothing to recompute
+            with stage('write_put_leads'):
+                write_incremental(engine, pd.DataFrame(columns=list(put_candidate_schema_dc)),
+                                  pd.DataFrame(columns=list(put_candidate_prc_sc_dc)), watermarks.head(0),
+                                  changed, removed)
+                record_run(engine, mode, True, len(removed), 0)
+            return
+        only_tickers = changed
+        watermarks = watermarks[watermarks['ticker'].isin(changed)]
+    
+    # 1) Pull the tables into dataframes
+    print(f"Loading data from database ({mode} mode)...")
+    with stage('load_inputs'):
+        if 'stock_dim_data' in inputs:
+            stock_dim_data = _select_tickers(inputs['stock_dim_data'], only_tickers)
+        else:
+            dim_filter, dim_params = _ticker_filter(only_tickers)
+            stock_dim_data = pd.read_sql_query("SELECT * FROM stock_dim_data" + dim_filter, engine,
+                                               params=dim_params or None)
+        stock_dim_data = compact(stock_dim_data, STOCK_DIM_DTYPES)
+        print(f"Loaded {len(stock_dim_data)} stock dimension records")
+        
+        stock_hist_data = load_stock_hist(engine, stock_dim_data, hist_columns, lookback_days, only_tickers)
+        
+        if not options_in_memory:
+            # Only the ticker list is needed in Python to build the candidates
+            tickers = (watermarks['ticker'] if only_tickers is not None else
+                       pd.read_sql_query("SELECT DISTINCT ticker FROM put_option_data", engine)['ticker'])
+        elif 'put_option_data' in inputs:
+            put_option_data = compact(_select_tickers(inputs['put_option_data'], only_tickers), OPTION_DTYPES)
+        else:
+            option_filter, option_params = _ticker_filter(only_tickers)
+            put_option_data = read_frame("SELECT * FROM put_option_data" + option_filter, engine, OPTION_DTYPES,
+                                         params=option_params or None)
+            print(f"Loaded {len(put_option_data)} put option records")
+        incr('rows_fetched', len(stock_dim_data) + len(stock_hist_data) + (len(put_option_data) if options_in_memory else 0))
+        memory_report('load_inputs', stock_dim_data=stock_dim_data, stock_hist_data=stock_hist_data,
+                      put_option_data=put_option_data if options_in_memory else None)
+    
+    with stage('compute_candidates'):
+        if options_in_memory:
+            # 2) Add calculated columns to put_option_data
+            print("\nCalculating put option metrics...")
+            put_option_data = add_put_option_metrics(put_option_data)
+            tickers = put_option_data['ticker'].unique()
+        
+        # 3) Create put_candidates_df with unique tickers, indicators and put_candidate_ind
+        print("\nCreating candidate dataframe...")
+        put_candidates_df = build_put_candidates(tickers, stock_dim_data, stock_hist_data, indicator_names, candidate_rule)
+        memory_report('compute_candidates', put_candidates_df=put_candidates_df,
+                      put_option_data=put_option_data if options_in_memory else None)
+    
+    # 4) Create put_candidate_prices
+    print("\nFiltering and ranking put candidate prices...")
+    if mode == 'chunked':
+        # Nothing is read yet: each chunk is selected as write_put_leads pulls it, so the select_options
+        # stage time is also counted in write_put_leads
+        put_option_data = candidate_option_chunks(engine, put_candidates_df, only_tickers)
+    else:
+        with stage('select_options'):
+            if mode == 'sql':
+                put_option_data = load_candidate_options_sql(engine, put_candidates_df, only_tickers)
+            else:
+                put_option_data = select_candidate_options(put_option_data, put_candidates_df)
+            # IV (re-derived from mid where Yahoo's is stale), delta, theta, vega and probability of assignment
+            put_option_data = compact(add_option_greeks(put_option_data), OPTION_DTYPES)
+            memory_report('select_options', put_option_data=put_option_data)
     
     # Get top 3 by annualized_return per ticker
     # originally used filtered_puts, but for now we can use all of put_option_data
@@ -232,59 +588,78 @@ def main():
     #     .reset_index(drop=True)
     # )
 
+    with stage('write_put_leads'):
+        if only_tickers is not None:
+            # Upsert only the recomputed tickers
+            options_selected = write_incremental(engine, put_candidates_df, put_option_data, watermarks, changed,
+                                                 removed)
+        else:
+            # Write put candidate on ticker level to postgres
+            copy_replace(put_candidates_df, 'put_candidate_tickers', engine, dtype=put_candidate_schema_dc)
+
+            # write put candidates with option data to postgres
+            # put_candidate_prices.to_sql('put_candidate_options', con=engine, dtype=put_candidate_prc_sc_dc, if_exists='replace', index=False)
+            options_selected = copy_replace_frames(
+                put_option_data if mode == 'chunked' else [put_option_data],
+                'put_candidate_options', engine, dtype=put_candidate_prc_sc_dc, indexes=put_candidate_options_indexes)
 
-    # Prepare to write put_candidates_df and put_candidate_prices to postgres
-    # Create schema for put_candidates_df table (put_candidates_tickers)
-    put_candidate_schema_dc = {
-        'ticker' : VARCHAR(20),
-        'current_price' : Float(),
-        'week_52_high' : Float(),
-        'week_52_low' : Float(),
-        'latest_close_date' : DateTime(),
-        'lower_qrt_52wk_bound' : Float(),
-        'lower_qrt_ind' : Integer(),
-        'up_vs_pri_day_vs_8day' : Integer(),
-        'up_vs_pri_wk_vs_8day' : Integer(),
-        'put_candidate_ind' : Integer(),
-    }
-
-    # Write put candidate on ticker level to postgres
-    put_candidates_df.to_sql('put_candidate_tickers', con=engine, dtype=put_candidate_schema_dc, if_exists='replace', index=False)
-
-    # Create schema for put_candidates_prices table (put_candidate_options)
-    put_candidate_prc_sc_dc = {
-        'strike' : Float(),
-        'bid' : Float(),
-        'ask' : Float(),
-        'impliedVolatility' : Float(),
-        'exp_date' : DateTime(),
-        'as_of_date' : DateTime(),
-        'ticker' : VARCHAR(20),
-        'mid' : Float(),
-        'upfront_premium' : Float(),
-        'days_til_strike' : Integer(),
-        'money_aside' : Float(),
-        'raw_return' : Float(),
-        'annualized_return' : Float(),
-        'put_candidate_ind': Integer(),
-        'current_price' : Float(),
-        'price_strike_discount' : Float()
-    }
-
-    # write put candidates with option data to postgres
-    # put_candidate_prices.to_sql('put_candidate_options', con=engine, dtype=put_candidate_prc_sc_dc, if_exists='replace', index=False)
-    put_option_data.to_sql('put_candidate_options', con=engine, dtype=put_candidate_prc_sc_dc, if_exists='replace', index=False)
+            # Record the watermarks this run was computed from, for the next incremental run
+            copy_replace(watermarks, 'put_leads_watermarks', engine, dtype=watermark_schema_dc)
+        record_run(engine, mode, only_tickers is not None, len(put_candidates_df), options_selected)
+        if mode == 'chunked':
+            memory_report('write_put_leads')
 
     # Print results
     print("\n" + "="*80)
     print("RESULTS")
     print("="*80)
-    print("\nput_candidates_df:")
-    print(put_candidates_df)
     print(f"\nTotal candidates: {put_candidates_df['put_candidate_ind'].sum()} out of {len(put_candidates_df)} tickers")
+    print(f"Total put options selected: {options_selected}")
+    if only_tickers is None and mode != 'chunked':
+        return put_candidates_df, put_option_data
+
+
+def analyze_put_leads(engine, indicator_names=None, candidate_rule=None, mode=None, incremental=None, inputs=None):
+    """
+    Compute and store the put candidates.
+    
+    indicator_names: signals that feed put_candidate_ind (default PUT_LEADS_INDICATORS env var
+        or the original three).  See indicators.py.
+    candidate_rule: 'any', 'all' or 'weighted' (default PUT_CANDIDATE_RULE env var or 'any').
+        'weighted' uses PUT_CANDIDATE_WEIGHTS ('name=weight,...') and PUT_CANDIDATE_THRESHOLD.
+    mode: 'pandas' (default) loads every option row and computes metrics in pandas.
+        'sql' pushes the option metrics, stock_dim_data join and strike filter down into Postgres.
+        'chunked' streams put_option_data in ticker order, PUT_LEADS_CHUNK_ROWS rows at a time,
+        and writes each chunk's selected options before reading the next, so memory does not
+        grow with the table.  Default PUT_LEADS_MODE env var.
+    incremental: only recompute tickers whose put_option_data as_of_date or stock_hist_data
+        hist_date moved since the last run, and upsert their rows.  Default PUT_LEADS_INCREMENTAL env var.
+    inputs: in-memory upstream dataframes, see run_put_leads.
+    """
+    indicator_names = active_indicators(indicator_names)
+    candidate_rule = candidate_rule or os.getenv('PUT_CANDIDATE_RULE', 'any')
+    mode = mode or os.getenv('PUT_LEADS_MODE', 'pandas')
+    if mode not in PUT_LEADS_MODES:
+        raise ValueError(f"Unknown put_leads mode: {mode}.  Use one of {PUT_LEADS_MODES}")
+    if incremental is None:
+        incremental = os.getenv('PUT_LEADS_INCREMENTAL', 'false').lower() in ('1', 'true', 'yes')
+    hist_columns, lookback_days = history_requirements(indicator_names)
+    return run_put_leads(engine, indicator_names, candidate_rule, mode, incremental, hist_columns, lookback_days,
+                         inputs)
+
+
+def main(indicator_names=None, candidate_rule=None, mode=None, incremental=None):
+    """Main execution function.  Arguments as in analyze_put_leads."""
+    # Connect to Postgres
+    # Use environment variable for database host, default to pgdatabase (Docker network)
+    # Set DATABASE_HOST=localhost if running locally outside Docker
+    print(f"Connecting to database at {os.getenv('DATABASE_HOST', 'pgdatabase')}...")
+    engine = create_engine(database_url())
     
-    print("\n" + "="*80)
-    print(f"\nTotal put options selected: {len(put_option_data)}")
+    try:
+        analyze_put_leads(engine, indicator_names, candidate_rule, mode, incremental)
+    finally:
+        flush(engine)
     
     # return put_candidates_df, put_candidate_prices
 
@@ -0,0 +1,112 @@
+"""
+Sheet Change Detection
+
+Content fingerprint of a Google Sheet the ingest reads, stored in Postgres so
+a run can tell whether the sheet changed since the last one.
+holdings_ingest.py uses it to skip the current_holdings rewrite when
+Select_Holdings is unchanged:
+
+    fingerprint = sheet_fingerprint(holdings_df, 'ticker')
+    changes = detect_changes(engine, 'Select_Holdings', fingerprint)
+    if changes['changed']:
+        ...                                  # replace current_holdings
+        save_fingerprint(engine, 'Select_Holdings', fingerprint)
+
+The sheet_fingerprints table holds one row per sheet: the hash of its content
+and when that last changed.  Row order and column order in the sheet don't
+count, and only the columns passed to sheet_fingerprint do, so a sheet can be
+fingerprinted on just the columns the ingest uses.  SHEET_CHANGE_DETECTION=off
+reports every sheet as changed.
+"""
+
+import hashlib
+import os
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy.types import DateTime, VARCHAR
+
+from pg_loader import create_table_if_missing, replace_rows
+
+# SHEET_CHANGE_DETECTION=off reports every sheet as changed, so every stage does its full work
+CHANGE_DETECTION_ENABLED = os.getenv('SHEET_CHANGE_DETECTION', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+fingerprint_schema_dc = {
+    'sheet_name' : VARCHAR(100),
+    'sheet_hash' : VARCHAR(32),
+    'changed_at' : DateTime(),
+}
+
+
+def _md5(text):
+    return hashlib.md5(text.encode('utf-8')).hexdigest()
+
+
+def sheet_fingerprint(df, ticker_column, columns=None):
+    """
+    Hash of df over columns (default: every column), ignoring row and column order.
+
+    Rows with a blank ticker_column are left out, like the ingest ignores them.
+    """
+    columns = sorted(columns or df.columns)
+    tickers = df[ticker_column].astype(str).str.strip()
+    rendered = df[columns].astype(str).agg('\x1f'.join, axis=1) if len(df) else pd.Series(dtype=str)
+    rows = sorted(row for ticker, row in zip(tickers, rendered) if ticker != '')
+    return _md5('\x1e'.join(rows))
+
+
+def _ensure_table(engine):
+    create_table_if_missing(pd.DataFrame(columns=list(fingerprint_schema_dc)), 'sheet_fingerprints', engine,
+                            fingerprint_schema_dc, index_column='sheet_name')
+
+
+def load_fingerprint(engine, sheet_name):
+    """Stored hash of sheet_name, or None if it was never saved."""
+    _ensure_table(engine)
+    stored = pd.read_sql_query(
+        "SELECT sheet_hash FROM sheet_fingerprints WHERE sheet_name = %(sheet_name)s",
+        engine, params={'sheet_name': sheet_name}
+    )
+    return stored['sheet_hash'].iloc[0] if len(stored) else None
+
+
+def detect_changes(engine, sheet_name, fingerprint):
+    """
+    Compare fingerprint with what save_fingerprint stored for sheet_name.
+
+    Returns a dict with changed (bool), first_run (nothing stored yet) and
+    fingerprint, to save once the sheet's data is loaded.
+    """
+    stored = load_fingerprint(engine, sheet_name)
+    changes = {
+        'changed': stored != fingerprint or not CHANGE_DETECTION_ENABLED,
+        'first_run': stored is None,
+        'fingerprint': fingerprint,
+    }
+    if changes['first_run']:
+        print(f"{sheet_name}: no stored fingerprint, treating the sheet as changed")
+    elif stored != fingerprint:
+        print(f"{sheet_name}: changed since the last run")
+    else:
+        print(f"{sheet_name}: unchanged since the last run")
+    return changes
+
+
+def save_fingerprint(engine, sheet_name, fingerprint, now=None):
+    """Store fingerprint as sheet_name's current fingerprint.  changed_at is only moved when the hash changed."""
+    now = now or datetime.now()
+    _ensure_table(engine)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT sheet_hash, changed_at FROM sheet_fingerprints WHERE sheet_name = %s", (sheet_name,))
+        stored = cursor.fetchone()
+        changed_at = stored[1] if stored is not None and stored[0] == fingerprint else now
+        save_df = pd.DataFrame({'sheet_name': [sheet_name], 'sheet_hash': [fingerprint], 'changed_at': [changed_at]})
+        replace_rows(cursor, save_df, 'sheet_fingerprints', 'sheet_name', [sheet_name])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
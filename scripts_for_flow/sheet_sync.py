@@ -0,0 +1,277 @@
+"""
+Incremental Google Sheets Sync
+
+Writes a dataframe to a worksheet by sending only the rows that changed since
+the last write, instead of rewriting every cell with set_with_dataframe.
+
+For each sheet, the sheet_sync_state table keeps one row per written data row:
+its key (the row key columns), a hash of its rendered cells and its row number
+in the sheet.  On the next sync:
+- rows whose key is still there stay in their sheet row, and are rewritten
+  only when their hash changed
+- new keys go into the rows freed by removed keys, then below the last row
+- when rows were removed, rows from the bottom of the sheet move up into
+  the gaps, and the sheet is shrunk
+- the changed rows are grouped into contiguous ranges and sent with one
+  batch_update call (more only for very large writes)
+
+Row order in the sheet is therefore stable, not sorted.  A sheet is written
+in full when it has no stored state, its header changed, or its size doesn't
+match the stored state (rows or columns added or deleted by hand).  The sheet
+is never read back, so a cell edited by hand at the same size is not noticed.
+
+Cells are rendered the way gspread_dataframe renders them (blank for nulls,
+repr for floats, str otherwise) and entered as USER_ENTERED.
+
+FakeWorksheet is an in-memory stand-in for gspread's Worksheet that counts API
+calls and cells written (see tests/test_sheet_sync.py and benchmarks/bench_sheet_sync.py).
+"""
+
+import hashlib
+
+import pandas as pd
+from gspread.utils import ValueInputOption, rowcol_to_a1
+from sqlalchemy.types import Integer, VARCHAR
+
+from pg_loader import create_table_if_missing, replace_rows
+
+# Cells per batch_update call.  Keeps request payloads well under the API limit
+MAX_CELLS_PER_CALL = 200000
+
+# Row key stored for the header row
+HEADER_KEY = '__header__'
+
+sync_state_schema_dc = {
+    'sheet_name' : VARCHAR(100),
+    'row_key' : VARCHAR(200),
+    'row_hash' : VARCHAR(32),
+    'row_number' : Integer(),
+}
+
+
+def _cell_value(value):
+    """One cell as gspread_dataframe's set_with_dataframe renders it."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render_rows(df):
+    """Rendered cell values of every row of df, as lists of strings."""
+    return [[_cell_value(v) for v in row] for row in df.itertuples(index=False, name=None)]
+
+
+def _row_hash(cells):
+    return hashlib.md5('\x1f'.join(cells).encode('utf-8')).hexdigest()
+
+
+def row_keys(df, key_columns):
+    """Text key per row of df, from key_columns.  Repeated keys get an occurrence suffix so keys are unique."""
+    keys = df[list(key_columns)].astype(str)
+    keys = keys.iloc[:, 0].str.cat([keys[c] for c in keys.columns[1:]], sep='|')
+    occurrence = keys.groupby(keys).cumcount()
+    return keys.where(occurrence == 0, keys + '#' + occurrence.astype(str)).tolist()
+
+
+def _contiguous_runs(row_numbers):
+    """Group sorted sheet row numbers into (first, last) runs of consecutive rows."""
+    runs = []
+    for row_number in row_numbers:
+        if runs and row_number == runs[-1][1] + 1:
+            runs[-1][1] = row_number
+        else:
+            runs.append([row_number, row_number])
+    return runs
+
+
+def plan_sync(header_hash, row_hashes, keys, state):
+    """
+    Decide the sheet row of every data row and which rows must be written.
+
+    row_hashes are the hashes of the rendered data rows and keys their row
+    keys.  state is the stored sync state (row_key, row_hash, row_number) or None.
+
+    Returns (full, row_numbers, changed) where row_numbers[i] is the sheet row
+    of data row i and changed is the set of indexes i to write.  full means
+    the sheet is rewritten from A1.
+    """
+    stored = {} if state is None else dict(zip(state['row_key'], zip(state['row_hash'], state['row_number'])))
+    stored_header = stored.pop(HEADER_KEY, (None, None))[0]
+    if state is None or stored_header != header_hash:
+        return True, list(range(2, len(keys) + 2)), set(range(len(keys)))
+
+    # Surviving keys keep their row.  New keys take freed rows first, then go below the last row
+    row_numbers = [stored[key][1] if key in stored else None for key in keys]
+    taken = {n for n in row_numbers if n is not None}
+    free_rows = iter(sorted(set(range(2, len(stored) + 2)) - taken))
+    next_row = len(stored) + 2
+    for i, row_number in enumerate(row_numbers):
+        if row_number is None:
+            row_numbers[i] = next(free_rows, None) or next_row
+            if row_numbers[i] == next_row:
+                next_row += 1
+
+    # Fewer rows than before: move the rows below the new last row up into the gaps
+    last_row = len(keys) + 1
+    gaps = iter(sorted(set(range(2, last_row + 1)) - set(row_numbers)))
+    for i in sorted(range(len(keys)), key=lambda i: row_numbers[i]):
+        if row_numbers[i] > last_row:
+            row_numbers[i] = next(gaps)
+
+    changed = {i for i, (key, row_hash) in enumerate(zip(keys, row_hashes))
+               if key not in stored or stored[key] != (row_hash, row_numbers[i])}
+    return False, row_numbers, changed
+
+
+def _batched_ranges(ranges, n_cols):
+    """Split the (range, values) updates into batch_update calls of at most MAX_CELLS_PER_CALL cells."""
+    batches, batch, cells = [], [], 0
+    for update in ranges:
+        update_cells = len(update['values']) * n_cols
+        if batch and cells + update_cells > MAX_CELLS_PER_CALL:
+            batches.append(batch)
+            batch, cells = [], 0
+        batch.append(update)
+        cells += update_cells
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _update_ranges(row_cells, n_cols):
+    """One {'range', 'values'} update per run of consecutive rows (split to stay under MAX_CELLS_PER_CALL)."""
+    rows_per_range = max(1, MAX_CELLS_PER_CALL // max(n_cols, 1))
+    updates = []
+    for first, last in _contiguous_runs(sorted(row_cells)):
+        for start in range(first, last + 1, rows_per_range):
+            end = min(start + rows_per_range - 1, last)
+            updates.append({
+                'range': f"{rowcol_to_a1(start, 1)}:{rowcol_to_a1(end, n_cols)}",
+                'values': [row_cells[n] for n in range(start, end + 1)],
+            })
+    return updates
+
+
+def sync_worksheet(worksheet, df, key_columns, state=None):
+    """
+    Write df (with a header row) to worksheet, sending only what changed since state.
+
+    state is the stored sync state of this sheet (load_sync_state), or None
+    to write everything.  Returns (new_state, stats) where stats has mode
+    ('full' or 'incremental'), api_calls, rows_written and cells_written.
+    """
+    header = [str(c) for c in df.columns]
+    rows = render_rows(df)
+    header_hash, row_hashes = _row_hash(header), [_row_hash(cells) for cells in rows]
+    keys = row_keys(df, key_columns)
+    n_cols = len(header)
+    n_rows = len(rows) + 1
+
+    if state is not None and (worksheet.row_count != len(state) or worksheet.col_count != n_cols):
+        # Sheet doesn't look like what we last wrote
+        state = None
+    full, row_numbers, changed = plan_sync(header_hash, row_hashes, keys, state)
+
+    row_cells = {row_numbers[i]: rows[i] for i in changed}
+    if full:
+        row_cells[1] = header
+
+    api_calls = 0
+    # A full write sizes the sheet first, like set_with_dataframe(resize=True).  An incremental
+    # write grows the sheet before writing, and cuts the rows that moved up only after writing
+    if full or worksheet.row_count < n_rows:
+        worksheet.resize(rows=n_rows, cols=n_cols)
+        api_calls += 1
+    for batch in _batched_ranges(_update_ranges(row_cells, n_cols), n_cols):
+        worksheet.batch_update(batch, value_input_option=ValueInputOption.user_entered)
+        api_calls += 1
+    if worksheet.row_count > n_rows:
+        worksheet.resize(rows=n_rows)
+        api_calls += 1
+
+    new_state = pd.DataFrame({
+        'row_key': [HEADER_KEY] + keys,
+        'row_hash': [header_hash] + row_hashes,
+        'row_number': [1] + row_numbers,
+    })
+    stats = {
+        'mode': 'full' if full else 'incremental',
+        'api_calls': api_calls,
+        'rows_written': len(changed),
+        'cells_written': sum(len(cells) for cells in row_cells.values()),
+    }
+    return new_state, stats
+
+
+def ensure_sync_state_table(engine):
+    """Create sheet_sync_state if missing.  Call once before syncing sheets concurrently."""
+    create_table_if_missing(pd.DataFrame(columns=list(sync_state_schema_dc)), 'sheet_sync_state', engine,
+                            sync_state_schema_dc, index_column='sheet_name')
+
+
+def load_sync_state(engine, sheet_name):
+    """Stored sync state of sheet_name (row_key, row_hash, row_number), or None if it was never synced."""
+    state = pd.read_sql_query(
+        "SELECT row_key, row_hash, row_number FROM sheet_sync_state WHERE sheet_name = %(sheet_name)s",
+        engine, params={'sheet_name': sheet_name}
+    )
+    return state if len(state) else None
+
+
+def save_sync_state(engine, sheet_name, state):
+    """Replace the stored sync state of sheet_name."""
+    state_df = state.copy()
+    state_df.insert(0, 'sheet_name', sheet_name)
+    conn = engine.raw_connection()
+    try:
+        replace_rows(conn.cursor(), state_df, 'sheet_sync_state', 'sheet_name', [sheet_name])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+class FakeWorksheet:
+    """
+    In-memory gspread Worksheet with the calls sync_worksheet and
+    set_with_dataframe make.  Counts API calls and cells written.
+    """
+
+    def __init__(self, rows=1000, cols=26):
+        self.row_count = rows
+        self.col_count = cols
+        self.cells = {}
+        self.api_calls = 0
+        self.cells_written = 0
+
+    def resize(self, rows=None, cols=None):
+        self.api_calls += 1
+        self.row_count = rows or self.row_count
+        self.col_count = cols or self.col_count
+        self.cells = {(r, c): v for (r, c), v in self.cells.items() if r <= self.row_count and c <= self.col_count}
+
+    def batch_update(self, data, **kwargs):
+        self.api_calls += 1
+        for update in data:
+            start = update['range'].split(':')[0]
+            row = int(''.join(ch for ch in start if ch.isdigit()))
+            for r, values in enumerate(update['values'], start=row):
+                for c, value in enumerate(values, start=1):
+                    self.cells[(r, c)] = value
+                    self.cells_written += 1
+
+    def update_cells(self, cell_list, **kwargs):
+        self.api_calls += 1
+        for cell in cell_list:
+            self.cells[(cell.row, cell.col)] = cell.value
+            self.cells_written += 1
+
+    def get_all_values(self):
+        """Cell values as a list of rows (one read call)."""
+        self.api_calls += 1
+        return [[self.cells.get((r, c), '') for c in range(1, self.col_count + 1)]
+                for r in range(1, self.row_count + 1)]
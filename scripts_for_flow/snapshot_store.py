@@ -0,0 +1,220 @@
+"""
+Option Snapshot Store
+
+Keeps every pull instead of replacing the tables on each run.
+
+For a table like put_option_data:
+- put_option_data_snapshots  : append-only parent table, range-partitioned by snapshot_date
+- put_option_data_snapshots_pYYYYMMDD : one partition per snapshot day
+- snapshot_runs              : one row per loaded snapshot (table, id, date, as_of_date, rows)
+- put_option_data            : view of the latest snapshot, so put_leads.py and the
+                               dashboard keep reading the same table name and columns
+
+Snapshotted tables (SNAPSHOT_TABLES): put_option_data, call_option_data and
+stock_dim_data.  stock_hist_data is not one of them: its bars already carry
+hist_date, so stock_hist.py keeps it as a plain history table and updates it
+in place.
+
+Each run calls new_snapshot() once, stamps every row with the same
+snapshot_id / as_of_date, and loads them with append_snapshot().  Rows and the
+snapshot_runs entry commit together, so the latest view flips to the new
+snapshot only once it is fully loaded.  Retention drops whole partitions
+instead of running DELETE scans.
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from time import time
+
+import pytz
+
+from pg_loader import copy_rows, quote_ident, relkind
+
+# Local time (Los Angeles) for as_of_date, same as the original put ingest
+SNAPSHOT_TIMEZONE = 'America/Los_Angeles'
+
+# Days of snapshot partitions to keep.  Override with SNAPSHOT_RETAIN_DAYS in the flow
+DEFAULT_RETAIN_DAYS = int(os.getenv('SNAPSHOT_RETAIN_DAYS', '180'))
+
+SNAPSHOT_RUNS_DDL = """
+CREATE TABLE IF NOT EXISTS snapshot_runs (
+    table_name VARCHAR(63) NOT NULL,
+    snapshot_id BIGINT NOT NULL,
+    snapshot_date DATE NOT NULL,
+    as_of_date TIMESTAMP NOT NULL,
+    row_count BIGINT NOT NULL,
+    PRIMARY KEY (table_name, snapshot_id)
+)
+"""
+
+# Tables kept as snapshot history.  append_snapshot refuses any other table
+SNAPSHOT_TABLES = ('put_option_data', 'call_option_data', 'stock_dim_data')
+
+# Last snapshot_id handed out by this process, so ids stay unique within a millisecond
+_last_snapshot_id = 0
+_snapshot_id_lock = threading.Lock()
+
+
+def new_snapshot():
+    """
+    Create the run-level snapshot identifiers.
+
+    as_of_date is the current Los Angeles time (naive, like the values stored
+    before).  It is computed from UTC since datetime.now() behaves differently
+    on different machines.
+
+    snapshot_id is the UTC time as a YYYYMMDDHHMMSSmmm integer (milliseconds),
+    so it keeps increasing through the daylight saving fall-back hour, where
+    Los Angeles time repeats, and the latest view's max(snapshot_id) is always
+    the newest run.  A second call within the same millisecond gets the next id.
+
+    Returns a dict with snapshot_id, snapshot_date and as_of_date.
+    """
+    global _last_snapshot_id
+    utcmoment = datetime.now(timezone.utc)
+    as_of_date = utcmoment.astimezone(pytz.timezone(SNAPSHOT_TIMEZONE)).replace(tzinfo=None)
+    snapshot_id = int(utcmoment.strftime('%Y%m%d%H%M%S%f')[:-3])
+    with _snapshot_id_lock:
+        snapshot_id = max(snapshot_id, _last_snapshot_id + 1)
+        _last_snapshot_id = snapshot_id
+    return {
+        'snapshot_id': snapshot_id,
+        'snapshot_date': as_of_date.date(),
+        'as_of_date': as_of_date,
+    }
+
+
+def snapshot_table(table_name):
+    """Name of the partitioned parent table behind the latest-snapshot view."""
+    return f"{table_name}_snapshots"
+
+
+def partition_name(table_name, snapshot_date):
+    """Name of the partition that holds one snapshot day."""
+    return f"{snapshot_table(table_name)}_p{snapshot_date:%Y%m%d}"
+
+
+def _ensure_snapshot_table(cursor, table_name, columns, dtype, dialect):
+    """
+    Create the partitioned parent table, the snapshot_runs registry and the latest view.
+
+    columns is the output column order of the view.  dtype is the script's
+    column_typ_dict and gives the Postgres type of each column.  New columns
+    are added to an existing parent table.
+    """
+    parent = snapshot_table(table_name)
+    column_ddl = ',\n    '.join(
+        f"{quote_ident(c)} {dtype[c].compile(dialect=dialect)}" for c in columns
+    )
+
+    cursor.execute(SNAPSHOT_RUNS_DDL)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {quote_ident(parent)} (
+            snapshot_id BIGINT NOT NULL,
+            snapshot_date DATE NOT NULL,
+            {column_ddl}
+        ) PARTITION BY RANGE (snapshot_date)
+    """)
+    for c in columns:
+        cursor.execute(
+            f"ALTER TABLE {quote_ident(parent)} ADD COLUMN IF NOT EXISTS "
+            f"{quote_ident(c)} {dtype[c].compile(dialect=dialect)}"
+        )
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {quote_ident(parent + '_snapshot_id_idx')} "
+        f"ON {quote_ident(parent)} (snapshot_id)"
+    )
+
+    # Tables written before the snapshot store are replaced by the latest view
+    if relkind(cursor, table_name) == 'r':
+        print(f"Replacing table {table_name} with latest snapshot view")
+        cursor.execute(f"DROP TABLE {quote_ident(table_name)}")
+
+    # Latest snapshot view.  The snapshot_date filter lets Postgres prune to one partition
+    column_list = ', '.join(quote_ident(c) for c in columns)
+    cursor.execute(f"""
+        CREATE OR REPLACE VIEW {quote_ident(table_name)} AS
+        SELECT {column_list}
+          FROM {quote_ident(parent)}
+         WHERE snapshot_date = (SELECT max(snapshot_date) FROM snapshot_runs WHERE table_name = '{table_name}')
+           AND snapshot_id = (SELECT max(snapshot_id) FROM snapshot_runs WHERE table_name = '{table_name}')
+    """)
+
+
+def _ensure_partition(cursor, table_name, snapshot_date):
+    """Create the partition for snapshot_date if it does not exist yet."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {quote_ident(partition_name(table_name, snapshot_date))}
+        PARTITION OF {quote_ident(snapshot_table(table_name))}
+        FOR VALUES FROM ('{snapshot_date:%Y-%m-%d}') TO ('{snapshot_date + timedelta(days=1):%Y-%m-%d}')
+    """)
+
+
+def drop_expired_partitions(cursor, table_name, retain_days, today):
+    """
+    Drop snapshot partitions older than retain_days.
+
+    Partitions are dropped whole, so no DELETE scan runs against the history.
+    The matching snapshot_runs rows are removed as well.
+    """
+    parent = snapshot_table(table_name)
+    cutoff = today - timedelta(days=retain_days)
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = %s::regclass",
+        (parent,)
+    )
+    for (child_name,) in cursor.fetchall():
+        child_date = datetime.strptime(child_name.rsplit('_p', 1)[1], '%Y%m%d').date()
+        if child_date < cutoff:
+            print(f"Dropping expired snapshot partition {child_name}")
+            cursor.execute(f"DROP TABLE {quote_ident(child_name)}")
+    cursor.execute(
+        "DELETE FROM snapshot_runs WHERE table_name = %s AND snapshot_date < %s",
+        (table_name, cutoff)
+    )
+
+
+def append_snapshot(df, table_name, engine, dtype, snapshot, retain_days=DEFAULT_RETAIN_DAYS):
+    """
+    Append df to table_name's snapshot history as one snapshot.
+
+    df keeps the same columns that were written with to_sql before.  Every row
+    is tagged with snapshot['snapshot_id'] and snapshot['snapshot_date'].  The
+    rows, the snapshot_runs entry and partition retention all commit in one
+    transaction.
+    """
+    if table_name not in SNAPSHOT_TABLES:
+        raise ValueError(f"{table_name} is not a snapshot table.  Use one of {SNAPSHOT_TABLES}")
+    columns = list(df.columns)
+    load_df = df.copy()
+    load_df.insert(0, 'snapshot_date', snapshot['snapshot_date'])
+    load_df.insert(0, 'snapshot_id', snapshot['snapshot_id'])
+
+    t_start = time()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        _ensure_snapshot_table(cursor, table_name, columns, dtype, engine.dialect)
+        _ensure_partition(cursor, table_name, snapshot['snapshot_date'])
+
+        copy_rows(cursor, load_df, snapshot_table(table_name))
+        cursor.execute(
+            "INSERT INTO snapshot_runs (table_name, snapshot_id, snapshot_date, as_of_date, row_count) "
+            "VALUES (%s, %s, %s, %s, %s)",
+            (table_name, snapshot['snapshot_id'], snapshot['snapshot_date'], snapshot['as_of_date'], len(df))
+        )
+
+        if retain_days:
+            drop_expired_partitions(cursor, table_name, retain_days, snapshot['snapshot_date'])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    t_end = time()
+
+    print('Appended %d rows to %s snapshot %d.  Took %.3f seconds'
+          % (len(df), table_name, snapshot['snapshot_id'], t_end - t_start))
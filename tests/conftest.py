@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the flow scripts the way they import each other (flat modules, see benchmarks/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts_for_flow'))
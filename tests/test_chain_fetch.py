@@ -0,0 +1,67 @@
+"""
+Concurrent chain fetch (chain_fetch.fetch_chains) against the synthetic provider.
+
+Run with: python -m pytest tests
+Timings are in benchmarks/bench_chain_fetch.py.
+"""
+
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from chain_fetch import fetch_chains
+from providers import SyntheticProvider
+
+# The synthetic expirations are the Fridays after today, which the fetch policy checks against as_of_date
+AS_OF_DATE = datetime.now()
+
+
+class InFlightProvider(SyntheticProvider):
+    """SyntheticProvider that records the most requests it ever had in flight at once."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _request(self, *key):
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            super()._request(*key)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def fetch(max_workers, latency_ms=0.0):
+    provider = InFlightProvider(n_tickers=8, latency_ms=latency_ms)
+    chain_dfs = fetch_chains(provider.tickers, max_workers=max_workers, as_of_date=AS_OF_DATE,
+                             ticker_factory=provider.ticker)
+    return provider, chain_dfs
+
+
+def sorted_side(chain_df):
+    return chain_df.sort_values(['ticker', 'exp_date', 'strike']).reset_index(drop=True)
+
+
+def test_same_rows_at_every_worker_count():
+    _, sequential = fetch(max_workers=1)
+    assert all(len(df) for df in sequential.values())
+    for max_workers in (4, 8):
+        _, concurrent = fetch(max_workers=max_workers)
+        for side, chain_df in concurrent.items():
+            pd.testing.assert_frame_equal(sorted_side(chain_df), sorted_side(sequential[side]))
+
+
+def test_requests_overlap_up_to_max_workers():
+    provider, _ = fetch(max_workers=4, latency_ms=20)
+    assert provider.peak_in_flight == 4
+
+
+def test_one_worker_requests_one_at_a_time():
+    provider, _ = fetch(max_workers=1, latency_ms=5)
+    assert provider.peak_in_flight == 1
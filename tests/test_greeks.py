@@ -0,0 +1,96 @@
+"""
+Black-Scholes greeks and implied volatility (greeks.py) against textbook
+values and round trips.
+
+Run with: python -m pytest tests
+Timings are in benchmarks/bench_greeks.py.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from greeks import IV_MAX, IV_MIN, add_option_greeks, bs_greeks, bs_price, implied_vol, norm_cdf
+
+# (spot, strike, years, vol, rate, is_call, {value: expected}, tolerance)
+REFERENCE_CASES = [
+    # Hull, Options, Futures and Other Derivatives, example 15.6: c = 4.76, p = 0.81
+    (42, 40, 0.5, 0.2, 0.1, True, {'price': 4.76}, 0.005),
+    (42, 40, 0.5, 0.2, 0.1, False, {'price': 0.81}, 0.005),
+    # Hull chapter 19 (S=49, K=50, r=5%, vol=20%, 20 weeks): delta 0.522, theta -4.31 a year, vega 12.1
+    (49, 50, 0.3846, 0.2, 0.05, True, {'price': 2.40, 'delta': 0.522, 'theta': -4.31 / 365, 'vega': 0.121}, 0.0005),
+    # Same option as a put: delta = call delta - 1, theta -1.85 a year
+    (49, 50, 0.3846, 0.2, 0.05, False, {'delta': -0.478, 'theta': -1.85 / 365, 'vega': 0.121}, 0.0005),
+]
+
+
+@pytest.mark.parametrize('spot, strike, years, vol, rate, is_call, expected, tolerance', REFERENCE_CASES)
+def test_textbook_values(spot, strike, years, vol, rate, is_call, expected, tolerance):
+    greeks = bs_greeks(spot, strike, years, vol, is_call, rate)
+    for name, value in expected.items():
+        assert abs(float(greeks[name]) - value) <= tolerance, name
+
+
+def test_put_call_parity():
+    call, put = bs_price(42, 40, 0.5, 0.2, True, 0.1), bs_price(42, 40, 0.5, 0.2, False, 0.1)
+    assert abs((call - put) - (42 - 40 * math.exp(-0.1 * 0.5))) < 1e-12
+
+
+def test_norm_cdf_matches_erfc():
+    x = np.linspace(-40, 40, 20001)
+    reference = np.array([0.5 * math.erfc(-v / math.sqrt(2)) for v in x])
+    assert np.max(np.abs(norm_cdf(x) - reference)) < 1e-14
+
+
+def test_implied_vol_recovers_the_pricing_vol():
+    rng = np.random.default_rng(0)
+    n = 20000
+    spot = rng.uniform(10, 500, n)
+    strike = spot * rng.uniform(0.5, 1.3, n)
+    years = rng.integers(1, 400, n) / 365
+    vol = rng.uniform(0.05, 2.0, n)
+    is_call = rng.random(n) < 0.5
+    greeks = bs_greeks(spot, strike, years, vol, is_call)
+
+    solved = implied_vol(greeks['price'], spot, strike, years, is_call)
+    # Deep in the money or nearly worthless options barely move with vol, so their vol can't be recovered
+    identifiable = greeks['vega'] > 1e-3
+    assert np.isfinite(solved[identifiable]).all()
+    assert np.max(np.abs(solved - vol)[identifiable]) < 1e-4
+
+
+def test_implied_vol_is_nan_outside_the_no_arbitrage_bounds():
+    # Put with spot 100, strike 105: below intrinsic value (about 3.95), above the discounted
+    # strike (about 103.95), and more than IV_MAX can produce
+    prices = np.array([3.0, 104.5, bs_price(100, 105, 0.25, IV_MAX * 1.5, False)])
+    solved = implied_vol(prices, 100, 105, 0.25, False)
+    assert np.isnan(solved).all()
+
+
+def put_frame(vendor_iv):
+    """Puts quoted at their 30 vol price with a 3% spread."""
+    n = len(vendor_iv)
+    spot, strike, days = np.full(n, 100.0), np.linspace(80, 100, n), np.full(n, 30)
+    mid = bs_price(spot, strike, days / 365, 0.3, False)
+    half_spread = np.maximum(0.01, mid * 0.03)
+    return pd.DataFrame({
+        'strike': strike, 'current_price': spot, 'days_til_strike': days,
+        'bid': mid - half_spread, 'ask': mid + half_spread, 'mid': mid, 'impliedVolatility': vendor_iv,
+    })
+
+
+def test_add_option_greeks_keeps_vendor_iv_that_reprices_the_quote():
+    option_df = add_option_greeks(put_frame(np.full(5, 0.3)))
+    assert (option_df['iv_from_mid'] == 0).all()
+    assert (option_df['iv'] == 0.3).all()
+    assert (option_df['delta'] < 0).all() and (option_df['theta'] < 0).all()
+    assert option_df['prob_itm'].between(0, 1).all()
+
+
+@pytest.mark.parametrize('vendor_iv', [0.0, np.nan, IV_MIN / 2, IV_MAX * 2, 0.6])
+def test_add_option_greeks_solves_missing_implausible_or_stale_vendor_iv(vendor_iv):
+    option_df = add_option_greeks(put_frame(np.full(5, vendor_iv)))
+    assert (option_df['iv_from_mid'] == 1).all()
+    assert np.allclose(option_df['iv'], 0.3, atol=1e-5)
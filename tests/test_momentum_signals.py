@@ -0,0 +1,74 @@
+"""
+Vectorized momentum indicators (momentum_signals.py) against the row-by-row
+functions in put_leads.py.
+
+Run with: python -m pytest tests
+Timings are in benchmarks/bench_momentum.py.
+"""
+
+import numpy as np
+import pandas as pd
+
+from momentum_signals import MA_WINDOW, prepare_history, up_vs_pri_day_vs_8day, up_vs_pri_wk_vs_8day
+from put_leads import calculate_up_vs_pri_day_vs_8day, calculate_up_vs_pri_wk_vs_8day
+
+
+def make_history(n_tickers=40, n_days=60, seed=0):
+    """Random-walk daily closes in cents, so closes often tie with their 8 day average."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2025-01-17', periods=n_days)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (n_tickers, n_days)), axis=1))
+    return pd.DataFrame({
+        'ticker': np.repeat([f"T{i}" for i in range(n_tickers)], n_days),
+        'hist_date': np.tile(dates, n_tickers),
+        'close': closes.ravel().round(2),
+    })
+
+
+def make_candidates(stock_hist_data, seed=0):
+    rng = np.random.default_rng(seed)
+    last = stock_hist_data.groupby('ticker', sort=False).tail(1).reset_index(drop=True)
+    return pd.DataFrame({
+        'ticker': last['ticker'],
+        'latest_close_date': last['hist_date'],
+        'current_price': (last['close'] * rng.uniform(0.97, 1.03, len(last))).round(2),
+    })
+
+
+def assert_matches_row_by_row(put_candidates_df, stock_hist_data):
+    hist = prepare_history(stock_hist_data)
+    day = put_candidates_df.apply(lambda row: calculate_up_vs_pri_day_vs_8day(row, stock_hist_data), axis=1)
+    wk = put_candidates_df.apply(lambda row: calculate_up_vs_pri_wk_vs_8day(row, stock_hist_data), axis=1)
+    assert list(up_vs_pri_day_vs_8day(put_candidates_df, hist)) == list(day)
+    assert list(up_vs_pri_wk_vs_8day(put_candidates_df, hist)) == list(wk)
+
+
+def test_matches_row_by_row():
+    stock_hist_data = make_history()
+    assert_matches_row_by_row(make_candidates(stock_hist_data), stock_hist_data)
+
+
+def test_matches_row_by_row_on_unsorted_history():
+    stock_hist_data = make_history(seed=1)
+    shuffled = stock_hist_data.sample(frac=1, random_state=0).reset_index(drop=True)
+    assert_matches_row_by_row(make_candidates(stock_hist_data, seed=1), shuffled)
+
+
+def test_matches_row_by_row_with_short_history():
+    # Fewer bars than the 8 day window: tickers with a partial average or none at all
+    stock_hist_data = make_history(n_days=MA_WINDOW + 2, seed=2)
+    bars_kept = stock_hist_data['ticker'].str[1:].astype(int) % (MA_WINDOW + 2) + 1
+    from_end = stock_hist_data.groupby('ticker').cumcount(ascending=False)
+    stock_hist_data = stock_hist_data[from_end < bars_kept].reset_index(drop=True)
+    assert_matches_row_by_row(make_candidates(stock_hist_data, seed=2), stock_hist_data)
+
+
+def test_prepare_history_adds_position_and_averages():
+    stock_hist_data = make_history(n_tickers=2, n_days=MA_WINDOW + 1)
+    hist = prepare_history(stock_hist_data.iloc[::-1])
+    first = hist[hist['ticker'] == 'T0'].reset_index(drop=True)
+    closes = stock_hist_data.loc[stock_hist_data['ticker'] == 'T0', 'close'].reset_index(drop=True)
+    assert list(first['pos']) == list(range(MA_WINDOW + 1))
+    assert first['ma8'].iloc[:MA_WINDOW - 1].isna().all()
+    assert first['ma8'].iloc[-1] == closes.iloc[1:].mean()
+    assert first['prev_ma8'].iloc[-1] == closes.iloc[:MA_WINDOW].mean()
@@ -0,0 +1,116 @@
+"""
+Incremental Google Sheets sync (sheet_sync.sync_worksheet) against FakeWorksheet.
+
+Run with: python -m pytest tests
+API call and cell totals over several run days are in benchmarks/bench_sheet_sync.py.
+"""
+
+import pandas as pd
+
+from sheet_sync import FakeWorksheet, render_rows, sync_worksheet
+
+KEY_COLUMNS = ('ticker', 'strike')
+
+
+def make_df(n_rows=10):
+    return pd.DataFrame({
+        'ticker': [f"T{i}" for i in range(n_rows)],
+        'strike': [float(10 + i) for i in range(n_rows)],
+        'bid': [0.5 + i / 100 for i in range(n_rows)],
+    })
+
+
+def assert_sheet_holds(worksheet, df):
+    """The sheet holds df's header and rows (in any order), and nothing else."""
+    cells = worksheet.get_all_values()
+    assert cells[0] == list(df.columns)
+    assert sorted(map(tuple, cells[1:])) == sorted(map(tuple, render_rows(df)))
+
+
+def synced(df):
+    """A FakeWorksheet with df fully written, and its sync state."""
+    worksheet = FakeWorksheet()
+    state, _ = sync_worksheet(worksheet, df, KEY_COLUMNS)
+    return worksheet, state
+
+
+def test_first_sync_writes_everything_in_two_calls():
+    df = make_df()
+    worksheet = FakeWorksheet()
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS)
+    assert stats == {'mode': 'full', 'api_calls': 2, 'rows_written': 10, 'cells_written': 33}
+    assert (worksheet.row_count, worksheet.col_count) == (11, 3)
+    assert_sheet_holds(worksheet, df)
+
+
+def test_unchanged_rerun_makes_no_calls():
+    df = make_df()
+    worksheet, state = synced(df)
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    assert stats == {'mode': 'incremental', 'api_calls': 0, 'rows_written': 0, 'cells_written': 0}
+
+
+def test_changed_row_is_the_only_one_written():
+    df = make_df()
+    worksheet, state = synced(df)
+    df.loc[4, 'bid'] = 9.99
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    assert stats == {'mode': 'incremental', 'api_calls': 1, 'rows_written': 1, 'cells_written': 3}
+    assert_sheet_holds(worksheet, df)
+
+
+def test_new_rows_grow_the_sheet():
+    worksheet, state = synced(make_df())
+    df = make_df(12)
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    # resize, then one batch_update for the two rows below the old last row
+    assert stats == {'mode': 'incremental', 'api_calls': 2, 'rows_written': 2, 'cells_written': 6}
+    assert worksheet.row_count == 13
+    assert_sheet_holds(worksheet, df)
+
+
+def test_removed_rows_are_filled_from_the_bottom_and_the_sheet_shrinks():
+    worksheet, state = synced(make_df())
+    df = make_df().drop(index=[2, 5]).reset_index(drop=True)
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    # The last two rows move up into the gaps (one batch_update), then the sheet is cut
+    assert stats == {'mode': 'incremental', 'api_calls': 2, 'rows_written': 2, 'cells_written': 6}
+    assert worksheet.row_count == 9
+    assert_sheet_holds(worksheet, df)
+
+
+def test_replaced_rows_reuse_the_freed_sheet_rows():
+    worksheet, state = synced(make_df())
+    df = make_df()
+    df.loc[3, 'ticker'] = 'NEW'
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    assert stats == {'mode': 'incremental', 'api_calls': 1, 'rows_written': 1, 'cells_written': 3}
+    assert worksheet.row_count == 11
+    assert_sheet_holds(worksheet, df)
+
+
+def test_header_change_rewrites_the_sheet():
+    worksheet, state = synced(make_df())
+    df = make_df().rename(columns={'bid': 'mid'})
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    assert stats['mode'] == 'full'
+    assert_sheet_holds(worksheet, df)
+
+
+def test_sheet_resized_by_hand_is_rewritten():
+    df = make_df()
+    worksheet, state = synced(df)
+    worksheet.resize(rows=20)
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    assert stats['mode'] == 'full'
+    assert worksheet.row_count == 11
+    assert_sheet_holds(worksheet, df)
+
+
+def test_repeated_keys_are_kept_apart():
+    df = pd.concat([make_df(3), make_df(3)], ignore_index=True)
+    worksheet, state = synced(df)
+    df.loc[4, 'bid'] = 7.5
+    _, stats = sync_worksheet(worksheet, df, KEY_COLUMNS, state)
+    assert stats['rows_written'] == 1
+    assert_sheet_holds(worksheet, df)